@@ -0,0 +1,116 @@
+# app/benchmark_index.py
+"""
+Compare the FAISS index backends of vector_index on a synthetic corpus.
+
+    python benchmark_index.py [--vectors 200000] [--queries 500] [--top-k 10]
+                              [--types flat,sq8,ivf_flat,ivf_pq,hnsw] [--nprobe 8,16,32] [--ef-search 32,64,128]
+
+The corpus is a mixture of Gaussian clusters normalized to unit length, which
+resembles sentence embeddings far better than uniform noise. For every backend
+(and every nprobe/efSearch value) the script reports recall@k against the exact
+flat index, p50/p99 single-query latency, build time and index memory, so the
+FAISS_* settings can be chosen from measurements.
+"""
+import time
+import argparse
+import numpy as np
+import faiss
+from vector_index import EMBEDDING_DIM, INDEX_TYPES, new_faiss_index, search_parameters
+
+def synthetic_corpus(n_vectors: int, n_queries: int, dim: int = EMBEDDING_DIM, clusters: int = 256,
+                     seed: int = 0):
+    """Return (corpus, queries) of unit vectors drawn around shared cluster centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype("float32")
+
+    def sample(n):
+        points = centres[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim)).astype("float32")
+        faiss.normalize_L2(points)
+        return points
+
+    return sample(n_vectors), sample(n_queries)
+
+def index_memory_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Share of the exact top-k neighbours that the approximate search returned."""
+    k = truth.shape[1]
+    hits = sum(len(set(found_row[:k].tolist()) & set(truth_row.tolist())) for found_row, truth_row in zip(found, truth))
+    return hits / truth.size
+
+def benchmark_index(index, queries: np.ndarray, truth: np.ndarray, top_k: int, params=None) -> dict:
+    """Time single-query searches (as /search issues them) and measure recall@k."""
+    latencies = []
+    found = np.empty((len(queries), top_k), dtype="int64")
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, labels = index.search(queries[i:i + 1], top_k, params=params)
+        latencies.append(time.perf_counter() - start)
+        found[i] = labels[0]
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "recall": recall_at_k(found, truth),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+def run_benchmark(n_vectors: int, n_queries: int, top_k: int, index_types: list,
+                  nprobes: list, ef_searches: list) -> list:
+    corpus, queries = synthetic_corpus(n_vectors, n_queries)
+    ids = np.arange(n_vectors, dtype="int64")
+
+    # Exact baseline for recall.
+    baseline = faiss.IndexFlatIP(EMBEDDING_DIM)
+    baseline.add(corpus)
+    _, truth = baseline.search(queries, top_k)
+
+    rows = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = new_faiss_index(index_type, corpus)
+        index.add_with_ids(corpus, ids)
+        build_seconds = time.perf_counter() - start
+        memory_mb = index_memory_bytes(index) / 2 ** 20
+        if index_type.startswith("ivf"):
+            settings_to_try = [("nprobe", value, search_parameters(index, nprobe=value)) for value in nprobes]
+        elif index_type.startswith("hnsw"):
+            settings_to_try = [("efSearch", value, search_parameters(index, ef_search=value)) for value in ef_searches]
+        else:
+            settings_to_try = [("", "", None)]
+        for name, value, params in settings_to_try:
+            result = benchmark_index(index, queries, truth, top_k, params)
+            rows.append({
+                "type": index_type,
+                "param": f"{name}={value}" if name else "-",
+                "build_s": build_seconds,
+                "memory_mb": memory_mb,
+                **result,
+            })
+    return rows
+
+def print_table(rows: list, top_k: int) -> None:
+    header = f"{'type':<10} {'param':<14} {'recall@' + str(top_k):>10} {'p50 ms':>8} {'p99 ms':>8} {'build s':>8} {'mem MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(f"{row['type']:<10} {row['param']:<14} {row['recall']:>10.3f} {row['p50_ms']:>8.3f} "
+              f"{row['p99_ms']:>8.3f} {row['build_s']:>8.1f} {row['memory_mb']:>8.1f}")
+
+def _int_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index backends on a synthetic corpus.")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--types", default="flat,sq8,ivf_flat,ivf_sq8,ivf_pq,hnsw",
+                        help=f"Comma-separated backends out of {','.join(INDEX_TYPES)}")
+    parser.add_argument("--nprobe", default="4,16,64", help="IVF cells scanned per query, comma-separated")
+    parser.add_argument("--ef-search", default="32,64,128", help="HNSW candidate list sizes, comma-separated")
+    args = parser.parse_args()
+    types = [name for name in args.types.split(",") if name]
+    print(f"{args.vectors} vectors, {args.queries} queries, dim {EMBEDDING_DIM}, {faiss.omp_get_max_threads()} threads")
+    print_table(run_benchmark(args.vectors, args.queries, args.top_k, types,
+                              _int_list(args.nprobe), _int_list(args.ef_search)), args.top_k)
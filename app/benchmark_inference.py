@@ -0,0 +1,197 @@
+# app/benchmark_inference.py
+"""
+Parity and throughput check of an inference backend against the fp32 models.
+
+    python benchmark_inference.py --backend onnx_int8 [--models embedder,summarizer,ner]
+                                  [--texts 64] [--batch-size 16] [--from-db] [--output parity.json]
+
+Runs the same texts through each model twice, first on the fp32 torch backend
+(the reference) and then on the candidate backend, one model loaded at a time,
+and reports per model:
+
+    embedder    cosine similarity of the candidate to the reference embeddings
+                (mean, p5, min) and the overlap of each text's 10 nearest
+                neighbours within the sample
+    summarizer  share of identical summaries and mean ROUGE-L F1 against the
+                reference summaries
+    ner         share of texts with identical tags, mean tag Jaccard and
+                entity-level F1 (entity group and surface text)
+
+plus items/sec on both backends and the speed-up, so INFERENCE_BACKEND(S) can be
+switched knowing the throughput gain and the quality cost. Texts come from the
+synthetic corpus of benchmark_pipeline, or with --from-db from stored knowledge
+units. Thread counts follow INFERENCE_THREADS / INFERENCE_INTEROP_THREADS.
+"""
+import gc
+import json
+import time
+import random
+import argparse
+import numpy as np
+from inference_backends import BACKENDS, QUANTIZED_MODELS, INFERENCE_THREADS, load_embedder, load_pipeline
+from model_registry import EMBED_MODEL_NAME, SUMMARIZER_MODEL_NAME, NER_MODEL_NAME
+from benchmark_pipeline import jira_corpus, confluence_corpus
+
+NEIGHBOURS = 10
+
+
+def sample_texts(count: int, from_db: bool = False, seed: int = 0) -> list:
+    """Chunk-sized texts: stored chunk texts, or paragraphs of the synthetic corpora."""
+    if from_db:
+        from db import init_store
+        store = init_store()
+        texts = []
+        for doc in store.iter_texts():
+            if doc.get("chunk_text"):
+                texts.append(doc["chunk_text"])
+            if len(texts) >= count:
+                break
+        return texts
+    docs = jira_corpus(count, seed=seed) + confluence_corpus(max(1, count // 4), seed=seed + 1)
+    paragraphs = [part.strip() for doc in docs for part in doc["raw_text"].split("\n") if len(part.split()) >= 8]
+    random.Random(seed).shuffle(paragraphs)
+    return paragraphs[:count]
+
+
+def _timed(fn, texts: list, batch_size: int):
+    # One warm-up batch so lazy initialisation (graph optimisation, allocations) is not timed.
+    fn(texts[:batch_size])
+    start = time.perf_counter()
+    outputs = fn(texts)
+    return outputs, time.perf_counter() - start
+
+
+def _run(model: str, backend: str, texts: list, batch_size: int):
+    if model == "embedder":
+        embedder = load_embedder(EMBED_MODEL_NAME, backend)
+        outputs, seconds = _timed(lambda batch: np.asarray(embedder.encode(batch, batch_size=batch_size)),
+                                  texts, batch_size)
+        del embedder
+    elif model == "summarizer":
+        summarizer = load_pipeline("summarization", SUMMARIZER_MODEL_NAME, backend)
+        outputs, seconds = _timed(
+            lambda batch: [res["summary_text"] for res in summarizer(batch, batch_size=batch_size, max_length=60,
+                                                                      min_length=15, do_sample=False, truncation=True)],
+            texts, batch_size)
+        del summarizer
+    else:
+        ner = load_pipeline("ner", NER_MODEL_NAME, backend, aggregation_strategy="simple")
+        outputs, seconds = _timed(lambda batch: ner(batch, batch_size=batch_size), texts, batch_size)
+        del ner
+    gc.collect()
+    return outputs, seconds
+
+
+def _lcs_length(a: list, b: list) -> int:
+    previous = [0] * (len(b) + 1)
+    for token in a:
+        current = [0]
+        for j, other in enumerate(b):
+            current.append(previous[j] + 1 if token == other else max(previous[j + 1], current[j]))
+        previous = current
+    return previous[-1]
+
+
+def rouge_l_f1(candidate: str, reference: str) -> float:
+    candidate, reference = candidate.lower().split(), reference.lower().split()
+    if not candidate or not reference:
+        return float(candidate == reference)
+    lcs = _lcs_length(candidate, reference)
+    if lcs == 0:
+        return 0.0
+    precision, recall = lcs / len(candidate), lcs / len(reference)
+    return 2 * precision * recall / (precision + recall)
+
+
+def _f1(found: set, expected: set) -> float:
+    if not found and not expected:
+        return 1.0
+    hits = len(found & expected)
+    return 2 * hits / (len(found) + len(expected))
+
+
+def embedding_parity(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = (reference * candidate).sum(axis=1)
+    k = min(NEIGHBOURS, len(reference) - 1)
+    overlap = None
+    if k > 0:
+        def neighbours(vectors):
+            similarity = vectors @ vectors.T
+            np.fill_diagonal(similarity, -np.inf)
+            return np.argsort(-similarity, axis=1)[:, :k]
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(neighbours(reference).tolist(),
+                                                                         neighbours(candidate).tolist())]))
+    return {
+        "cosine_mean": round(float(cosine.mean()), 6),
+        "cosine_p5": round(float(np.percentile(cosine, 5)), 6),
+        "cosine_min": round(float(cosine.min()), 6),
+        f"neighbour_overlap@{k}": round(overlap, 4) if overlap is not None else None,
+    }
+
+
+def summary_parity(reference: list, candidate: list) -> dict:
+    return {
+        "exact_match": round(float(np.mean([a == b for a, b in zip(reference, candidate)])), 4),
+        "rouge_l_f1": round(float(np.mean([rouge_l_f1(b, a) for a, b in zip(reference, candidate)])), 4),
+    }
+
+
+def ner_parity(reference: list, candidate: list) -> dict:
+    def tags(entities):
+        return {(entity.get("entity_group") or entity.get("entity") or "").lower() for entity in entities}
+
+    def spans(entities):
+        return {((entity.get("entity_group") or entity.get("entity") or "").lower(), entity.get("word"))
+                for entity in entities}
+
+    jaccard = [len(tags(a) & tags(b)) / len(tags(a) | tags(b)) if tags(a) | tags(b) else 1.0
+               for a, b in zip(reference, candidate)]
+    return {
+        "tags_exact_match": round(float(np.mean([tags(a) == tags(b) for a, b in zip(reference, candidate)])), 4),
+        "tags_jaccard": round(float(np.mean(jaccard)), 4),
+        "entity_f1": round(float(np.mean([_f1(spans(b), spans(a)) for a, b in zip(reference, candidate)])), 4),
+    }
+
+
+PARITY = {"embedder": embedding_parity, "summarizer": summary_parity, "ner": ner_parity}
+
+
+def check_parity(backend: str, models: list, texts: list, batch_size: int) -> dict:
+    report = {}
+    for model in models:
+        reference, reference_seconds = _run(model, "torch", texts, batch_size)
+        candidate, candidate_seconds = _run(model, backend, texts, batch_size)
+        report[model] = {
+            **PARITY[model](reference, candidate),
+            "fp32_items_per_sec": round(len(texts) / reference_seconds, 2),
+            f"{backend}_items_per_sec": round(len(texts) / candidate_seconds, 2),
+            "speedup": round(reference_seconds / candidate_seconds, 2),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare an inference backend with the fp32 models.")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], default="onnx_int8")
+    parser.add_argument("--models", default=",".join(QUANTIZED_MODELS))
+    parser.add_argument("--texts", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--from-db", action="store_true", help="Use stored chunk texts instead of synthetic ones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+    models = [name for name in args.models.split(",") if name]
+    texts = sample_texts(args.texts, args.from_db, args.seed)
+    report = {
+        "backend": args.backend,
+        "texts": len(texts),
+        "batch_size": args.batch_size,
+        "threads": INFERENCE_THREADS or "default",
+        "models": check_parity(args.backend, models, texts, args.batch_size),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,379 @@
+# app/benchmark_pipeline.py
+"""
+Offline throughput benchmark for the ingestion pipeline and the search path.
+
+    python benchmark_pipeline.py [--jira 200] [--confluence 50] [--batch-docs 16]
+                                 [--queries 200] [--stub-models] [--output run.json]
+
+Generates synthetic Jira- and Confluence-shaped documents and times every
+pipeline stage on its own (preprocess, spaCy sentences, sentence embedding,
+clustering, summarization, NER, chunk embedding), then the whole
+run_pipeline_many call, then GET /search end to end, uncached and cached.
+Reports docs/sec, p50/p95/p99 latency per batch (per query for search) and
+peak RSS as JSON, so runs can be diffed.
+
+--stub-models swaps in tiny deterministic stand-ins for the spaCy, sentence
+embedding, summarization and NER models, so the benchmark runs on a CPU-only
+box without network access or model downloads. Absolute numbers then measure
+the pipeline code rather than the models. Without a --mongo-uri the search
+benchmark runs against mongomock.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import resource
+import datetime
+import numpy as np
+from model_registry import model_registry
+
+BENCHMARK_DB_NAME = "kt_benchmark"
+
+# Vocabulary for the synthetic corpora.
+_COMPONENTS = ["payment gateway", "login service", "inventory API", "report scheduler", "user settings page",
+               "search index", "notification worker", "billing export", "session cache", "audit log"]
+_SYMPTOMS = ["returns a 500 error", "times out under load", "shows stale data", "fails with a null pointer",
+             "drops requests", "leaks memory", "retries forever", "rejects valid tokens", "logs duplicate events"]
+_CONTEXT = ["after the last deploy", "during peak traffic", "for users in the EU region", "when the cache is cold",
+            "on Android clients", "in the staging environment", "after a password reset", "once a day at midnight"]
+_ACTIONS = ["Rolled back the release", "Increased the connection pool", "Added a retry with backoff",
+            "Patched the serializer", "Rebuilt the search index", "Rotated the API keys", "Raised the timeout"]
+_TEAMS = ["Platform", "Payments", "Identity", "Search", "Mobile"]
+_PEOPLE = ["Alice", "Bob", "Priya", "Chen", "Maria", "Omar"]
+_PATHS = ["/v2/inventory", "/api/login", "/billing/export", "/settings/profile", "/search/query"]
+
+
+def _sentence(rng: random.Random) -> str:
+    return (f"The {rng.choice(_COMPONENTS)} {rng.choice(_SYMPTOMS)} {rng.choice(_CONTEXT)}, "
+            f"reported by {rng.choice(_PEOPLE)} from the {rng.choice(_TEAMS)} team on {rng.choice(_PATHS)}.")
+
+
+def jira_corpus(count: int, seed: int = 0) -> list:
+    """Jira-shaped documents: a key, a one-line title and a short description with comments."""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        key = f"MCC-{1000 + i}"
+        body = " ".join(_sentence(rng) for _ in range(rng.randint(2, 8)))
+        comments = " ".join(f"{rng.choice(_ACTIONS)}." for _ in range(rng.randint(0, 3)))
+        docs.append({
+            "raw_text": f"{key}: {rng.choice(_COMPONENTS)} {rng.choice(_SYMPTOMS)}. {body} {comments}",
+            "source_id": key,
+            "source": "Jira",
+        })
+    return docs
+
+
+def confluence_corpus(count: int, seed: int = 1, sections: int = 6) -> list:
+    """Confluence-shaped documents: long pages of headed sections with several paragraphs each."""
+    rng = random.Random(seed)
+    docs = []
+    for i in range(count):
+        parts = []
+        for _ in range(rng.randint(max(1, sections // 2), sections * 2)):
+            parts.append(f"{rng.choice(_COMPONENTS).title()} runbook.")
+            for _ in range(rng.randint(1, 4)):
+                parts.append(" ".join(_sentence(rng) for _ in range(rng.randint(3, 7))))
+                parts.append(f"{rng.choice(_ACTIONS)} and verified the fix.")
+        docs.append({"raw_text": "\n\n".join(parts), "source_id": f"page-{i}", "source": "Confluence"})
+    return docs
+
+
+# Stand-in models for offline runs (--stub-models).
+
+class _StubSentence:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StubDoc:
+    def __init__(self, text: str):
+        self.sents = [_StubSentence(sent) for sent in re.split(r"(?<=[.!?])\s+", text) if sent]
+
+
+class _StubNLP:
+    """Regex sentence splitter with spaCy's __call__/pipe interface."""
+
+    def __call__(self, text: str):
+        return _StubDoc(text)
+
+    def pipe(self, texts, batch_size: int = 16):
+        return (_StubDoc(text) for text in texts)
+
+
+class _StubEmbedder:
+    """Hashed bag-of-words vectors, so texts sharing words are similar (384 dims, unit length)."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype="float32")
+        for word in re.findall(r"\w+", text.lower()):
+            digest = int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16)
+            vector[digest % self.dim] += 1.0 if digest & 1 << 31 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size: int = 32, **kwargs):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts]) if len(texts) else np.empty((0, self.dim), "float32")
+
+
+class _StubTokenizer:
+    """Whitespace tokenizer with the slice of the Hugging Face interface pipeline.py uses."""
+
+    def __init__(self):
+        self._ids = {}
+        self._words = []
+
+    def __call__(self, text: str, add_special_tokens: bool = False):
+        ids = []
+        for word in text.split():
+            if word not in self._ids:
+                self._ids[word] = len(self._words)
+                self._words.append(word)
+            ids.append(self._ids[word])
+        return {"input_ids": ids}
+
+    def decode(self, ids, skip_special_tokens: bool = True) -> str:
+        return " ".join(self._words[i] for i in ids)
+
+
+class _StubSummarizer:
+    """Lead-N summarizer: the first max_length words of each input."""
+
+    def __init__(self):
+        self.tokenizer = _StubTokenizer()
+
+    def __call__(self, texts, max_length: int = 60, **kwargs):
+        return [{"summary_text": " ".join(text.split()[:max_length])} for text in texts]
+
+
+class _StubNER:
+    """Tags capitalized words as entities (people and teams as PER/ORG, the rest MISC)."""
+
+    def __call__(self, texts, batch_size: int = 16, **kwargs):
+        single = isinstance(texts, str)
+        results = []
+        for text in [texts] if single else texts:
+            entities = []
+            for word in re.findall(r"\b[A-Z][A-Za-z]+\b", text):
+                group = "PER" if word in _PEOPLE else "ORG" if word in _TEAMS else "MISC"
+                entities.append({"entity_group": group, "word": word})
+            results.append(entities)
+        return results[0] if single else results
+
+
+def use_stub_models() -> None:
+    """Register the stand-in models in place of the real ones for this process."""
+    model_registry.register("spacy", _StubNLP)
+    model_registry.register("embedder", _StubEmbedder)
+    model_registry.register("summarizer", _StubSummarizer)
+    model_registry.register("ner", _StubNER)
+
+
+# Measurement helpers.
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def summarize_timings(seconds: list, items: int) -> dict:
+    """Total time, throughput and latency percentiles (in ms) of a list of timings."""
+    total = float(sum(seconds))
+    latencies = np.array(seconds) * 1000 if seconds else np.zeros(1)
+    return {
+        "seconds": round(total, 4),
+        "items": items,
+        "items_per_sec": round(items / total, 2) if total else None,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+class _Timer:
+    def __init__(self):
+        self.timings = {}
+
+    def time(self, stage: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.timings.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+
+def benchmark_stages(docs: list, batch_docs: int, batch_size: int) -> dict:
+    """
+    Time each pipeline stage separately over batches of batch_docs documents,
+    bypassing the pipeline cache, and return the per-stage summaries
+    (throughput in documents per second).
+    """
+    import pipeline
+
+    timer = _Timer()
+    for start in range(0, len(docs), batch_docs):
+        batch = docs[start:start + batch_docs]
+        clean = timer.time("preprocess", lambda: [pipeline.preprocess_text(doc["raw_text"]) for doc in batch])
+        sentences_per_doc = timer.time("sentences", pipeline.spacy_sentence_tokenize_many, clean, batch_size)
+        all_sentences = [sent for sentences in sentences_per_doc for sent in sentences]
+        sentence_embeddings = timer.time(
+            "sentence_embedding",
+            lambda: np.asarray(pipeline.embed_model.encode(all_sentences, batch_size=batch_size)).reshape(len(all_sentences), -1),
+        )
+
+        def cluster_all():
+            chunks, chunk_embeddings, offset = [], [], 0
+            for sentences in sentences_per_doc:
+                doc_chunks, doc_embeddings = pipeline.cluster_sentence_embeddings(
+                    sentences, sentence_embeddings[offset:offset + len(sentences)],
+                )
+                offset += len(sentences)
+                chunks.extend(doc_chunks)
+                chunk_embeddings.extend(doc_embeddings)
+            return chunks, chunk_embeddings
+
+        chunks, chunk_embeddings = timer.time("clustering", cluster_all)
+        timer.time("summarization", pipeline.summarize_chunks, chunks, batch_size)
+        timer.time("ner", pipeline.extract_tags_batch, chunks, batch_size)
+        unembedded = [chunk for chunk, emb in zip(chunks, chunk_embeddings) if emb is None]
+        timer.time("chunk_embedding", lambda: pipeline.embed_model.encode(unembedded, batch_size=batch_size))
+    return {stage: summarize_timings(seconds, len(docs)) for stage, seconds in timer.timings.items()}
+
+
+def benchmark_pipeline(docs: list, batch_docs: int, batch_size: int, cache_dir: str):
+    """Time run_pipeline_many end to end with an empty pipeline cache. Returns (summary, units)."""
+    import pipeline
+    from pipeline_cache import PipelineCache
+
+    # A fresh cache, so every document is processed rather than served from disk.
+    pipeline.pipeline_cache = PipelineCache(path=os.path.join(cache_dir, "pipeline_cache.db"))
+    timer = _Timer()
+    units = []
+    for start in range(0, len(docs), batch_docs):
+        results = timer.time("pipeline_total", pipeline.run_pipeline_many, docs[start:start + batch_docs], batch_size)
+        units.extend(unit for source_units in results.values() for unit in source_units)
+    return summarize_timings(timer.timings.get("pipeline_total", []), len(docs)), units
+
+
+def benchmark_search(units: list, docs: list, n_queries: int, modes: list, index_dir: str,
+                     mongo_uri: str = None, seed: int = 0) -> dict:
+    """
+    Load the units into MongoDB and the search indexes, then time GET /search end
+    to end through the FastAPI router, once with empty caches for every query and
+    once with warm caches.
+    """
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from pymongo import MongoClient
+    from db import init_store
+    from endpoints import search
+    from query_cache import query_embedding_cache, search_result_cache
+
+    if mongo_uri:
+        # A dedicated database, since the benchmark empties it before and after the run.
+        store = init_store(MongoClient(mongo_uri), db_name=BENCHMARK_DB_NAME)
+    else:
+        import mongomock
+        store = init_store(mongomock.MongoClient())
+    store.delete_all()
+    store.insert_many(units)
+    # Keep the benchmark's indexes away from the application's index files.
+    search.vector_index.path = os.path.join(index_dir, "faiss_index.bin")
+    search.vector_index.ids_path = search.vector_index.path + ".ids.json"
+    search.lexical_index.path = os.path.join(index_dir, "lexical_index.json")
+    search.metadata_index.path = os.path.join(index_dir, "metadata_index.json")
+    search.vector_index.rebuild(units)
+    search.lexical_index.rebuild(units)
+    search.metadata_index.rebuild(units)
+
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        if rng.random() < 0.3:
+            queries.append(rng.choice(docs)["source_id"])
+        else:
+            queries.append(f"{rng.choice(_COMPONENTS)} {rng.choice(_SYMPTOMS)}")
+
+    app = FastAPI()
+    app.include_router(search.router, prefix="")
+    client = TestClient(app)
+    report = {}
+    for mode in modes:
+        for cached in (False, True):
+            timings = []
+            for query in queries:
+                if not cached:
+                    query_embedding_cache.clear()
+                    search_result_cache.clear()
+                start = time.perf_counter()
+                response = client.get("/search", params={"query": query, "top_k": 5, "mode": mode})
+                timings.append(time.perf_counter() - start)
+                response.raise_for_status()
+            report[f"{mode}_{'cached' if cached else 'uncached'}"] = summarize_timings(timings, len(queries))
+    store.delete_all()
+    return report
+
+
+def run_benchmark(args) -> dict:
+    if args.stub_models:
+        use_stub_models()
+    docs = jira_corpus(args.jira, seed=args.seed) + confluence_corpus(args.confluence, seed=args.seed + 1)
+    report = {
+        "started_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "config": {
+            "jira_docs": args.jira,
+            "confluence_docs": args.confluence,
+            "batch_docs": args.batch_docs,
+            "batch_size": args.batch_size,
+            "queries": args.queries,
+            "stub_models": args.stub_models,
+            "corpus_chars": sum(len(doc["raw_text"]) for doc in docs),
+        },
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Model loading is reported separately so it does not skew the first batch.
+        load_start = time.perf_counter()
+        model_registry.warmup(["spacy", "embedder", "summarizer", "ner"], background=False)
+        report["model_load_seconds"] = round(time.perf_counter() - load_start, 3)
+        report["stages"] = benchmark_stages(docs, args.batch_docs, args.batch_size)
+        report["stages"]["pipeline_total"], units = benchmark_pipeline(docs, args.batch_docs, args.batch_size, work_dir)
+        report["units"] = len(units)
+        if args.queries:
+            report["search"] = benchmark_search(units, docs, args.queries, args.modes.split(","), work_dir,
+                                                mongo_uri=args.mongo_uri, seed=args.seed)
+    report["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline stages and /search.")
+    parser.add_argument("--jira", type=int, default=200, help="Number of synthetic Jira issues")
+    parser.add_argument("--confluence", type=int, default=50, help="Number of synthetic Confluence pages")
+    parser.add_argument("--batch-docs", type=int, default=16, help="Documents per pipeline call")
+    parser.add_argument("--batch-size", type=int, default=16, help="Model batch size (PIPELINE_BATCH_SIZE)")
+    parser.add_argument("--queries", type=int, default=200, help="Search queries per mode (0 to skip search)")
+    parser.add_argument("--modes", default="hybrid,dense,lexical", help="Search modes to time, comma-separated")
+    parser.add_argument("--stub-models", action="store_true", help="Use small offline stand-in models")
+    parser.add_argument("--mongo-uri", default=None,
+                        help=f"MongoDB to load the units into, database {BENCHMARK_DB_NAME} (default: mongomock)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    report = run_benchmark(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote benchmark report to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,121 @@
+# app/chroma_sync.py
+"""
+Copy knowledge units from MongoDB into the persistent Chroma collection used by
+the RAG system (rag_system.py), reusing their stored embeddings and ids.
+
+    python chroma_sync.py [--full] [--batch-size 5000]
+
+Each run only applies what changed since the previous one: units written since
+then are upserted and units deleted since then are removed. --full copies every
+unit and drops Chroma entries that no longer exist in MongoDB.
+"""
+import datetime
+import argparse
+from config import settings
+from db import get_store, DELETED_UNITS_TTL_DAYS
+from embedding_codec import decode_embeddings
+
+# Must match CHROMA_PATH / the collection name used by rag_system.py.
+CHROMA_PATH = getattr(settings, "CHROMA_PATH", "chroma_db")
+CHROMA_COLLECTION = getattr(settings, "CHROMA_COLLECTION", "documents")
+CHROMA_SYNC_BATCH = getattr(settings, "CHROMA_SYNC_BATCH", 5000)
+# Units are re-read from this long before the last sync, so a bulk write that was
+# still running during the previous sync is not missed. Upserts are idempotent.
+CHROMA_SYNC_OVERLAP_SECONDS = getattr(settings, "CHROMA_SYNC_OVERLAP_SECONDS", 300)
+SYNC_MARK_KEY = "chroma"
+
+SYNC_PROJECTION = {
+    "_id": 0, "id": 1, "embedding": 1, "chunk_text": 1, "summary": 1,
+    "speaker": 1, "source_audio_id": 1, "tags": 1, "timestamp": 1,
+}
+
+
+def open_collection(path: str = CHROMA_PATH, name: str = CHROMA_COLLECTION):
+    """Open (or create) the persistent Chroma collection."""
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    return client.get_or_create_collection(name=name, metadata={"hnsw:space": "cosine"})
+
+
+def unit_metadata(unit: dict) -> dict:
+    """Chroma metadata for a unit; Chroma only takes scalar, non-null values."""
+    metadata = {
+        "source": unit.get("speaker"),
+        "source_audio_id": unit.get("source_audio_id"),
+        "summary": unit.get("summary"),
+        "timestamp": unit.get("timestamp"),
+        "tags": ",".join(unit.get("tags") or []),
+    }
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+def _upsert(collection, units: list) -> int:
+    units = [unit for unit in units if unit.get("embedding") is not None and unit.get("chunk_text")]
+    if not units:
+        return 0
+    collection.upsert(
+        ids=[unit["id"] for unit in units],
+        embeddings=decode_embeddings([unit["embedding"] for unit in units]).tolist(),
+        documents=[unit["chunk_text"] for unit in units],
+        metadatas=[unit_metadata(unit) for unit in units],
+    )
+    return len(units)
+
+
+def _delete(collection, doc_ids: list, batch_size: int) -> int:
+    for start in range(0, len(doc_ids), batch_size):
+        collection.delete(ids=doc_ids[start:start + batch_size])
+    return len(doc_ids)
+
+
+def sync_to_chroma(collection=None, full: bool = False, batch_size: int = CHROMA_SYNC_BATCH) -> dict:
+    """
+    Bring the Chroma collection up to date with MongoDB and return the counts.
+    Falls back to a full sync on the first run, after the Mongo collection was
+    wiped (KnowledgeStore.delete_all) or when the deletion log no longer reaches
+    back to the previous sync.
+    """
+    store = get_store()
+    collection = collection if collection is not None else open_collection()
+    started = datetime.datetime.utcnow()
+    last_sync = store.get_sync_mark(SYNC_MARK_KEY)
+    reset_at = store.get_sync_mark("reset_at")
+    deletions_kept_since = started - datetime.timedelta(days=DELETED_UNITS_TTL_DAYS)
+    if last_sync is None or (reset_at is not None and reset_at >= last_sync) or last_sync < deletions_kept_since:
+        full = True
+
+    since = None if full else last_sync - datetime.timedelta(seconds=CHROMA_SYNC_OVERLAP_SECONDS)
+    upserted = 0
+    seen = set()
+    batch = []
+    for unit in store.iter_changed_since(since, SYNC_PROJECTION).batch_size(batch_size):
+        seen.add(unit["id"])
+        batch.append(unit)
+        if len(batch) >= batch_size:
+            upserted += _upsert(collection, batch)
+            batch = []
+    upserted += _upsert(collection, batch)
+
+    if full:
+        # Anything Chroma has that MongoDB no longer has was deleted.
+        existing = set(collection.get(include=[])["ids"])
+        stale = sorted(existing - store.all_ids())
+    else:
+        # A unit deleted and written again since then is live.
+        stale = [doc_id for doc_id in store.deleted_since(since) if doc_id not in seen]
+    deleted = _delete(collection, stale, batch_size)
+
+    store.set_sync_mark(SYNC_MARK_KEY, started)
+    return {"status": "success", "full": full, "upserted": upserted, "deleted": deleted}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sync knowledge units from MongoDB into the Chroma RAG store.")
+    parser.add_argument("--full", action="store_true", help="Copy every unit and drop stale Chroma entries")
+    parser.add_argument("--batch-size", type=int, default=CHROMA_SYNC_BATCH)
+    args = parser.parse_args()
+    result = sync_to_chroma(full=args.full, batch_size=args.batch_size)
+    kind = "Full" if result["full"] else "Incremental"
+    print(f"{kind} sync: upserted {result['upserted']} units, deleted {result['deleted']}.")
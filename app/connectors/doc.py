@@ -1,9 +1,12 @@
 # app/connectors/documentation.py
 
+import logging
 import requests
 from bs4 import BeautifulSoup
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 def fetch_documentation_page(page_id: str) -> dict:
     """
     Fetch a Confluence page by its ID and return a dictionary containing:
@@ -41,13 +44,12 @@ def fetch_documentation_page(page_id: str) -> dict:
 
 # Example usage:
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     # Replace '123456' with a valid Confluence page ID from your project.
     try:
         page_data = fetch_documentation_page("123456")
-        print("Fetched Documentation Page:")
-        print(f"Title: {page_data['title']}")
-        print(f"Version: {page_data['version']}")
-        print(f"Labels: {page_data['labels']}")
-        print(f"Text: {page_data['text'][:300]}...")  # Print the first 300 characters
+        logger.info("Fetched documentation page %r (version %s, labels %s)",
+                    page_data["title"], page_data["version"], page_data["labels"])
+        logger.debug("Text: %s...", page_data["text"][:300])
     except Exception as e:
-        print("Error:", str(e))
+        logger.error("Failed to fetch documentation page: %s", e)
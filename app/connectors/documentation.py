@@ -1,54 +1,118 @@
 # app/connectors/documentation.py
 
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 from config import settings
+from telemetry import record_http_response
 
-def fetch_documentation_page(page_id: str) -> dict:
+CONFLUENCE_PAGE_SIZE = getattr(settings, "CONFLUENCE_PAGE_SIZE", 50)
+CONFLUENCE_FETCH_CONCURRENCY = getattr(settings, "CONFLUENCE_FETCH_CONCURRENCY", 8)
+PAGE_EXPAND = "body.export_view,version,metadata.labels"
+
+# One pooled session for every Confluence call, sized for the concurrent body fetches.
+# Reuses Jira credentials since they share the same Atlassian workspace.
+_session = requests.Session()
+_session.auth = (settings.JIRA_USERNAME, settings.JIRA_API_TOKEN)
+_session.headers.update({"Accept": "application/json"})
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=CONFLUENCE_FETCH_CONCURRENCY)
+_session.mount("https://", _adapter)
+_session.mount("http://", _adapter)
+_session.hooks["response"].append(record_http_response("confluence"))
+
+def page_info_from_content(data: dict) -> dict:
     """
-    Fetch a Confluence page by its ID using Confluence REST API and the export view,
-    so we don't need to perform HTML scraping.
-    Reuses Jira credentials since they share the same Atlassian workspace.
+    Build the page dictionary used by the pipeline from a Confluence content object,
+    as returned by both the content and the search endpoints.
+    'text' is None when the object carries no export_view body.
     """
-    url = f"{settings.JIRA_BASE_URL}/wiki/rest/api/content/{page_id}?expand=body.export_view,version,metadata.labels"
-    auth = (settings.JIRA_USERNAME, settings.JIRA_API_TOKEN)
-    headers = {"Accept": "application/json"}
-    
-    response = requests.get(url, auth=auth, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"Failed to fetch page {page_id}: {response.status_code} - {response.text}")
-    
-    data = response.json()
-    text_content = data.get("body", {}).get("export_view", {}).get("value", "")
-    
-    page_info = {
+    body = data.get("body", {}).get("export_view")
+    return {
         "id": data.get("id"),
         "title": data.get("title"),
         "version": data.get("version", {}).get("number", 1),
         "labels": [lbl.get("name") for lbl in data.get("metadata", {}).get("labels", {}).get("results", [])],
-        "text": text_content
+        "text": body.get("value", "") if body is not None else None,
     }
-    print(f"Fetched page {page_info['id']} - {page_info['title']}")
+
+def fetch_documentation_page(page_id: str) -> dict:
+    """
+    Fetch a Confluence page by its ID using Confluence REST API and the export view,
+    so we don't need to perform HTML scraping.
+    """
+    url = f"{settings.JIRA_BASE_URL}/wiki/rest/api/content/{page_id}"
+    response = _session.get(url, params={"expand": PAGE_EXPAND})
+    if response.status_code != 200:
+        raise Exception(f"Failed to fetch page {page_id}: {response.status_code} - {response.text}")
+
+    page_info = page_info_from_content(response.json())
+    if page_info["text"] is None:
+        page_info["text"] = ""
     return page_info
 
-def list_confluence_pages(space_key: str, limit: int = 10) -> list:
+def fetch_documentation_pages(page_ids: list, max_workers: int = CONFLUENCE_FETCH_CONCURRENCY) -> list:
+    """Fetch several pages concurrently, at most max_workers at a time, in input order."""
+    if not page_ids:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(page_ids))) as executor:
+        return list(executor.map(fetch_documentation_page, page_ids))
+
+def next_page_url(links: dict):
     """
-    List Confluence pages in a given space using a CQL query.
-    Uses the search API endpoint which returns a list of results.
+    The URL of the next search result page, from a response's '_links', or None
+    on the last page. 'next' is relative to 'base' (the wiki root) and carries
+    the query, including Confluence Cloud's pagination cursor.
+    """
+    next_link = links.get("next")
+    if not next_link:
+        return None
+    if next_link.startswith(("http://", "https://")):
+        return next_link
+    base = links.get("base") or f"{settings.JIRA_BASE_URL}/wiki"
+    return base.rstrip("/") + next_link
+
+def iter_confluence_pages(space_key: str, limit: int = None, page_size: int = CONFLUENCE_PAGE_SIZE):
+    """
+    Yield the pages of a space one search result page at a time, as page dictionaries.
+    Follows the CQL search's 'next' links until `limit` pages (or all pages,
+    when limit is None) have been returned; Confluence Cloud pages the search
+    with a cursor and may ignore 'start', so no offsets are computed here.
+    Bodies already included in the search response are used as they are; only
+    pages missing one are fetched, concurrently.
     """
     url = f"{settings.JIRA_BASE_URL}/wiki/rest/api/content/search"
     # CQL: list pages in the given space that are of type 'page'
     params = {
         "cql": f"space = \"{space_key}\" AND type = page",
-        "limit": limit,
-        "expand": "body.export_view,version,metadata.labels"
+        "expand": PAGE_EXPAND,
+        "limit": page_size if limit is None else min(page_size, limit),
     }
-    auth = (settings.JIRA_USERNAME, settings.JIRA_API_TOKEN)
-    headers = {"Accept": "application/json"}
-    
-    response = requests.get(url, auth=auth, headers=headers, params=params)
-    if response.status_code != 200:
-        raise Exception(f"Failed to list pages for space {space_key}: {response.status_code} - {response.text}")
-    
-    data = response.json()
-    print(f"Found {len(data.get('results', []))} pages in space '{space_key}'")
-    return data.get("results", [])
+    returned = 0
+    while url and (limit is None or returned < limit):
+        response = _session.get(url, params=params)
+        if response.status_code != 200:
+            raise Exception(f"Failed to list pages for space {space_key}: {response.status_code} - {response.text}")
+
+        data = response.json()
+        results = data.get("results", [])
+        if limit is not None:
+            results = results[:limit - returned]
+        if not results:
+            return
+        pages = [page_info_from_content(result) for result in results if result.get("id")]
+        missing = [page for page in pages if page["text"] is None]
+        for page, fetched in zip(missing, fetch_documentation_pages([page["id"] for page in missing])):
+            page.update(fetched)
+        yield pages
+
+        returned += len(results)
+        # The next link already carries the query; it is requested as given.
+        url = next_page_url(data.get("_links", {}))
+        params = None
+
+def list_confluence_pages(space_key: str, limit: int = 10) -> list:
+    """
+    List Confluence pages in a given space using a CQL query.
+    Uses the search API endpoint which returns a list of results.
+    """
+    return [page for batch in iter_confluence_pages(space_key, limit) for page in batch]
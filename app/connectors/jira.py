@@ -1,24 +1,90 @@
 # app/connectors/jira.py
+import re
+import math
+import datetime
 import requests
+from requests.adapters import HTTPAdapter
 from config import settings
+from telemetry import record_http_response
 
-def fetch_jira_issues():
+JIRA_PAGE_SIZE = getattr(settings, "JIRA_PAGE_SIZE", 100)
+JIRA_FIELDS = "summary,description,created,updated,reporter,issuetype"
+
+# One pooled session for every Jira call, so pages reuse the same connections.
+_session = requests.Session()
+_session.auth = (settings.JIRA_USERNAME, settings.JIRA_API_TOKEN)  # using JIRA_EMAIL for clarity
+_session.headers.update({"Accept": "application/json"})
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+_session.hooks["response"].append(record_http_response("jira"))
+
+def parse_jira_datetime(value: str) -> datetime.datetime:
+    """Parse a Jira timestamp such as '2024-01-15T10:23:45.123+0000'."""
+    return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z")
+
+def format_jira_datetime(value: datetime.datetime) -> str:
+    """Format an aware datetime the way Jira does, in UTC: '2024-01-15T10:23:45.123+0000'."""
+    return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0000"
+
+def build_jql(jql: str, updated_since: str = None) -> str:
+    """
+    Restrict a JQL query to issues updated since the given Jira timestamp and order
+    it by 'updated', oldest first (then by key), so every page moves the
+    high-water mark forward. The bound is expressed relative to now (e.g. '-42m')
+    so it does not depend on the timezone Jira uses to interpret absolute dates.
+    """
+    base = re.split(r"\s+ORDER\s+BY\s+", jql, flags=re.IGNORECASE)[0].strip()
+    clauses = [f"({base})"] if base else []
+    if updated_since:
+        elapsed = datetime.datetime.now(datetime.timezone.utc) - parse_jira_datetime(updated_since)
+        # One extra minute of overlap because JQL compares at minute granularity.
+        minutes = max(1, math.ceil(elapsed.total_seconds() / 60) + 1)
+        clauses.append(f"updated >= -{minutes}m")
+    return " AND ".join(clauses) + " ORDER BY updated ASC, key ASC"
+
+def issue_position(issue: dict) -> tuple:
+    """Sort key of an issue in 'ORDER BY updated ASC, key ASC' order."""
+    project, _, number = issue.get("key", "").rpartition("-")
+    updated = parse_jira_datetime(issue.get("fields", {})["updated"])
+    return updated, project, int(number) if number.isdigit() else 0
+
+def iter_jira_issues(jql: str = None, updated_since: str = None, page_size: int = JIRA_PAGE_SIZE):
+    """
+    Yield the issues matching the JQL one page at a time, oldest update first.
+    When updated_since is given, only issues updated since then are returned.
+
+    Pages are read by keyset rather than by offset: every page re-runs the query
+    from the 'updated' time of the last issue yielded and drops the issues at or
+    before it. An issue updated while the sync runs moves to the end of the
+    results; with startAt offsets every later issue would shift one slot earlier
+    and one of them would be skipped, here it is simply fetched again further on.
+    Only when a whole page falls inside the minute-wide overlap (more than
+    page_size issues updated in the same minute) does it page by offset.
+    """
     api_endpoint = f"{settings.JIRA_BASE_URL}/rest/api/3/search"
-    params = {
-        "jql": settings.JQL_QUERY,
-        "maxResults": 50,
-        "fields": "summary,description,created,updated,reporter,issuetype"
-    }
-    response = requests.get(
-        api_endpoint,
-        params=params,
-        auth=(settings.JIRA_USERNAME, settings.JIRA_API_TOKEN),  # using JIRA_EMAIL for clarity
-        headers={"Accept": "application/json"}
-    )
-    # Debug logging:
-    print("Status Code:", response.status_code)
-    print("Response Text:", response.text)
-    
-    if response.status_code != 200:
-        raise Exception(f"Error from Jira: {response.status_code} - {response.text}")
-    return response.json().get("issues", [])
+    jql = jql or settings.JQL_QUERY
+    params = {"maxResults": page_size, "fields": JIRA_FIELDS}
+    last_seen = None  # issue_position of the last issue yielded
+    start_at = 0
+    while True:
+        params["jql"] = build_jql(jql, updated_since)
+        params["startAt"] = start_at
+        response = _session.get(api_endpoint, params=params)
+        if response.status_code != 200:
+            raise Exception(f"Error from Jira: {response.status_code} - {response.text}")
+        data = response.json()
+        issues = data.get("issues", [])
+        if not issues:
+            return
+        fresh = [issue for issue in issues if last_seen is None or issue_position(issue) > last_seen]
+        if fresh:
+            yield fresh
+            last_seen = issue_position(fresh[-1])
+            updated_since = fresh[-1]["fields"]["updated"]
+        if start_at + len(issues) >= data.get("total", 0):
+            return
+        start_at = 0 if fresh else start_at + len(issues)
+
+def fetch_jira_issues(jql: str = None, updated_since: str = None) -> list:
+    """Fetch every issue matching the JQL (all pages) as a single list."""
+    return [issue for page in iter_jira_issues(jql, updated_since) for issue in page]
@@ -0,0 +1,347 @@
+# app/db.py
+import datetime
+import threading
+from pymongo import MongoClient, ReplaceOne, UpdateMany, ASCENDING
+from pymongo.errors import OperationFailure
+from config import settings
+from embedding_codec import encode_unit
+from telemetry import metrics
+
+SYNC_STATE_COLLECTION = getattr(settings, "SYNC_STATE_COLLECTION", "sync_state")
+# Number of documents sent to MongoDB per bulk write.
+MONGO_WRITE_BATCH = getattr(settings, "MONGO_WRITE_BATCH", 1000)
+MONGO_MAX_POOL_SIZE = getattr(settings, "MONGO_MAX_POOL_SIZE", 50)
+# Ids of deleted units, kept this long so incremental consumers (the Chroma sync) can follow deletions.
+DELETED_UNITS_COLLECTION = getattr(settings, "DELETED_UNITS_COLLECTION", "deleted_units")
+DELETED_UNITS_TTL_DAYS = getattr(settings, "DELETED_UNITS_TTL_DAYS", 30)
+# Dedup fingerprints of the ingested sources, and which source each duplicate copies.
+FINGERPRINTS_COLLECTION = getattr(settings, "FINGERPRINTS_COLLECTION", "source_fingerprints")
+
+# Fields returned to /search callers; everything else (notably the embedding) stays in Mongo.
+SEARCH_PROJECTION = {"_id": 0, "id": 1, "chunk_text": 1, "summary": 1, "tags": 1, "timestamp": 1,
+                     "duplicate_sources": 1}
+# Fields needed to (re)build the vector index.
+INDEX_PROJECTION = {"_id": 0, "id": 1, "embedding": 1}
+# Fields needed to (re)build the lexical index.
+LEXICAL_PROJECTION = {"_id": 0, "id": 1, "chunk_text": 1, "summary": 1}
+# Fields needed to (re)build the metadata filter index.
+METADATA_PROJECTION = {"_id": 0, "id": 1, "speaker": 1, "source_audio_id": 1, "tags": 1, "timestamp": 1}
+
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _timed_write(operation: str, documents: int):
+    """Count the documents of a MongoDB write and time it in mongo_write_seconds."""
+    metrics.inc("mongo_written_documents", documents, "Documents sent to MongoDB writes", operation=operation)
+    return metrics.timed("mongo_write_seconds", "Latency of MongoDB writes", operation=operation)
+
+
+def _utcnow() -> datetime.datetime:
+    return datetime.datetime.utcnow()
+
+
+class KnowledgeStore:
+    """
+    Data-access layer for the knowledge unit collection.
+
+    Wraps a single MongoClient (and so a single connection pool) shared by the
+    whole process. Writes go out as unordered, chunked bulk operations and reads
+    use projections so callers only load the fields they need. Pass a
+    mongomock.MongoClient to run it without a server.
+    """
+
+    def __init__(self, client: MongoClient, db_name: str = None, collection_name: str = None,
+                 write_batch: int = MONGO_WRITE_BATCH):
+        self.client = client
+        self.db = client[db_name or settings.DB_NAME]
+        self.collection = self.db[collection_name or settings.COLLECTION_NAME]
+        self.sync_state = self.db[SYNC_STATE_COLLECTION]
+        self.deleted_units = self.db[DELETED_UNITS_COLLECTION]
+        self.fingerprints = self.db[FINGERPRINTS_COLLECTION]
+        self.write_batch = write_batch
+
+    def ensure_indexes(self) -> None:
+        # Units are upserted by id, so it must be unique; sparse, as legacy units may lack one.
+        try:
+            self.collection.create_index([("id", ASCENDING)], name="id", unique=True, sparse=True)
+        except OperationFailure:
+            # Earlier versions created it as a plain index under the same name.
+            self.collection.drop_index("id")
+            self.collection.create_index([("id", ASCENDING)], name="id", unique=True, sparse=True)
+        self.collection.create_index(
+            [("source_audio_id", ASCENDING), ("content_hash", ASCENDING)], name="source_audio_id_content_hash"
+        )
+        self.collection.create_index([("indexed_at", ASCENDING)], name="indexed_at")
+        self.deleted_units.create_index(
+            [("deleted_at", ASCENDING)], name="deleted_at", expireAfterSeconds=DELETED_UNITS_TTL_DAYS * 86400
+        )
+        self.fingerprints.create_index([("source_id", ASCENDING)], name="source_id", unique=True)
+        self.fingerprints.create_index([("canonical_id", ASCENDING)], name="canonical_id")
+
+    def close(self) -> None:
+        self.client.close()
+
+    # Reads
+
+    def find_all(self, projection: dict = None) -> list:
+        return list(self.collection.find({}, projection))
+
+    def iter_embeddings(self):
+        """Yield {'id', 'embedding'} for every unit that has an embedding."""
+        return self.collection.find({"embedding": {"$exists": True}}, INDEX_PROJECTION)
+
+    def count_embedded(self) -> int:
+        return self.collection.count_documents({"embedding": {"$exists": True}})
+
+    def iter_texts(self):
+        """Yield {'id', 'chunk_text', 'summary'} for every unit."""
+        return self.collection.find({"id": {"$exists": True}}, LEXICAL_PROJECTION)
+
+    def iter_metadata(self):
+        """Yield the filterable metadata (source, source_audio_id, tags, timestamp) of every unit."""
+        return self.collection.find({"id": {"$exists": True}}, METADATA_PROJECTION)
+
+    def count_units(self) -> int:
+        return self.collection.count_documents({"id": {"$exists": True}})
+
+    def find_by_ids(self, doc_ids: list, projection: dict = SEARCH_PROJECTION) -> dict:
+        """Return the units with the given ids, keyed by id."""
+        if not doc_ids:
+            return {}
+        return {doc["id"]: doc for doc in self.collection.find({"id": {"$in": list(doc_ids)}}, projection)}
+
+    def ids_for_sources(self, source_ids: list) -> list:
+        if not source_ids:
+            return []
+        cursor = self.collection.find({"source_audio_id": {"$in": list(source_ids)}}, {"_id": 0, "id": 1})
+        return [doc["id"] for doc in cursor]
+
+    def source_hashes(self, source_ids: list) -> set:
+        """Return the stored (source_audio_id, content_hash) pairs for the given sources."""
+        if not source_ids:
+            return set()
+        cursor = self.collection.find(
+            {"source_audio_id": {"$in": list(source_ids)}},
+            {"_id": 0, "source_audio_id": 1, "content_hash": 1},
+        )
+        return {(doc.get("source_audio_id"), doc.get("content_hash")) for doc in cursor}
+
+    def iter_changed_since(self, since: datetime.datetime = None, projection: dict = None):
+        """Yield the units written at or after `since` (every unit when None)."""
+        query = {"indexed_at": {"$gte": since}} if since else {}
+        return self.collection.find(query, projection)
+
+    def deleted_since(self, since: datetime.datetime) -> list:
+        """Ids of the units deleted at or after `since`."""
+        cursor = self.deleted_units.find({"deleted_at": {"$gte": since}}, {"_id": 0, "id": 1})
+        return [doc["id"] for doc in cursor]
+
+    def all_ids(self) -> set:
+        return {doc["id"] for doc in self.collection.find({"id": {"$exists": True}}, {"_id": 0, "id": 1})}
+
+    def source_versions(self, source_ids: list) -> dict:
+        """Return the stored source_version of each source, keyed by source id."""
+        if not source_ids:
+            return {}
+        cursor = self.collection.find(
+            {"source_audio_id": {"$in": list(source_ids)}},
+            {"_id": 0, "source_audio_id": 1, "source_version": 1},
+        )
+        return {doc["source_audio_id"]: doc.get("source_version") for doc in cursor}
+
+    # Writes
+
+    def insert_many(self, units: list) -> int:
+        """
+        Insert units in unordered batches, with embeddings stored as compact binary
+        (see embedding_codec). The caller's dicts are not modified.
+        Returns the number inserted.
+        """
+        inserted = 0
+        now = _utcnow()
+        for batch in _batches(units, self.write_batch):
+            encoded = [{**encode_unit(unit), "indexed_at": now} for unit in batch]
+            with _timed_write("insert_many", len(batch)):
+                inserted += len(self.collection.insert_many(encoded, ordered=False).inserted_ids)
+        return inserted
+
+    def upsert_many(self, units: list) -> int:
+        """Insert or replace units by their 'id' in unordered bulk writes."""
+        written = 0
+        now = _utcnow()
+        for batch in _batches(units, self.write_batch):
+            requests = [ReplaceOne({"id": unit["id"]}, {**encode_unit(unit), "indexed_at": now}, upsert=True)
+                        for unit in batch]
+            with _timed_write("upsert_many", len(batch)):
+                result = self.collection.bulk_write(requests, ordered=False)
+            written += result.upserted_count + result.modified_count
+        return written
+
+    def replace_sources(self, source_ids: list, units: list) -> list:
+        """
+        Replace every stored unit of the given sources with the given units.
+        The new units are upserted before the old ones are deleted, so a failure
+        in between leaves a source with its old units rather than none.
+        Returns the ids of the units that were stored before.
+        """
+        old_ids = self.ids_for_sources(source_ids)
+        if units:
+            self.upsert_many(units)
+        kept = {unit["id"] for unit in units}
+        removed = [doc_id for doc_id in old_ids if doc_id not in kept]
+        for batch in _batches(removed, self.write_batch):
+            with _timed_write("delete_sources", len(batch)):
+                self.collection.delete_many({"id": {"$in": batch}})
+        self.record_deletions(removed)
+        return old_ids
+
+    def transfer_units(self, source_id: str, new_source_id: str) -> list:
+        """Move every unit of a source to another source id. Returns the ids of the moved units."""
+        doc_ids = self.ids_for_sources([source_id])
+        if doc_ids:
+            with _timed_write("transfer_units", len(doc_ids)):
+                self.collection.update_many({"source_audio_id": source_id},
+                                            {"$set": {"source_audio_id": new_source_id, "indexed_at": _utcnow()}})
+        return doc_ids
+
+    def set_source_versions(self, versions: dict) -> None:
+        """Record a new source_version on the stored units of each source, given {source_id: version}."""
+        requests = [UpdateMany({"source_audio_id": source_id}, {"$set": {"source_version": version}})
+                    for source_id, version in versions.items()]
+        for batch in _batches(requests, self.write_batch):
+            with _timed_write("set_source_versions", len(batch)):
+                self.collection.bulk_write(batch, ordered=False)
+
+    def delete_sources(self, source_ids: list) -> list:
+        """Delete every unit of the given sources. Returns the removed ids."""
+        return self.replace_sources(source_ids, [])
+
+    def delete_all(self) -> None:
+        self.collection.delete_many({})
+        self.fingerprints.delete_many({})
+        # Too many ids to record one by one; incremental consumers resync fully instead.
+        self.set_sync_mark("reset_at", _utcnow())
+
+    def record_deletions(self, doc_ids: list) -> None:
+        now = _utcnow()
+        for batch in _batches(list(doc_ids), self.write_batch):
+            with _timed_write("record_deletions", len(batch)):
+                self.deleted_units.insert_many([{"id": doc_id, "deleted_at": now} for doc_id in batch], ordered=False)
+
+    # Dedup fingerprints
+
+    def iter_fingerprints(self):
+        return self.fingerprints.find({}, {"_id": 0})
+
+    def save_fingerprints(self, records: list) -> None:
+        """Insert or replace fingerprint records by their 'source_id'."""
+        now = _utcnow()
+        for batch in _batches(records, self.write_batch):
+            requests = [ReplaceOne({"source_id": record["source_id"]}, {**record, "updated_at": now}, upsert=True)
+                        for record in batch]
+            with _timed_write("save_fingerprints", len(batch)):
+                self.fingerprints.bulk_write(requests, ordered=False)
+
+    def delete_fingerprints(self, source_ids: list) -> None:
+        if source_ids:
+            self.fingerprints.delete_many({"source_id": {"$in": list(source_ids)}})
+
+    def duplicates_of(self, canonical_ids: list) -> dict:
+        """{duplicate source id: canonical source id} for the duplicates of the given sources."""
+        if not canonical_ids:
+            return {}
+        cursor = self.fingerprints.find({"canonical_id": {"$in": list(canonical_ids)}},
+                                        {"_id": 0, "source_id": 1, "canonical_id": 1})
+        return {record["source_id"]: record["canonical_id"] for record in cursor}
+
+    def duplicate_records(self, canonical_id: str) -> list:
+        """Fingerprint records of the duplicates of a source, exact ones first, then by similarity."""
+        records = list(self.fingerprints.find({"canonical_id": canonical_id}, {"_id": 0, "updated_at": 0}))
+        return sorted(records, key=lambda record: (record.get("duplicate_kind") != "exact",
+                                                   -(record.get("similarity") or 0.0), record["source_id"]))
+
+    def duplicate_hashes(self, source_ids: list) -> set:
+        """(source_id, content_hash) of the given sources that are recorded as duplicates."""
+        if not source_ids:
+            return set()
+        cursor = self.fingerprints.find({"source_id": {"$in": list(source_ids)}, "canonical_id": {"$ne": None}},
+                                        {"_id": 0, "source_id": 1, "content_hash": 1})
+        return {(record["source_id"], record.get("content_hash")) for record in cursor}
+
+    def set_canonical_ids(self, links: dict) -> None:
+        """Point the fingerprints of duplicates at another canonical source, given {duplicate_id: canonical_id}."""
+        requests = [UpdateMany({"source_id": duplicate_id}, {"$set": {"canonical_id": canonical_id}})
+                    for duplicate_id, canonical_id in links.items()]
+        for batch in _batches(requests, self.write_batch):
+            with _timed_write("set_canonical_ids", len(batch)):
+                self.fingerprints.bulk_write(batch, ordered=False)
+
+    def link_duplicates(self, links: dict) -> None:
+        """
+        Record on the units of each canonical source which duplicate sources it
+        stands for ('duplicate_sources'), given {duplicate_id: canonical_id}.
+        A duplicate is unlinked from any previous canonical first.
+        """
+        if not links:
+            return
+        self.unlink_duplicates(list(links))
+        by_canonical = {}
+        for duplicate_id, canonical_id in links.items():
+            by_canonical.setdefault(canonical_id, []).append(duplicate_id)
+        for canonical_id, duplicate_ids in by_canonical.items():
+            with _timed_write("link_duplicates", len(duplicate_ids)):
+                self.collection.update_many({"source_audio_id": canonical_id},
+                                            {"$addToSet": {"duplicate_sources": {"$each": duplicate_ids}}})
+
+    def unlink_duplicates(self, duplicate_ids: list) -> None:
+        if duplicate_ids:
+            self.collection.update_many({"duplicate_sources": {"$in": list(duplicate_ids)}},
+                                        {"$pullAll": {"duplicate_sources": list(duplicate_ids)}})
+
+    # Sync state
+
+    def get_sync_mark(self, key: str):
+        state = self.sync_state.find_one({"_id": key})
+        return state.get("value") if state else None
+
+    def set_sync_mark(self, key: str, value) -> None:
+        self.sync_state.update_one({"_id": key}, {"$set": {"value": value}}, upsert=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def init_store(client: MongoClient = None, db_name: str = None) -> KnowledgeStore:
+    """
+    Create the process-wide store (called from the FastAPI lifespan).
+    Pass a client, e.g. mongomock.MongoClient(), to use something other than
+    settings.MONGO_URI, and db_name to use a database other than settings.DB_NAME.
+    """
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+        _store = KnowledgeStore(client or MongoClient(settings.MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE),
+                                db_name=db_name)
+        _store.ensure_indexes()
+        return _store
+
+def get_store() -> KnowledgeStore:
+    """Return the process-wide store, creating it on first use (e.g. in scripts)."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = KnowledgeStore(MongoClient(settings.MONGO_URI, maxPoolSize=MONGO_MAX_POOL_SIZE))
+                _store.ensure_indexes()
+    return _store
+
+def close_store() -> None:
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
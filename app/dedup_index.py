@@ -0,0 +1,217 @@
+# app/dedup_index.py
+import re
+import zlib
+import hashlib
+import threading
+import numpy as np
+from bson.binary import Binary
+from config import settings
+from pipeline_cache import content_hash
+
+DEDUP_ENABLED = getattr(settings, "DEDUP_ENABLED", True)
+# Estimated Jaccard similarity of word shingles above which a document is a near duplicate.
+DEDUP_THRESHOLD = getattr(settings, "DEDUP_THRESHOLD", 0.85)
+DEDUP_SHINGLE_SIZE = getattr(settings, "DEDUP_SHINGLE_SIZE", 3)
+DEDUP_NUM_PERM = getattr(settings, "DEDUP_NUM_PERM", 128)
+# LSH bands; with 128 permutations, 16 bands of 8 rows make pairs above ~0.7
+# similarity collide in at least one band with high probability.
+DEDUP_BANDS = getattr(settings, "DEDUP_BANDS", 16)
+# Stored signatures are only comparable when produced with the same settings.
+DEDUP_VERSION = f"minhash:{DEDUP_NUM_PERM}:shingle{DEDUP_SHINGLE_SIZE}"
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+# Fixed seed: signatures are persisted and must be reproducible in every process.
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=DEDUP_NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=DEDUP_NUM_PERM, dtype=np.uint64)
+
+
+def normalized_text_hash(text: str) -> str:
+    """Hash of the text lowercased with punctuation and whitespace runs collapsed."""
+    normalized = " ".join(re.findall(r"\w+", (text or "").lower()))
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def minhash_signature(text: str, shingle_size: int = DEDUP_SHINGLE_SIZE) -> np.ndarray:
+    """MinHash signature (DEDUP_NUM_PERM uint32 values) of the text's word shingles."""
+    words = re.findall(r"\w+", (text or "").lower())
+    shingles = {" ".join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                         dtype=np.uint64, count=len(shingles))
+    # (a * x + b) mod p over 32-bit x and a cannot overflow 64 bits.
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def fingerprint(doc: dict) -> dict:
+    """
+    The dedup fingerprint of a pipeline input document. 'content_hash' is the
+    exact hash change detection uses, so an unchanged duplicate can be skipped.
+    """
+    return {
+        "source_id": doc["source_id"],
+        "text_hash": normalized_text_hash(doc["raw_text"]),
+        "signature": minhash_signature(doc["raw_text"]),
+        "content_hash": content_hash(doc["raw_text"]),
+    }
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Jaccard similarity estimated from two MinHash signatures."""
+    return float(np.mean(a == b))
+
+
+class DuplicateIndex:
+    """
+    Exact and near-duplicate lookup over the ingested source documents (Jira
+    issues, Confluence pages, recordings).
+
+    Exact duplicates are found by the hash of the normalized text, near
+    duplicates by MinHash over word shingles with LSH banding: only documents
+    sharing a band are compared, and a candidate is a duplicate when its
+    estimated similarity reaches the threshold. Only canonical documents are
+    indexed, so a duplicate always points at the original rather than at
+    another duplicate. The fingerprints themselves are stored in MongoDB (see
+    KnowledgeStore.save_fingerprints) and loaded from there on startup.
+    """
+
+    def __init__(self, threshold: float = DEDUP_THRESHOLD, bands: int = DEDUP_BANDS):
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = DEDUP_NUM_PERM // bands
+        self._lock = threading.RLock()
+        self._clear()
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._signatures)
+
+    def load(self, fingerprints) -> None:
+        """Replace the index with the stored canonical fingerprints."""
+        with self._lock:
+            self._clear()
+            for record in fingerprints:
+                if record.get("canonical_id") is None:
+                    record = stored_fingerprint(record)
+                    self._index(record["source_id"], record["text_hash"], record["signature"])
+
+    def add(self, fingerprints) -> None:
+        """Index (or re-index) canonical fingerprints."""
+        with self._lock:
+            for record in fingerprints:
+                self._unindex(record["source_id"])
+                self._index(record["source_id"], record["text_hash"], record["signature"])
+
+    def remove(self, source_ids) -> None:
+        with self._lock:
+            for source_id in source_ids:
+                self._unindex(source_id)
+
+    def find(self, record: dict, exclude: set = ()):
+        """
+        Return (canonical_id, kind, similarity) of the indexed document the
+        fingerprint duplicates, kind being "exact" or "near", or None.
+        """
+        with self._lock:
+            canonical = self._by_hash.get(record["text_hash"])
+            if canonical is not None and canonical not in exclude and canonical != record["source_id"]:
+                return canonical, "exact", 1.0
+            candidates = set()
+            for key in self._band_keys(record["signature"]):
+                candidates |= self._buckets.get(key, set())
+            candidates -= set(exclude) | {record["source_id"]}
+            best = None
+            for source_id in candidates:
+                score = similarity(record["signature"], self._signatures[source_id])
+                if score >= self.threshold and (best is None or score > best[2]):
+                    best = (source_id, "near", score)
+            return best
+
+    def split(self, docs: list) -> tuple:
+        """
+        Split pipeline input documents into (unique, duplicates, fingerprints).
+        A document is a duplicate when it matches an indexed document or an
+        earlier unique document of the same batch. duplicates maps source_id to
+        (canonical_id, kind, similarity); fingerprints maps every source_id to its
+        fingerprint. The index itself is not modified; see add().
+        """
+        batch = DuplicateIndex(self.threshold, self.bands)
+        unique, duplicates, fingerprints = [], {}, {}
+        source_ids = {doc["source_id"] for doc in docs}
+        for doc in docs:
+            record = fingerprints[doc["source_id"]] = fingerprint(doc)
+            # Other documents of this batch are judged against their new text, not the indexed one.
+            match = self.find(record, exclude=source_ids) or batch.find(record)
+            if match is None:
+                unique.append(doc)
+                batch.add([record])
+            else:
+                duplicates[doc["source_id"]] = match
+        return unique, duplicates, fingerprints
+
+    def _band_keys(self, signature) -> list:
+        if signature is None:
+            return []
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+                for band in range(self.bands)]
+
+    def _clear(self) -> None:
+        self._by_hash = {}  # text hash -> canonical source_id
+        self._hashes = {}  # source_id -> text hash
+        self._signatures = {}  # source_id -> MinHash signature
+        self._buckets = {}  # (band, band bytes) -> source_ids
+
+    def _index(self, source_id: str, text_hash: str, signature) -> None:
+        self._hashes[source_id] = text_hash
+        self._by_hash.setdefault(text_hash, source_id)
+        if signature is not None:
+            self._signatures[source_id] = signature
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(source_id)
+
+    def _unindex(self, source_id: str) -> None:
+        text_hash = self._hashes.pop(source_id, None)
+        if text_hash is not None and self._by_hash.get(text_hash) == source_id:
+            del self._by_hash[text_hash]
+        signature = self._signatures.pop(source_id, None)
+        for key in self._band_keys(signature):
+            ids = self._buckets.get(key)
+            if ids is not None:
+                ids.discard(source_id)
+                if not ids:
+                    del self._buckets[key]
+
+
+def fingerprint_record(record: dict, canonical_id: str = None, kind: str = None, score: float = None) -> dict:
+    """The MongoDB form of a fingerprint, linked to its canonical source for duplicates."""
+    return {
+        "source_id": record["source_id"],
+        "text_hash": record["text_hash"],
+        "content_hash": record.get("content_hash"),
+        "signature": Binary(record["signature"].tobytes()),
+        "version": DEDUP_VERSION,
+        "canonical_id": canonical_id,
+        "duplicate_kind": kind,
+        "similarity": score,
+    }
+
+
+def stored_fingerprint(record: dict) -> dict:
+    """
+    The in-memory form of a fingerprint loaded from MongoDB (see fingerprint_record).
+    Signatures from another DEDUP_VERSION are dropped, leaving exact matching only.
+    """
+    signature = None
+    if record.get("version") == DEDUP_VERSION and record.get("signature") is not None:
+        signature = np.frombuffer(bytes(record["signature"]), dtype=np.uint32)
+    return {
+        "source_id": record["source_id"],
+        "text_hash": record["text_hash"],
+        "signature": signature,
+        "content_hash": record.get("content_hash"),
+    }
+
+
+# Shared, process-wide index used by the ingest endpoints.
+duplicate_index = DuplicateIndex()
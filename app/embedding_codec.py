@@ -0,0 +1,71 @@
+# app/embedding_codec.py
+import struct
+import numpy as np
+from bson.binary import Binary
+from config import settings
+
+# Storage format for embeddings in MongoDB: "float32", "float16" or "int8".
+EMBEDDING_STORAGE_DTYPE = getattr(settings, "EMBEDDING_STORAGE_DTYPE", "float32")
+
+# Encoded embeddings are a small header followed by the raw vector bytes:
+#   byte 0     dtype code (see _CODES), bytes 1-3 padding
+#   bytes 4-7  float32 scale, int8 only
+_CODES = {"float32": 1, "float16": 2, "int8": 3}
+_DTYPES = {code: name for name, code in _CODES.items()}
+_HEADER = 4
+
+
+def encode_embedding(embedding, dtype: str = EMBEDDING_STORAGE_DTYPE) -> Binary:
+    """
+    Pack an embedding into a compact BSON Binary value.
+    int8 uses symmetric per-vector quantization: value = q * scale.
+    """
+    if dtype not in _CODES:
+        raise ValueError(f"Unsupported embedding storage dtype: {dtype}")
+    vector = np.asarray(embedding, dtype="float32").ravel()
+    header = bytes([_CODES[dtype], 0, 0, 0])
+    if dtype == "int8":
+        max_abs = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = max_abs / 127.0 if max_abs > 0 else 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype("int8")
+        return Binary(header + struct.pack("<f", scale) + quantized.tobytes())
+    return Binary(header + vector.astype(dtype).tobytes())
+
+
+def embedding_dtype(value):
+    """The storage dtype of an encoded embedding, or None for the legacy list format."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return _DTYPES.get(bytes(value[:1])[0])
+    return None
+
+
+def decode_embedding(value) -> np.ndarray:
+    """
+    Return an embedding as a float32 vector. Accepts encoded bytes as well as the
+    legacy list-of-floats format. float32 data is viewed without copying.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        buffer = bytes(value) if isinstance(value, memoryview) else value
+        dtype = _DTYPES.get(buffer[0])
+        if dtype is None:
+            raise ValueError(f"Unknown embedding encoding: {buffer[0]}")
+        if dtype == "int8":
+            scale = struct.unpack_from("<f", buffer, _HEADER)[0]
+            return np.frombuffer(buffer, dtype="int8", offset=_HEADER + 4).astype("float32") * scale
+        vector = np.frombuffer(buffer, dtype=dtype, offset=_HEADER)
+        return vector if dtype == "float32" else vector.astype("float32")
+    return np.asarray(value, dtype="float32")
+
+
+def decode_embeddings(values: list) -> np.ndarray:
+    """Stack many stored embeddings into one (n, dim) float32 matrix."""
+    if not values:
+        return np.empty((0, 0), dtype="float32")
+    return np.vstack([decode_embedding(value) for value in values])
+
+
+def encode_unit(unit: dict, dtype: str = EMBEDDING_STORAGE_DTYPE) -> dict:
+    """Return a shallow copy of a knowledge unit with its embedding encoded for storage."""
+    if unit.get("embedding") is None or isinstance(unit["embedding"], (bytes, bytearray)):
+        return dict(unit)
+    return {**unit, "embedding": encode_embedding(unit["embedding"], dtype)}
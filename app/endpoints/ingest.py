@@ -1,39 +1,337 @@
 # app/endpoints/ingest.py
-from fastapi import APIRouter, HTTPException
-from connectors.jira import fetch_jira_issues
-from pipeline import run_pipeline
+import datetime
+import threading
+from fastapi import APIRouter, HTTPException, Query
+from connectors.jira import iter_jira_issues, parse_jira_datetime, format_jira_datetime
+from job_queue import JobContext
+from streaming import run_stages
+from pipeline_cache import pipeline_cache, content_hash
 from config import settings
-from pymongo import MongoClient
+from db import get_store
+from vector_index import vector_index
+from lexical_index import lexical_index
+from metadata_index import metadata_index
+from query_cache import corpus_version
+from dedup_index import duplicate_index, fingerprint_record, stored_fingerprint, DEDUP_ENABLED
+from telemetry import metrics
 
 router = APIRouter()
 
+# Long-lived in-memory indexes that must follow every write to the collection.
+SEARCH_INDEXES = (vector_index, lexical_index, metadata_index)
+# Set when the in-memory indexes hold changes not yet written to disk.
+_indexes_dirty = threading.Event()
+
+def update_search_indexes(units: list = (), removed_ids: list = ()) -> None:
+    """
+    Keep the long-lived search indexes in step with the collection: drop the
+    removed unit ids and add (or replace) the given units, in memory only.
+    Saving rewrites each index whole, so it is left to flush_search_indexes,
+    once per ingest rather than once per batch.
+    Bumps the corpus version, which invalidates the cached /search results.
+    """
+    for index in SEARCH_INDEXES:
+        index.remove(list(removed_ids), persist=False)
+        index.add(units, persist=False)
+    _indexes_dirty.set()
+    corpus_version.bump()
+
+def flush_search_indexes() -> bool:
+    """Persist the search indexes if they changed since the last flush. Returns whether they were saved."""
+    if not _indexes_dirty.is_set():
+        return False
+    # Cleared first, so changes made while saving are flushed by the next call.
+    _indexes_dirty.clear()
+    try:
+        for index in SEARCH_INDEXES:
+            index.save()
+    except Exception:
+        _indexes_dirty.set()
+        raise
+    return True
+
 def insert_to_mongo(data: list):
-    client = MongoClient(settings.MONGO_URI)
-    db = client[settings.DB_NAME]
-    collection = db[settings.COLLECTION_NAME]
-    collection.insert_many(data)
+    get_store().upsert_many(data)
+    update_search_indexes(data)
+    flush_search_indexes()
+
+def promote_duplicate(source_id: str):
+    """
+    Make the closest duplicate of a canonical source canonical in its place:
+    the source's units (which stand for its duplicates too) move to it, and the
+    other duplicates are re-pointed at it. Returns the promoted source id, or
+    None when the source has no duplicates. The moved units keep the content
+    hash of the old text, so the promoted source is processed anew the next
+    time it is ingested.
+    """
+    store = get_store()
+    duplicates = store.duplicate_records(source_id)
+    if not duplicates:
+        return None
+    promoted = duplicates[0]
+    promoted_id = promoted["source_id"]
+    store.save_fingerprints([{**promoted, "canonical_id": None, "duplicate_kind": None, "similarity": None}])
+    others = {record["source_id"]: promoted_id for record in duplicates[1:]}
+    store.set_canonical_ids(others)
+    doc_ids = store.transfer_units(source_id, promoted_id)
+    store.unlink_duplicates([promoted_id])
+    store.link_duplicates(others)
+    duplicate_index.add([stored_fingerprint(promoted)])
+    # The metadata index filters on the units' source id.
+    update_search_indexes(list(store.find_by_ids(doc_ids, projection={"_id": 0}).values()))
+    return promoted_id
+
+def delete_from_mongo(source_id: str) -> int:
+    """
+    Delete every knowledge unit ingested from the given source (e.g. a Jira issue key)
+    from MongoDB and from the search index. A source that stands for duplicates
+    hands its units over to one of them instead (see promote_duplicate).
+    Returns the number of deleted units.
+    """
+    store = get_store()
+    promote_duplicate(source_id)
+    doc_ids = store.delete_sources([source_id])
+    update_search_indexes(removed_ids=doc_ids)
+    flush_search_indexes()
+    store.unlink_duplicates([source_id])
+    store.delete_fingerprints([source_id])
+    duplicate_index.remove([source_id])
+    return len(doc_ids)
+
+def upsert_to_mongo(results: dict) -> int:
+    """
+    Replace the stored knowledge units of each source with freshly processed ones.
+    Takes the {source_id: units} dict returned by run_pipeline_many, so an updated
+    issue swaps its old units for new ones in MongoDB and in the search index
+    instead of being appended next to them. Returns the number of units written.
+    """
+    source_ids = list(results)
+    units = [unit for source_units in results.values() for unit in source_units]
+    if not source_ids:
+        return 0
+    old_ids = get_store().replace_sources(source_ids, units)
+    update_search_indexes(units, removed_ids=old_ids)
+    return len(units)
+
+def issue_to_doc(issue: dict) -> dict:
+    """Turn a Jira issue into a pipeline input document."""
+    issue_key = issue.get("key", "unknown")
+    fields = issue.get("fields", {})
+    summary = fields.get("summary", "")
+    description = fields.get("description", "")
+    raw_text = f"Summary: {summary}\nDescription: {description}"
+    return {"raw_text": raw_text, "source_id": issue_key}
+
+def filter_unchanged(docs: list) -> list:
+    """
+    Drop documents whose text is already stored for the same source, judged by the
+    'content_hash' recorded on their knowledge units, so unchanged issues are
+    neither reprocessed nor inserted again. Known duplicates have no units of
+    their own; their fingerprint records the hash instead.
+    """
+    if not docs:
+        return []
+    store = get_store()
+    source_ids = [doc["source_id"] for doc in docs]
+    stored = store.source_hashes(source_ids) | store.duplicate_hashes(source_ids)
+    return [doc for doc in docs if (doc["source_id"], content_hash(doc["raw_text"])) not in stored]
+
+def split_duplicates(docs: list) -> tuple:
+    """
+    Split documents into (unique, duplicates, fingerprints) before the expensive
+    pipeline stages; see DuplicateIndex.split. Everything is unique when
+    DEDUP_ENABLED is off.
+    """
+    if not DEDUP_ENABLED or not docs:
+        return list(docs), {}, {}
+    unique, duplicates, fingerprints = duplicate_index.split(docs)
+    # Reserve the unique documents right away, so batches that are checked while
+    # this one is still in the pipeline see them too (see record_duplicates).
+    duplicate_index.add([fingerprints[doc["source_id"]] for doc in unique])
+    for _, kind, _ in duplicates.values():
+        metrics.inc("ingest_duplicates", 1, "Ingested documents skipped as duplicates", kind=kind)
+    return unique, duplicates, fingerprints
+
+def release_duplicate_reservations() -> None:
+    """After a failed ingest, drop reserved fingerprints that were never stored."""
+    duplicate_index.load(get_store().iter_fingerprints())
+
+def record_duplicates(unique_docs: list, duplicates: dict, fingerprints: dict) -> int:
+    """
+    After the unique documents were stored: save every fingerprint, index the
+    unique ones as canonical (confirming their reservation) and link each duplicate to its canonical source
+    ('duplicate_sources' on the canonical units). A source that had units of
+    its own and is now a duplicate loses them, and its own duplicates move to
+    its canonical. Returns the number of units removed.
+    """
+    if not fingerprints:
+        return 0
+    store = get_store()
+    unique_ids = [doc["source_id"] for doc in unique_docs]
+    canonical = [fingerprints[source_id] for source_id in unique_ids]
+    store.save_fingerprints(
+        [fingerprint_record(record) for record in canonical]
+        + [fingerprint_record(fingerprints[source_id], *match) for source_id, match in duplicates.items()]
+    )
+    duplicate_index.remove(list(duplicates))
+    duplicate_index.add(canonical)
+
+    # Freshly written canonical units carry no links yet: restore those of earlier
+    # duplicates, then add the new ones.
+    links = store.duplicates_of(unique_ids)
+    store.unlink_duplicates(unique_ids)
+    links.update({source_id: match[0] for source_id, match in duplicates.items()})
+    # A canonical source that became a duplicate itself hands its duplicates
+    # over to its new canonical, so none is left pointing at a source without units.
+    handed_over = {source_id: duplicates[canonical_id][0]
+                   for source_id, canonical_id in store.duplicates_of(list(duplicates)).items()
+                   if source_id not in fingerprints}
+    store.set_canonical_ids(handed_over)
+    links.update(handed_over)
+    store.link_duplicates(links)
+
+    removed = []
+    if duplicates:
+        removed = store.delete_sources(list(duplicates))
+        if removed:
+            update_search_indexes(removed_ids=removed)
+    return len(removed)
+
+def dedup_report(examined: int, duplicates: dict) -> dict:
+    """Exact and near duplicate counts and the share of examined documents they make up."""
+    kinds = [kind for _, kind, _ in duplicates.values()]
+    return {
+        "duplicates_exact": kinds.count("exact"),
+        "duplicates_near": kinds.count("near"),
+        "dedup_ratio": round(len(kinds) / examined, 4) if examined else 0.0,
+    }
+
+def prepare_batch(docs: list) -> dict:
+    """
+    Text extraction stage of a streaming ingest: keep the changed documents and
+    set the duplicates among them aside (see split_duplicates).
+    """
+    changed_docs = filter_unchanged(docs)
+    unique_docs, duplicates, fingerprints = split_duplicates(changed_docs)
+    changed_ids = {doc["source_id"] for doc in changed_docs}
+    return {
+        "docs": len(docs),
+        "changed": len(changed_docs),
+        "unchanged": [doc["source_id"] for doc in docs if doc["source_id"] not in changed_ids],
+        "unique": unique_docs,
+        "duplicates": duplicates,
+        "fingerprints": fingerprints,
+    }
+
+def infer_batch(ctx: JobContext, batch: dict) -> dict:
+    """Inference stage: run the whole batch through the pipeline in shared model batches."""
+    batch["results"] = ctx.run_pipeline_many(batch["unique"]) if batch["unique"] else {}
+    return batch
+
+def store_batch(batch: dict) -> dict:
+    """
+    Write stage: replace the units of the processed sources and record the
+    duplicates. Returns the batch's counters; the units themselves are dropped.
+    """
+    written = upsert_to_mongo(batch["results"])
+    record_duplicates(batch["unique"], batch["duplicates"], batch["fingerprints"])
+    return {
+        "docs": batch["docs"],
+        "skipped_unchanged": batch["docs"] - batch["changed"],
+        "examined": batch["changed"],
+        "processed": len(batch["results"]),
+        "inserted_count": written,
+        "duplicates": batch["duplicates"],
+    }
+
+def sync_jira(ctx: JobContext, incremental: bool = False) -> dict:
+    """
+    Ingest the issues matching the configured JQL query.
+    Fetching, change and duplicate detection, inference and storage run as
+    concurrent stages over pages of issues (see streaming.run_stages), so the
+    next page is downloaded while the current one is in the models and the
+    previous one is written, and only a few pages are held in memory at once.
+    Issues whose text is unchanged are skipped, and the units of changed issues
+    replace their previous ones. The newest 'updated' timestamp seen is stored
+    per JQL query once its page is written, so an incremental run only pulls
+    issues changed since, and an interrupted run resumes after the last stored
+    page. The mark never passes the start of the sync minus a minute: issues
+    updated while it runs are left for the next incremental run to look at
+    again, since JQL only filters 'updated' to the minute.
+    Progress and stage timings are reported through ctx.
+    """
+    jql = settings.JQL_QUERY
+    mark_key = f"jira:{jql}"
+    updated_since = get_store().get_sync_mark(mark_key) if incremental else None
+    mark_cap = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=1)
+
+    def prepare(issues: list) -> dict:
+        batch = prepare_batch([issue_to_doc(issue) for issue in issues])
+        newest = max((parse_jira_datetime(issue["fields"]["updated"]) for issue in issues
+                      if issue.get("fields", {}).get("updated")), default=None)
+        batch["newest"] = format_jira_datetime(min(newest, mark_cap)) if newest else ""
+        return batch
+
+    def store(batch: dict) -> dict:
+        counts = store_batch(batch)
+        # Pages come oldest-first and are stored in order, so the mark only moves past stored issues.
+        if batch["newest"]:
+            get_store().set_sync_mark(mark_key, batch["newest"])
+        counts["newest"] = batch["newest"]
+        return counts
+
+    totals = {"fetched": 0, "processed": 0, "skipped_unchanged": 0, "inserted_count": 0, "examined": 0}
+    duplicates = {}
+    stages = [("prepare", prepare), ("pipeline", lambda batch: infer_batch(ctx, batch)), ("store", store)]
+    try:
+        for counts in run_stages(iter_jira_issues(jql, updated_since=updated_since), stages, ctx):
+            totals["fetched"] += counts["docs"]
+            for key in ("processed", "skipped_unchanged", "inserted_count", "examined"):
+                totals[key] += counts[key]
+            duplicates.update(counts["duplicates"])
+            updated_since = counts["newest"] or updated_since
+            ctx.update(fetched=totals["fetched"], processed=totals["processed"],
+                       skipped_unchanged=totals["skipped_unchanged"], inserted_count=totals["inserted_count"],
+                       **dedup_report(totals["examined"], duplicates))
+    except Exception:
+        release_duplicate_reservations()
+        raise
+    finally:
+        # Pages stored before a failure stay searchable after a restart too.
+        flush_search_indexes()
+
+    if not totals["fetched"] and not incremental:
+        raise Exception("No issues retrieved from Jira.")
+    return {
+        "status": "success",
+        "inserted_count": totals["inserted_count"],
+        "updated_issues": totals["processed"],
+        "skipped_unchanged": totals["skipped_unchanged"],
+        **dedup_report(totals["examined"], duplicates),
+        "high_water_mark": updated_since,
+    }
+
+@router.get("/ingest/jira", deprecated=True)
+def ingest_jira(incremental: bool = Query(False, description="Only fetch issues updated since the last sync")):
+    """
+    Synchronously ingest Jira issues; see sync_jira.
+    Deprecated: the request holds a server thread for the whole run and bypasses
+    the inference workers. Use POST /jobs/ingest/jira instead.
+    """
+    try:
+        return sync_jira(JobContext(), incremental)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/ingest/cache")
+def ingest_cache_stats():
+    """Report the size and per-stage hit rates of the pipeline output cache."""
+    return {"status": "success", "cache": pipeline_cache.stats()}
 
-@router.get("/ingest/jira")
-def ingest_jira():
+@router.delete("/ingest/{source_id}")
+def delete_ingested(source_id: str):
     try:
-        issues = fetch_jira_issues()
-        if not issues:
-            raise Exception("No issues retrieved from Jira.")
-
-        all_units = []
-        for issue in issues:
-            issue_key = issue.get("key", "unknown")
-            fields = issue.get("fields", {})
-            summary = fields.get("summary", "")
-            description = fields.get("description", "")
-            raw_text = f"Summary: {summary}\nDescription: {description}"
-            knowledge_units = run_pipeline(raw_text, source_id=issue_key)
-            # Optionally tag each unit with its source (here, Jira issue key)
-            for unit in knowledge_units:
-                unit["source_audio_id"] = issue_key
-            all_units.extend(knowledge_units)
-
-        insert_to_mongo(all_units)
-        return {"status": "success", "inserted_count": len(all_units)}
+        deleted = delete_from_mongo(source_id)
+        return {"status": "success", "deleted_count": deleted}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
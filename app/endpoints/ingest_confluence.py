@@ -1,35 +1,111 @@
 # app/endpoints/ingest_confluence_bulk.py
 
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Query
-from connectors.documentation import fetch_documentation_page, list_confluence_pages
-from pipeline import run_pipeline
+from db import get_store
+from connectors.documentation import iter_confluence_pages
+from endpoints.ingest import (
+    prepare_batch, infer_batch, store_batch, dedup_report, release_duplicate_reservations, flush_search_indexes,
+)
+from job_queue import JobContext
+from streaming import run_stages
 
 router = APIRouter()
 
-@router.get("/ingest/confluence/bulk")
+def get_stored_versions(page_ids: list) -> dict:
+    """
+    Return the stored Confluence version number of each page, keyed by page id.
+    Pages that were never ingested are left out.
+    """
+    return get_store().source_versions(page_ids)
+
+def ingest_confluence_space(ctx: JobContext, space_key: str, limit: int = None) -> dict:
+    """
+    Ingest up to `limit` pages (all pages when None) of a Confluence space.
+    Search result batches stream through concurrent stages (see
+    streaming.run_stages): while one batch is fetched, the previous one is in
+    the pipeline and the one before is written. Pages whose version is already
+    stored are skipped, the rest are run through the pipeline together and
+    their units replace any previous ones in MongoDB. Every batch is stored as
+    soon as it is processed, so an interrupted run keeps what it wrote and the
+    next one skips those pages.
+    Progress and stage timings are reported through ctx.
+    """
+    def prepare(pages: list) -> dict:
+        stored_versions = get_stored_versions([page["id"] for page in pages])
+        changed = [page for page in pages if stored_versions.get(page["id"]) != page["version"]]
+        # Combine title and text (this helps provide context to the pipeline)
+        docs = [{"raw_text": f"{page['title']}: {page['text']}", "source_id": page["id"], "source": "Confluence"}
+                for page in changed]
+        # Pages copied between spaces are linked to their original instead of processed.
+        batch = prepare_batch(docs)
+        # Pages skipped on their version are found but unchanged, like those skipped on their text.
+        batch["docs"] += len(pages) - len(changed)
+        batch["versions"] = {page["id"]: page["version"] for page in changed}
+        return batch
+
+    def infer(batch: dict) -> dict:
+        batch = infer_batch(ctx, batch)
+        for page_id, units in batch["results"].items():
+            for unit in units:
+                unit["source_version"] = batch["versions"][page_id]
+        return batch
+
+    def store(batch: dict) -> dict:
+        counts = store_batch(batch)
+        # A new version with the same text (e.g. a metadata-only edit) keeps its
+        # units; record the version on them so the page is skipped next time.
+        get_store().set_source_versions({page_id: batch["versions"][page_id] for page_id in batch["unchanged"]})
+        return counts
+
+    found = 0
+    skipped = 0
+    ingested_pages = 0
+    written = 0
+    examined = 0
+    duplicates = {}
+    stages = [("prepare", prepare), ("pipeline", infer), ("store", store)]
+    try:
+        for counts in run_stages(iter_confluence_pages(space_key, limit), stages, ctx):
+            found += counts["docs"]
+            skipped += counts["skipped_unchanged"]
+            ingested_pages += counts["processed"]
+            written += counts["inserted_count"]
+            examined += counts["examined"]
+            duplicates.update(counts["duplicates"])
+            ctx.update(pages_found=found, pages_ingested=ingested_pages, skipped_unchanged=skipped,
+                       inserted_count=written, **dedup_report(examined, duplicates))
+    except Exception:
+        release_duplicate_reservations()
+        raise
+    finally:
+        flush_search_indexes()
+
+    return {
+        "status": "success",
+        "pages_found": found,
+        "pages_ingested": ingested_pages,
+        "skipped_unchanged": skipped,
+        "inserted_count": written,
+        **dedup_report(examined, duplicates),
+    }
+
+@router.get("/ingest/confluence/bulk", deprecated=True)
 def ingest_confluence_bulk(
     space_key: str = Query(..., description="The Confluence space key to ingest"),
-    limit: int = Query(10, description="Number of pages to ingest")
+    limit: Optional[int] = Query(10, description="Number of pages to ingest (all pages when empty)")
 ):
     """
     Ingest Confluence documentation in bulk by space.
-    Instead of entering a single page ID, we search for pages within a space.
-    For each page found, we invoke the pipeline to generate enriched documents.
+    Instead of entering a single page ID, we search for pages within a space;
+    see ingest_confluence_space.
+    Deprecated: the request holds a server thread for the whole run and bypasses
+    the inference workers. Use POST /jobs/ingest/confluence instead.
     """
     try:
-        pages = list_confluence_pages(space_key, limit)
-        if not pages:
-            raise HTTPException(status_code=404, detail=f"No pages found in space {space_key}.")
-        
-        all_documents = []
-        for page in pages:
-            page_id = page.get("id")
-            if page_id:
-                page_data = fetch_documentation_page(page_id)
-                # Combine title and text (this helps provide context to the pipeline)
-                raw_text = f"{page_data['title']}: {page_data['text']}"
-                processed_docs = run_pipeline(raw_text, source_id=page_data['id'])
-                all_documents.extend(processed_docs)
-        return {"status": "success", "data": all_documents}
+        result = ingest_confluence_space(JobContext(), space_key, limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if not result["pages_found"]:
+        raise HTTPException(status_code=404, detail=f"No pages found in space {space_key}.")
+    return result
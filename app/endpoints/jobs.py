@@ -0,0 +1,100 @@
+# app/endpoints/jobs.py
+import json
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from job_queue import job_manager
+from endpoints.ingest import sync_jira
+from endpoints.ingest_confluence import ingest_confluence_space
+from chroma_sync import sync_to_chroma
+
+router = APIRouter()
+
+class JiraJobRequest(BaseModel):
+    incremental: bool = False
+
+class ConfluenceJobRequest(BaseModel):
+    space_key: str
+    limit: Optional[int] = 10
+
+class ChromaSyncJobRequest(BaseModel):
+    full: bool = False
+
+class PipelineJobRequest(BaseModel):
+    raw_text: str
+    source_id: str = "manual_test"  # default source_id for testing
+
+def chroma_sync_job(ctx, full: bool) -> dict:
+    with ctx.stage("sync"):
+        result = sync_to_chroma(full=full)
+    ctx.update(upserted=result["upserted"], deleted=result["deleted"])
+    return result
+
+def run_pipeline_job(ctx, raw_text: str, source_id: str) -> dict:
+    with ctx.stage("pipeline"):
+        results = ctx.run_pipeline_many([{"raw_text": raw_text, "source_id": source_id}])
+    return {"status": "success", "data": results.get(source_id, [])}
+
+@router.post("/jobs/ingest/jira")
+def enqueue_jira_ingest(request: JiraJobRequest):
+    """Queue a Jira ingest in the background and return its job id."""
+    job_id = job_manager.submit("ingest_jira", sync_jira, request.incremental)
+    return {"status": "queued", "job_id": job_id}
+
+@router.post("/jobs/ingest/confluence")
+def enqueue_confluence_ingest(request: ConfluenceJobRequest):
+    """Queue a Confluence space ingest in the background and return its job id."""
+    job_id = job_manager.submit("ingest_confluence", ingest_confluence_space, request.space_key, request.limit)
+    return {"status": "queued", "job_id": job_id}
+
+@router.post("/jobs/sync/chroma")
+def enqueue_chroma_sync(request: ChromaSyncJobRequest):
+    """Queue a MongoDB -> Chroma sync for the RAG store in the background and return its job id."""
+    job_id = job_manager.submit("sync_chroma", chroma_sync_job, request.full)
+    return {"status": "queued", "job_id": job_id}
+
+@router.post("/jobs/test/pipeline")
+def enqueue_pipeline_test(request: PipelineJobRequest):
+    """Queue a pipeline run over raw text in the background and return its job id."""
+    if not request.raw_text:
+        raise HTTPException(status_code=400, detail="raw_text is required")
+    job_id = job_manager.submit("test_pipeline", run_pipeline_job, request.raw_text, request.source_id)
+    return {"status": "queued", "job_id": job_id}
+
+@router.get("/jobs")
+def list_jobs():
+    """List recent jobs, newest first, without their results."""
+    return {"status": "success", "jobs": job_manager.list()}
+
+@router.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Return a job's status, progress counters, per-stage timings and result."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+    return {"status": "success", "job": job}
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Stream a job's status, stage and progress events as Server-Sent Events.
+    The stream ends with a final 'done' event carrying the job snapshot.
+    """
+    if job_manager.get(job_id, include_result=False) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found.")
+
+    async def event_stream():
+        cursor = 0
+        while True:
+            events, cursor, finished = job_manager.events_since(job_id, cursor)
+            for event in events:
+                yield f"data: {json.dumps(event)}\n\n"
+            if finished:
+                job = job_manager.get(job_id)
+                yield f"event: done\ndata: {json.dumps(job, default=str)}\n\n"
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
@@ -0,0 +1,43 @@
+# app/endpoints/metrics.py
+from fastapi import APIRouter, Query
+from fastapi.responses import PlainTextResponse
+from telemetry import metrics, tracer
+from query_cache import query_embedding_cache, search_result_cache
+from vector_index import vector_index
+
+router = APIRouter()
+
+def _gauge_lines() -> list:
+    """Point-in-time values appended to the exposition as gauges."""
+    gauges = [("faiss_index_vectors", "Vectors in the FAISS index", {}, vector_index.ntotal)]
+    for name, cache in (("query_embeddings", query_embedding_cache), ("results", search_result_cache)):
+        stats = cache.stats()
+        gauges.append(("search_cache_entries", "Entries in the search caches", {"cache": name}, stats["entries"]))
+        gauges.append(("search_cache_hit_rate", "Hit rate of the search caches", {"cache": name}, stats["hit_rate"]))
+    lines = []
+    described = set()
+    for name, description, labels, value in gauges:
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+        label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return lines
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Pipeline stage, model batch, connector, MongoDB write, FAISS search and HTTP
+    request histograms in the Prometheus text exposition format.
+    """
+    body = metrics.render() + "\n".join(_gauge_lines()) + "\n"
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/traces")
+def recent_traces(limit: int = Query(50, ge=1, le=500), name: str = None):
+    """
+    The most recent finished traces (one per ingest job or API request), newest
+    first. Empty unless TRACING_ENABLED is set.
+    """
+    return {"status": "success", "enabled": tracer.enabled, "traces": tracer.traces(limit, name)}
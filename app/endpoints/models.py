@@ -0,0 +1,13 @@
+# app/endpoints/models.py
+from fastapi import APIRouter
+from model_registry import model_registry
+
+router = APIRouter()
+
+@router.get("/models")
+def models_status():
+    """
+    Report which models this process hosts, which are loaded and how long each
+    took to load, along with the API startup time.
+    """
+    return {"status": "success", **model_registry.status()}
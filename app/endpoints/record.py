@@ -1,37 +1,214 @@
 # app/endpoints/record.py
-from fastapi import APIRouter, HTTPException
-from pipeline import run_pipeline  # if used, or your record_and_transcribe function
-import sounddevice as sd
-from scipy.io.wavfile import write
-import whisper
+import os
+import time
+import uuid
+import shutil
+import tempfile
+import threading
+from typing import Optional
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Request
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from endpoints.ingest import (
+    upsert_to_mongo, split_duplicates, record_duplicates, dedup_report, release_duplicate_reservations,
+    flush_search_indexes,
+)
+from job_queue import job_manager
+from transcription import transcribe_file
 
 router = APIRouter()
 
-def record_and_transcribe(duration: int = 5, filename: str = "output.wav") -> str:
+# Streamed uploads not finished within this many seconds of their last chunk are discarded.
+STREAM_UPLOAD_TTL_SECONDS = getattr(settings, "STREAM_UPLOAD_TTL_SECONDS", 3600)
+
+# Streamed uploads in progress: upload id -> {"path": temporary file being appended to, "touched": time}.
+_stream_uploads = {}
+_stream_lock = threading.Lock()
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _touch_stream_upload(upload_id: str):
+    """Mark an upload as active and return its path, or None if it does not exist."""
+    with _stream_lock:
+        upload = _stream_uploads.get(upload_id)
+        if upload is None:
+            return None
+        upload["touched"] = time.time()
+        return upload["path"]
+
+def _discard_stream_upload(upload_id: str) -> None:
+    with _stream_lock:
+        upload = _stream_uploads.pop(upload_id, None)
+    if upload is not None:
+        _remove_file(upload["path"])
+
+def expire_stream_uploads(ttl: float = STREAM_UPLOAD_TTL_SECONDS) -> int:
+    """Delete the temporary files of streamed uploads abandoned for ttl seconds. Returns how many."""
+    cutoff = time.time() - ttl
+    with _stream_lock:
+        expired = [upload_id for upload_id, upload in _stream_uploads.items() if upload["touched"] < cutoff]
+        paths = [_stream_uploads.pop(upload_id)["path"] for upload_id in expired]
+    for path in paths:
+        _remove_file(path)
+    return len(paths)
+
+def record_and_transcribe(duration: int = 5) -> str:
+    """Record from the server's microphone and transcribe it with the cached Whisper model."""
+    import sounddevice as sd
+    from scipy.io.wavfile import write
+
     fs = 44100
     try:
         recording = sd.rec(int(duration * fs), samplerate=fs, channels=1)
         sd.wait()
     except Exception as e:
         raise Exception(f"Error during recording: {e}")
+    # A per-request file, so concurrent recordings never overwrite each other.
+    fd, filename = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
     try:
-        write(filename, fs, recording)
-    except Exception as e:
-        raise Exception(f"Error saving WAV file: {e}")
+        try:
+            write(filename, fs, recording)
+        except Exception as e:
+            raise Exception(f"Error saving WAV file: {e}")
+        try:
+            return transcribe_file(filename)["text"]
+        except Exception as e:
+            raise Exception(f"Error during transcription: {e}")
+    finally:
+        os.remove(filename)
+
+def transcribe_job(ctx, path: str, source_id: str, ingest: bool) -> dict:
+    """
+    Transcribe an audio file in a worker process and, when ingest is set, feed
+    the transcript through the pipeline and store the resulting units.
+    The audio file is removed afterwards.
+    """
     try:
-        w_model = whisper.load_model("medium")
-    except Exception as e:
-        raise Exception(f"Error loading Whisper model: {e}")
+        with ctx.stage("transcribe"):
+            transcript = ctx.run_in_worker(transcribe_file, path)
+    finally:
+        os.remove(path)
+    ctx.update(segments=len(transcript["segments"]), duration_seconds=transcript["duration_seconds"])
+
+    written = 0
+    dedup = {}
+    if ingest and transcript["text"]:
+        docs = [{"raw_text": transcript["text"], "source_id": source_id, "source": "Recording"}]
+        with ctx.stage("dedup"):
+            unique_docs, duplicates, fingerprints = split_duplicates(docs)
+        try:
+            if unique_docs:
+                with ctx.stage("pipeline"):
+                    results = ctx.run_pipeline_many(unique_docs)
+                with ctx.stage("store"):
+                    written = upsert_to_mongo(results)
+            with ctx.stage("store"):
+                record_duplicates(unique_docs, duplicates, fingerprints)
+        except Exception:
+            release_duplicate_reservations()
+            raise
+        finally:
+            flush_search_indexes()
+        dedup = dedup_report(len(docs), duplicates)
+    return {
+        "status": "success",
+        "source_id": source_id,
+        "transcription": transcript["text"],
+        "segments": transcript["segments"],
+        "duration_seconds": transcript["duration_seconds"],
+        "inserted_count": written,
+        **dedup,
+    }
+
+def _enqueue_transcription(path: str, source_id: Optional[str], ingest: bool) -> dict:
+    source_id = source_id or f"recording-{uuid.uuid4()}"
     try:
-        result = w_model.transcribe(filename)
-        return result["text"]
-    except Exception as e:
-        raise Exception(f"Error during transcription: {e}")
+        job_id = job_manager.submit("transcribe", transcribe_job, path, source_id, ingest)
+    except Exception:
+        # The job removes the file once it has run; if it never will, remove it here.
+        _remove_file(path)
+        raise
+    return {"status": "queued", "job_id": job_id, "source_id": source_id}
 
 @router.get("/record")
 def record_transcribe():
     try:
-        transcription = record_and_transcribe(duration=5, filename="output.wav")
+        transcription = record_and_transcribe(duration=5)
         return {"status": "success", "transcription": transcription}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/transcribe")
+def transcribe_upload(
+    file: UploadFile = File(..., description="Audio file in any format ffmpeg can decode"),
+    source_id: Optional[str] = Form(None, description="Source id for the ingested units"),
+    ingest: bool = Form(True, description="Run the transcript through the pipeline and store it"),
+):
+    """
+    Queue an uploaded recording for transcription (and ingestion by default).
+    Follow progress and fetch the transcript through /jobs/{job_id}.
+    """
+    suffix = os.path.splitext(file.filename or "")[1]
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(file.file, out)
+    except Exception:
+        _remove_file(path)
+        raise
+    return _enqueue_transcription(path, source_id, ingest)
+
+@router.post("/transcribe/stream")
+def start_stream_upload(filename: str = ""):
+    """
+    Start a streamed upload; send the audio with PUT /transcribe/stream/{upload_id}.
+    Uploads left without a chunk for STREAM_UPLOAD_TTL_SECONDS are discarded.
+    """
+    expire_stream_uploads()
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(filename)[1])
+    os.close(fd)
+    upload_id = str(uuid.uuid4())
+    with _stream_lock:
+        _stream_uploads[upload_id] = {"path": path, "touched": time.time()}
+    return {"status": "success", "upload_id": upload_id}
+
+@router.put("/transcribe/stream/{upload_id}")
+async def append_stream_chunk(upload_id: str, request: Request):
+    """
+    Append the request body (one or more chunks of the recording) to a streamed upload.
+    If the body cannot be read completely (e.g. the client disconnects) the upload
+    is discarded, since a partly appended chunk would corrupt the audio.
+    """
+    path = _touch_stream_upload(upload_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found.")
+    # File I/O runs in the thread pool so a slow disk never blocks the event loop.
+    received = 0
+    try:
+        out = await run_in_threadpool(open, path, "ab")
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(out.write, chunk)
+                received += len(chunk)
+        finally:
+            await run_in_threadpool(out.close)
+    except Exception:
+        await run_in_threadpool(_discard_stream_upload, upload_id)
+        raise
+    _touch_stream_upload(upload_id)
+    total = await run_in_threadpool(os.path.getsize, path)
+    return {"status": "success", "received_bytes": received, "total_bytes": total}
+
+@router.post("/transcribe/stream/{upload_id}/finish")
+def finish_stream_upload(upload_id: str, source_id: Optional[str] = None, ingest: bool = True):
+    """Close a streamed upload and queue it for transcription like POST /transcribe."""
+    with _stream_lock:
+        upload = _stream_uploads.pop(upload_id, None)
+    if upload is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found.")
+    return _enqueue_transcription(upload["path"], source_id, ingest)
@@ -1,94 +1,345 @@
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
 import numpy as np
-import faiss
-from pymongo import MongoClient
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from config import settings
-from pipeline import embed_model  # This is the SentenceTransformer model loaded in your pipeline
+from db import get_store
+from model_registry import embed_model  # SentenceTransformer, loaded on first use by the model registry
+from vector_index import vector_index
+from lexical_index import lexical_index
+from metadata_index import metadata_index, normalize_timestamp
+from query_cache import query_embedding_cache, search_result_cache, corpus_version, normalize_query
 
 router = APIRouter()
 
+SEARCH_MODES = ("lexical", "dense", "hybrid")
+# Mode used when a request names none. Dense keeps the cosine scores existing
+# clients expect; lexical and hybrid are opt-in per request.
+DEFAULT_SEARCH_MODE = getattr(settings, "DEFAULT_SEARCH_MODE", "dense")
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper.
+RRF_K = getattr(settings, "RRF_K", 60)
+# Number of candidates each retriever contributes to hybrid fusion.
+HYBRID_CANDIDATES = getattr(settings, "HYBRID_CANDIDATES", 50)
+# Upper bound on the number of queries in one POST /search/batch call.
+SEARCH_BATCH_MAX_QUERIES = getattr(settings, "SEARCH_BATCH_MAX_QUERIES", 64)
+# Upper bound on the number of results a single query may ask for.
+SEARCH_MAX_TOP_K = getattr(settings, "SEARCH_MAX_TOP_K", 100)
+
+class SearchFilters(BaseModel):
+    source: Optional[str] = None
+    source_audio_id: Optional[str] = None
+    tags: Optional[List[str]] = None
+    since: Optional[str] = None
+    until: Optional[str] = None
+
+    @field_validator("since", "until")
+    @classmethod
+    def _normalize_bound(cls, value, info):
+        # Unit timestamps are compared as strings, so the bounds must share their
+        # format; a date alone as `until` includes that whole day.
+        return normalize_timestamp(value, end_of_day=info.field_name == "until") if value else None
+
+    def to_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "source_audio_id": self.source_audio_id,
+            # NER tags are stored lowercased.
+            "tags": [tag.lower() for tag in self.tags or []],
+            "since": self.since,
+            "until": self.until,
+        }
+
+class SearchQuery(BaseModel):
+    query: str
+    top_k: int = Field(3, ge=1, le=SEARCH_MAX_TOP_K)
+    mode: str = DEFAULT_SEARCH_MODE
+    filters: Optional[SearchFilters] = None
+
+class BatchSearchRequest(BaseModel):
+    queries: List[SearchQuery]
+
 def get_mongo_documents() -> list:
     """
-    Retrieve all knowledge units from MongoDB.
-    """
-    client = MongoClient(settings.MONGO_URI)
-    db = client[settings.DB_NAME]
-    collection = db[settings.COLLECTION_NAME]
-    docs = list(collection.find())
-    client.close()
-    return docs
-
-def build_faiss_index(documents: list, embedding_dim: int = 384):
-    """
-    Build a FAISS index from the 'embedding' arrays stored in the documents.
-    Returns the index along with a list of the valid documents.
-    """
-    embeddings = []
-    valid_docs = []
-    for doc in documents:
-        # Only include documents that have an embedding
-        if "embedding" in doc:
-            embeddings.append(doc["embedding"])
-            valid_docs.append(doc)
-    if not embeddings:
-        raise ValueError("No valid embeddings found in documents.")
-    
-    embeddings_np = np.array(embeddings).astype("float32")
-    # Normalize vectors to unit length for cosine similarity via inner product.
-    faiss.normalize_L2(embeddings_np)
-    index = faiss.IndexFlatIP(embedding_dim)
-    index.add(embeddings_np)
-    return index, valid_docs
+    Retrieve the id and embedding of every knowledge unit from MongoDB.
+    """
+    return list(get_store().iter_embeddings())
+
+def count_embedded_documents() -> int:
+    """
+    Count the knowledge units in MongoDB that carry an embedding.
+    Used at startup to detect a saved FAISS index that is out of date.
+    """
+    return get_store().count_embedded()
+
+def get_lexical_documents():
+    """
+    Retrieve the id, chunk_text and summary of every knowledge unit from MongoDB.
+    """
+    return get_store().iter_texts()
+
+def get_metadata_documents():
+    """
+    Retrieve the filterable metadata of every knowledge unit from MongoDB.
+    """
+    return get_store().iter_metadata()
+
+def count_documents() -> int:
+    """
+    Count the knowledge units in MongoDB.
+    Used at startup to detect a saved lexical index that is out of date.
+    """
+    return get_store().count_units()
+
+def get_documents_by_ids(doc_ids: list) -> dict:
+    """
+    Retrieve the knowledge units with the given ids, keyed by id, loading only
+    the fields returned to search callers.
+    """
+    return get_store().find_by_ids(doc_ids)
+
+def reciprocal_rank_fusion(rankings: list, top_k: int = 3, k: int = RRF_K):
+    """
+    Fuse several ranked id lists: each id scores the sum of 1 / (k + rank) over
+    the lists it appears in. Returns (doc_ids, scores) ordered by fused score.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    return [doc_id for doc_id, _ in ranked], [score for _, score in ranked]
+
+def encode_queries(queries: list) -> np.ndarray:
+    """
+    Embed several queries with one batched encode call, reusing the cached
+    embeddings of earlier identical queries (compared after normalize_query;
+    the embedding model is uncased). Returns an (n, dim) float32 matrix.
+    """
+    keys = [normalize_query(query) for query in queries]
+    embeddings = {}
+    for key in keys:
+        if key not in embeddings:
+            cached = query_embedding_cache.get(key)
+            if cached is not None:
+                embeddings[key] = cached
+    missing = [key for key in dict.fromkeys(keys) if key not in embeddings]
+    if missing:
+        for key, embedding in zip(missing, embed_model.encode(missing)):
+            query_embedding_cache.set(key, embedding)
+            embeddings[key] = embedding
+    return np.array([embeddings[key] for key in keys], dtype="float32").reshape(len(keys), -1)
+
+def encode_query(query: str):
+    """Embed a single query; see encode_queries."""
+    return encode_queries([query])[0]
+
+def _freeze_filters(filters: dict) -> tuple:
+    return tuple(sorted(
+        (name, tuple(value) if isinstance(value, list) else value)
+        for name, value in (filters or {}).items() if value
+    ))
+
+def _result_cache_key(query: str, top_k: int, mode: str, filters: dict) -> tuple:
+    return (corpus_version.value, normalize_query(query), top_k, mode, _freeze_filters(filters))
+
+def _search_request(request: dict) -> dict:
+    """Fill in the defaults of a {query, top_k, mode, filters} search request."""
+    mode = request.get("mode") or DEFAULT_SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {', '.join(SEARCH_MODES)}.")
+    top_k = 3 if request.get("top_k") is None else request["top_k"]
+    if top_k < 1:
+        raise ValueError(f"top_k must be at least 1, got {top_k}.")
+    return {
+        "query": request["query"],
+        "top_k": top_k,
+        "mode": mode,
+        "filters": request.get("filters") or {},
+    }
+
+def _candidates(request: dict) -> int:
+    """Number of results each retriever returns for a request."""
+    if request["mode"] == "hybrid":
+        return max(request["top_k"], HYBRID_CANDIDATES)
+    return request["top_k"]
+
+def rank_many(requests: list) -> list:
+    """
+    Rank knowledge unit ids for several search requests without loading the units.
+    Each request is a dict with query, top_k, mode and filters (the keyword
+    arguments of MetadataIndex.select).
+
+    "lexical" uses the BM25 index only and needs no embedding, "dense" uses the
+    FAISS index and "hybrid" fuses both rankings with reciprocal rank fusion.
+    Filters restrict both retrievers to the matching units before scoring.
+    All queries needing an embedding are encoded in one batch, and queries that
+    share the same filters are searched in one multi-row FAISS call.
+    Returns one (doc_ids, scores) pair per request.
+    """
+    requests = [_search_request(request) for request in requests]
+    allowed = [metadata_index.select(**request["filters"]) if request["filters"] else None
+               for request in requests]
+    results = [([], []) for _ in requests]
+
+    dense_rows = [i for i, request in enumerate(requests)
+                  if request["mode"] != "lexical" and (allowed[i] is None or allowed[i])]
+    dense = {}
+    if dense_rows:
+        embeddings = encode_queries([requests[i]["query"] for i in dense_rows])
+        groups = {}
+        for row, i in enumerate(dense_rows):
+            groups.setdefault(_freeze_filters(requests[i]["filters"]), []).append((row, i))
+        for members in groups.values():
+            first = members[0][1]
+            allowed_faiss_ids = metadata_index.faiss_ids(allowed[first]) if allowed[first] is not None else None
+            k = max(_candidates(requests[i]) for _, i in members)
+            hits = vector_index.search_many(embeddings[[row for row, _ in members]], k, allowed_faiss_ids)
+            for (_, i), (doc_ids, scores) in zip(members, hits):
+                k_i = _candidates(requests[i])
+                dense[i] = (doc_ids[:k_i], scores[:k_i])
+
+    for i, request in enumerate(requests):
+        if allowed[i] is not None and not allowed[i]:
+            continue
+        if request["mode"] == "dense":
+            results[i] = dense[i]
+            continue
+        lexical = lexical_index.search(request["query"], _candidates(request), allowed_ids=allowed[i])
+        if request["mode"] == "lexical":
+            results[i] = lexical
+        else:
+            results[i] = reciprocal_rank_fusion([dense[i][0], lexical[0]], top_k=request["top_k"])
+    return results
+
+def rank_documents(query: str, top_k: int = 3, mode: str = DEFAULT_SEARCH_MODE, filters: dict = None):
+    """Rank knowledge unit ids for a single query; see rank_many. Returns (doc_ids, scores)."""
+    return rank_many([{"query": query, "top_k": top_k, "mode": mode, "filters": filters}])[0]
+
+def search_many(requests: list) -> list:
+    """
+    Search the knowledge units for several {query, top_k, mode, filters} requests.
+    The queries are ranked together against the long-lived in-memory indexes
+    (see rank_many) and the matching documents of all of them are loaded from
+    MongoDB in one query. Results are cached until the next write to the corpus
+    (see query_cache.corpus_version). Returns one (results, scores) pair per request.
+    """
+    requests = [_search_request(request) for request in requests]
+    keys = [_result_cache_key(r["query"], r["top_k"], r["mode"], r["filters"]) for r in requests]
+    output = [search_result_cache.get(key) for key in keys]
+    pending = [i for i, cached in enumerate(output) if cached is None]
+    if pending:
+        ranked = rank_many([requests[i] for i in pending])
+        docs_by_id = get_documents_by_ids(list({doc_id for doc_ids, _ in ranked for doc_id in doc_ids}))
+        for i, (doc_ids, scores) in zip(pending, ranked):
+            results = []
+            result_scores = []
+            for doc_id, score in zip(doc_ids, scores):
+                # Skip ids whose document was deleted after the index was written
+                if doc_id in docs_by_id:
+                    results.append(docs_by_id[doc_id])
+                    result_scores.append(score)
+            output[i] = (results, result_scores)
+            search_result_cache.set(keys[i], output[i])
+    return [(list(results), list(scores)) for results, scores in output]
+
+def search_documents(query: str, top_k: int = 3, mode: str = DEFAULT_SEARCH_MODE, filters: dict = None):
+    """Search the knowledge units for a single query string; see search_many."""
+    return search_many([{"query": query, "top_k": top_k, "mode": mode, "filters": filters}])[0]
 
 def search_faiss(query: str, top_k: int = 3):
     """
-    Perform semantic search for the given query string.
-    This function encodes the query, builds a FAISS index from stored documents,
-    and then retrieves the top_k closest documents.
-    """
-    # Encode the query into an embedding vector.
-    query_embedding = embed_model.encode(query)
-    query_embedding = np.array(query_embedding, dtype="float32").reshape(1, -1)
-    faiss.normalize_L2(query_embedding)
-
-    # Fetch all documents from MongoDB.
-    documents = get_mongo_documents()
-    if not documents:
-        return [], []
-
-    # Build the FAISS index over the stored embeddings.
-    index, valid_docs = build_faiss_index(documents, embedding_dim=384)
-    distances, indices = index.search(query_embedding, top_k)
-    
-    results = []
-    scores = distances[0].tolist()
-    for idx in indices[0]:
-        # Check that the index is within range
-        if idx < len(valid_docs):
-            results.append(valid_docs[idx])
-    return results, scores
+    Perform semantic search for the given query string with the FAISS index only.
+    """
+    return search_documents(query, top_k, mode="dense")
+
+def _format_results(results: list, scores: list) -> list:
+    response = []
+    for doc, score in zip(results, scores):
+        response.append({
+            "id": doc.get("id"),
+            "chunk_text": doc.get("chunk_text"),
+            "summary": doc.get("summary"),
+            "tags": doc.get("tags"),
+            "timestamp": doc.get("timestamp"),
+            "score": score,
+        })
+    response.sort(key=lambda x: x["score"], reverse=True)
+    return response
 
 @router.get("/search")
-def search_endpoint(query: str, top_k: int = 3):
+def search_endpoint(
+    query: str,
+    top_k: int = Query(3, ge=1, le=SEARCH_MAX_TOP_K, description="Number of results to return"),
+    mode: str = Query(DEFAULT_SEARCH_MODE,
+                      description="dense (embeddings, the default), lexical (BM25, exact tokens) or hybrid (both, fused)"),
+    source: Optional[str] = Query(None, description="Only units from this source, e.g. Jira or Confluence"),
+    source_audio_id: Optional[str] = Query(None, description="Only units of this source document, e.g. a Jira issue key"),
+    tags: Optional[List[str]] = Query(None, description="Only units carrying all of these tags"),
+    since: Optional[str] = Query(None, description="Only units stamped at or after this ISO 8601 date or time"),
+    until: Optional[str] = Query(None,
+                                 description="Only units stamped at or before this ISO 8601 time, or date (whole day)"),
+):
     """
-    API Endpoint to perform semantic search.
-    It accepts a query string and an optional parameter top_k to control
-    the number of search results.
-    Returns the status and a list of matching knowledge units with their scores.
+    API Endpoint to perform search.
+    It accepts a query string, an optional parameter top_k to control
+    the number of search results, the retrieval mode and metadata filters
+    that scope the search before ranking (so filtered queries keep full recall).
+    Returns the status and a list of matching knowledge units with their scores
+    (BM25 for lexical, cosine similarity for dense, fused RRF score for hybrid).
     """
+    if mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}.")
+    try:
+        filters = SearchFilters(
+            source=source, source_audio_id=source_audio_id, tags=tags, since=since, until=until,
+        ).to_dict()
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
     try:
-        results, scores = search_faiss(query, top_k=top_k)
-        response = []
-        for doc, score in zip(results, scores):
-            response.append({
-                "id": doc.get("id"),
-                "chunk_text": doc.get("chunk_text"),
-                "summary": doc.get("summary"),
-                "tags": doc.get("tags"),
-                "timestamp": doc.get("timestamp"),
-                "score": score,
-            })
-        response.sort(key=lambda x: x["score"], reverse=True)
-        return {"status": "success", "results": response}
+        results, scores = search_documents(query, top_k=top_k, mode=mode, filters=filters)
+        return {"status": "success", "results": _format_results(results, scores)}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/search/batch")
+def batch_search_endpoint(request: BatchSearchRequest):
+    """
+    API Endpoint to run several searches in one call, each with its own top_k,
+    mode and filters. The queries are embedded in one batch and searched with
+    multi-row FAISS lookups, which costs far less per query than separate
+    /search calls. Returns one result list per query, in request order.
+    """
+    if len(request.queries) > SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {SEARCH_BATCH_MAX_QUERIES} queries per batch.")
+    for item in request.queries:
+        if item.mode not in SEARCH_MODES:
+            raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}.")
+    try:
+        outputs = search_many([
+            {
+                "query": item.query,
+                "top_k": item.top_k,
+                "mode": item.mode,
+                "filters": item.filters.to_dict() if item.filters else {},
+            }
+            for item in request.queries
+        ])
+        return {
+            "status": "success",
+            "results": [
+                {"query": item.query, "results": _format_results(results, scores)}
+                for item, (results, scores) in zip(request.queries, outputs)
+            ],
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search/cache")
+def search_cache_stats():
+    """Report the size and hit rates of the query embedding and search result caches."""
+    return {
+        "status": "success",
+        "corpus_version": corpus_version.value,
+        "query_embeddings": query_embedding_cache.stats(),
+        "results": search_result_cache.stats(),
+    }
@@ -0,0 +1,224 @@
+# app/inference_backends.py
+"""
+Selectable CPU inference backends for the embedding, summarization and NER models.
+
+    torch        PyTorch fp32, as downloaded (the default)
+    torch_int8   PyTorch with dynamic int8 quantization of the Linear layers
+    onnx         exported to ONNX and run with ONNX Runtime
+    onnx_int8    ONNX with dynamic int8 weight quantization (onnxruntime.quantization)
+
+INFERENCE_BACKEND picks the backend for all three models and INFERENCE_BACKENDS
+overrides it per model, e.g. INFERENCE_BACKENDS="summarizer=onnx_int8,ner=onnx_int8".
+The ONNX backends need optimum[onnxruntime]; models are exported (and quantized)
+once into ONNX_MODEL_DIR and reused from there. Quantized models produce slightly
+different outputs: run benchmark_inference.py to measure the drift and the
+speed-up before switching a model over.
+"""
+import os
+import glob
+import shutil
+import tempfile
+import threading
+import numpy as np
+from config import settings
+
+BACKENDS = ("torch", "torch_int8", "onnx", "onnx_int8")
+QUANTIZED_MODELS = ("embedder", "summarizer", "ner")
+
+INFERENCE_BACKEND = getattr(settings, "INFERENCE_BACKEND", "torch")
+ONNX_MODEL_DIR = getattr(settings, "ONNX_MODEL_DIR", "onnx_models")
+# Threads per process for intra-op parallelism (0 keeps the library default, one
+# per core). With INGEST_WORKERS > 1, set it to cores / workers so the worker
+# processes do not oversubscribe the CPU.
+INFERENCE_THREADS = getattr(settings, "INFERENCE_THREADS", 0)
+INFERENCE_INTEROP_THREADS = getattr(settings, "INFERENCE_INTEROP_THREADS", 0)
+
+# all-MiniLM-L6-v2's sentence-transformers config: mean pooling, normalized, 256 tokens.
+EMBEDDER_MAX_SEQ_LENGTH = 256
+
+_torch_configured = False
+_torch_lock = threading.Lock()
+
+
+def _parse_backends(value) -> dict:
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return dict(value)
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {name.strip(): backend.strip() for name, backend in pairs}
+
+
+INFERENCE_BACKENDS = _parse_backends(getattr(settings, "INFERENCE_BACKENDS", None))
+
+
+def backend_for(model: str) -> str:
+    """The configured backend of a model; models without backends always run on torch."""
+    if model not in QUANTIZED_MODELS:
+        return "torch"
+    backend = INFERENCE_BACKENDS.get(model, INFERENCE_BACKEND)
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' for {model}; expected one of {BACKENDS}.")
+    return backend
+
+
+def version_suffix(model: str, backend: str = None) -> str:
+    """Appended to a model's cache version, so results of another backend are not reused."""
+    backend = backend or backend_for(model)
+    return "" if backend == "torch" else f"@{backend}"
+
+
+def configure_torch_threads() -> None:
+    """Apply INFERENCE_THREADS / INFERENCE_INTEROP_THREADS to torch, once per process."""
+    global _torch_configured
+    with _torch_lock:
+        if _torch_configured:
+            return
+        _torch_configured = True
+        if not (INFERENCE_THREADS or INFERENCE_INTEROP_THREADS):
+            return
+        import torch
+        if INFERENCE_THREADS:
+            torch.set_num_threads(INFERENCE_THREADS)
+        if INFERENCE_INTEROP_THREADS:
+            try:
+                torch.set_interop_threads(INFERENCE_INTEROP_THREADS)
+            except RuntimeError:
+                # Only allowed before the first parallel torch operation in the process.
+                pass
+
+
+def _session_options():
+    import onnxruntime
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if INFERENCE_THREADS:
+        options.intra_op_num_threads = INFERENCE_THREADS
+    if INFERENCE_INTEROP_THREADS:
+        options.inter_op_num_threads = INFERENCE_INTEROP_THREADS
+    return options
+
+
+def _quantize_dynamic(module):
+    """Dynamic int8 quantization of a torch module's Linear layers (weights int8, activations on the fly)."""
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _export_dir(model_name: str) -> str:
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "--"))
+
+
+def export_onnx(model_name: str, ort_class, quantize: bool) -> str:
+    """
+    Export model_name to ONNX with optimum (and quantize every graph to int8 when
+    asked), unless that was done before. Returns the directory holding the model.
+    The export is written to a temporary directory and renamed into place, so
+    concurrent worker processes never load a half-written model.
+    """
+    from transformers import AutoTokenizer
+
+    target = _export_dir(model_name)
+    if not os.path.isdir(target):
+        os.makedirs(ONNX_MODEL_DIR, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=ONNX_MODEL_DIR)
+        try:
+            ort_class.from_pretrained(model_name, export=True).save_pretrained(staging)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(staging)
+            os.rename(staging, target)
+        except OSError:
+            # Another process finished the same export first.
+            if not os.path.isdir(target):
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        for path in glob.glob(os.path.join(target, "*.onnx")):
+            if path.endswith("_quantized.onnx"):
+                continue
+            quantized = path[:-len(".onnx")] + "_quantized.onnx"
+            if not os.path.exists(quantized):
+                staging = quantized + f".{os.getpid()}.tmp"
+                quantize_dynamic(path, staging, weight_type=QuantType.QInt8)
+                os.replace(staging, quantized)
+    return target
+
+
+def _onnx_file(directory: str, stem: str, quantize: bool):
+    name = f"{stem}_quantized.onnx" if quantize else f"{stem}.onnx"
+    return name if os.path.exists(os.path.join(directory, name)) else None
+
+
+def _load_ort(model_name: str, ort_class, quantize: bool, stems: dict):
+    """Load an exported model; stems maps optimum's file name arguments to graph names."""
+    directory = export_onnx(model_name, ort_class, quantize)
+    files = {arg: _onnx_file(directory, stem, quantize) for arg, stem in stems.items()}
+    files = {arg: name for arg, name in files.items() if name is not None}
+    model = ort_class.from_pretrained(directory, session_options=_session_options(),
+                                      provider="CPUExecutionProvider", **files)
+    return model, directory
+
+
+class OnnxSentenceEmbedder:
+    """
+    ONNX Runtime stand-in for the SentenceTransformer embedder: the same tokenizer,
+    mean pooling and normalization, exposing the encode() the pipeline and the
+    search endpoint call.
+    """
+
+    def __init__(self, model, tokenizer, max_seq_length: int = EMBEDDER_MAX_SEQ_LENGTH):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            batch = self.tokenizer(sentences[start:start + batch_size], padding=True, truncation=True,
+                                   max_length=self.max_seq_length, return_tensors="np")
+            hidden = self.model(**batch).last_hidden_state
+            hidden = np.asarray(hidden, dtype="float32")
+            mask = batch["attention_mask"][..., None].astype("float32")
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(pooled)
+        embeddings = np.concatenate(outputs) if outputs else np.zeros((0, 0), dtype="float32")
+        return embeddings[0] if single else embeddings
+
+
+def load_embedder(model_name: str, backend: str):
+    if backend.startswith("onnx"):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+        # sentence-transformers resolves bare names to its own organisation on the Hub.
+        model_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        model, directory = _load_ort(model_name, ORTModelForFeatureExtraction, backend == "onnx_int8",
+                                     {"file_name": "model"})
+        return OnnxSentenceEmbedder(model, AutoTokenizer.from_pretrained(directory))
+    configure_torch_threads()
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name)
+    return _quantize_dynamic(model) if backend == "torch_int8" else model
+
+
+def load_pipeline(task: str, model_name: str, backend: str, **kwargs):
+    """A transformers pipeline for task ('summarization' or 'ner') on the given backend."""
+    from transformers import pipeline, AutoTokenizer
+    if backend.startswith("onnx"):
+        if task == "summarization":
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM as ort_class
+            stems = {"encoder_file_name": "encoder_model", "decoder_file_name": "decoder_model",
+                     "decoder_with_past_file_name": "decoder_with_past_model"}
+        else:
+            from optimum.onnxruntime import ORTModelForTokenClassification as ort_class
+            stems = {"file_name": "model"}
+        model, directory = _load_ort(model_name, ort_class, backend == "onnx_int8", stems)
+        return pipeline(task, model=model, tokenizer=AutoTokenizer.from_pretrained(directory), **kwargs)
+    configure_torch_threads()
+    pipe = pipeline(task, model=model_name, **kwargs)
+    if backend == "torch_int8":
+        pipe.model = _quantize_dynamic(pipe.model)
+    return pipe
@@ -0,0 +1,242 @@
+# app/job_queue.py
+import time
+import uuid
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from config import settings
+from telemetry import metrics, tracer
+
+# Model inference runs in separate worker processes; each one loads its own copy
+# of the models, so keep this small on memory-constrained hosts.
+INGEST_WORKERS = getattr(settings, "INGEST_WORKERS", 1)
+# Number of jobs whose I/O (fetching, Mongo writes) may be orchestrated at once.
+MAX_ACTIVE_JOBS = getattr(settings, "MAX_ACTIVE_JOBS", 4)
+JOB_HISTORY = getattr(settings, "JOB_HISTORY", 100)
+# Finished jobs are forgotten after this many seconds.
+JOB_TTL_SECONDS = getattr(settings, "JOB_TTL_SECONDS", 3600)
+# Only the latest events of each job are kept; long ingests report progress per page.
+JOB_MAX_EVENTS = getattr(settings, "JOB_MAX_EVENTS", 500)
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker() -> None:
+    # Worker processes exist to run inference, whatever the API process hosts.
+    # Whisper is hosted too but, being large and rarely used, only loaded on demand.
+    from model_registry import model_registry, PIPELINE_MODELS
+    model_registry.host(PIPELINE_MODELS + ["whisper"])
+    model_registry.warmup(PIPELINE_MODELS)
+
+
+def _run_pipeline_many(docs: list) -> tuple:
+    # Imported here so the models are only loaded inside the worker process.
+    from pipeline import run_pipeline_many
+    result = run_pipeline_many(docs)
+    # Hand the stage and model metrics recorded here back to the API process.
+    return result, metrics.snapshot(reset=True)
+
+
+class JobContext:
+    """
+    Handle passed to ingestion functions to report progress and run inference.
+    Without a job it simply runs the pipeline in the current process, so the same
+    functions serve both the synchronous endpoints and background jobs.
+    """
+
+    def __init__(self, job: dict = None, manager: "JobManager" = None):
+        self.job = job
+        self.manager = manager
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage; durations of repeated stages are summed."""
+        start = time.perf_counter()
+        kind = self.job["kind"] if self.job is not None else "sync"
+        if self.job is not None:
+            self.manager._update(self.job, event={"type": "stage", "stage": name}, stage=name)
+        try:
+            with tracer.span(f"stage.{name}"):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.observe("ingest_stage_seconds", elapsed, "Duration of ingestion stages", kind=kind, stage=name)
+            if self.job is not None:
+                with self.manager._lock:
+                    timings = self.job["stage_timings"]
+                    timings[name] = round(timings.get(name, 0.0) + elapsed, 4)
+
+    def update(self, **progress) -> None:
+        """Merge progress counters (e.g. fetched=50) into the job and notify listeners."""
+        if self.job is not None:
+            self.manager._update(self.job, event={"type": "progress", **progress}, progress=progress)
+
+    def run_in_worker(self, fn, *args):
+        """
+        Run fn(*args) in the worker pool for jobs, or in-process otherwise.
+        fn must be a module-level function so it can be sent to another process.
+        """
+        if self.manager is None:
+            return fn(*args)
+        return self.manager.process_pool().submit(fn, *args).result()
+
+    def run_pipeline_many(self, docs: list) -> dict:
+        """Run the pipeline in the worker pool for jobs, or in-process otherwise."""
+        if self.manager is None:
+            from pipeline import run_pipeline_many
+            return run_pipeline_many(docs)
+        result, recorded = self.run_in_worker(_run_pipeline_many, docs)
+        metrics.merge(recorded)
+        return result
+
+
+class JobManager:
+    """
+    In-memory registry and runner for background ingestion jobs.
+
+    Each job's orchestration (API calls, database writes) runs on a thread, while
+    the CPU-heavy pipeline calls are sent to a pool of worker processes so they
+    never compete with the API's event loop. Job state, per-stage timings and the
+    latest max_events events are kept for the most recent JOB_HISTORY jobs, and
+    finished jobs are dropped ttl seconds after they end.
+    """
+
+    def __init__(self, workers: int = INGEST_WORKERS, max_active: int = MAX_ACTIVE_JOBS,
+                 history: int = JOB_HISTORY, ttl: float = JOB_TTL_SECONDS,
+                 max_events: int = JOB_MAX_EVENTS):
+        self.workers = workers
+        self.history = history
+        self.ttl = ttl
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._threads = ThreadPoolExecutor(max_workers=max_active, thread_name_prefix="ingest-job")
+        self._processes = None
+
+    def process_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._processes is None:
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._processes
+
+    def submit(self, kind: str, fn, *args, **kwargs) -> str:
+        """
+        Queue fn(ctx, *args, **kwargs) as a background job and return its id.
+        fn receives a JobContext and its return value becomes the job result.
+        """
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        job = {
+            "id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "stage": None,
+            "progress": {},
+            "stage_timings": {},
+            "result": None,
+            "error": None,
+            "events": [{"time": now, "type": "status", "status": "queued"}],
+            "events_dropped": 0,
+        }
+        with self._lock:
+            self._expire(now)
+            self._jobs[job_id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        self._threads.submit(self._run, job, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job: dict, fn, args, kwargs) -> None:
+        self._update(job, event={"type": "status", "status": "running"},
+                     status="running", started_at=time.time())
+        start = time.perf_counter()
+        status = "failed"
+        try:
+            # Every job is one trace, identified by the job id.
+            with tracer.span(f"job.{job['kind']}", trace_id=job["id"], job_id=job["id"]):
+                result = fn(JobContext(job, self), *args, **kwargs)
+        except Exception as e:
+            logger.warning("Job %s (%s) failed: %s", job["id"], job["kind"], e)
+            self._update(job, event={"type": "status", "status": "failed", "error": str(e)},
+                         status="failed", error=str(e), finished_at=time.time())
+        else:
+            status = "succeeded"
+            self._update(job, event={"type": "status", "status": "succeeded"},
+                         status="succeeded", result=result, finished_at=time.time())
+        finally:
+            metrics.observe("job_seconds", time.perf_counter() - start, "Duration of background jobs",
+                            kind=job["kind"], status=status)
+
+    def _update(self, job: dict, event: dict = None, progress: dict = None, **fields) -> None:
+        with self._lock:
+            job.update(fields)
+            if progress:
+                job["progress"].update(progress)
+            if event is not None:
+                job["events"].append({"time": time.time(), **event})
+                excess = len(job["events"]) - self.max_events
+                if excess > 0:
+                    del job["events"][:excess]
+                    job["events_dropped"] += excess
+
+    def _expire(self, now: float) -> None:
+        # Called with the lock held.
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["finished_at"] is not None and now - job["finished_at"] > self.ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str, include_result: bool = True) -> dict:
+        """Return a snapshot of the job (without its event list), or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = {k: v for k, v in job.items() if k != "events"}
+            snapshot["progress"] = dict(job["progress"])
+            snapshot["stage_timings"] = dict(job["stage_timings"])
+            if not include_result:
+                snapshot.pop("result")
+            return snapshot
+
+    def list(self) -> list:
+        """Snapshots of all retained jobs, newest first, without results."""
+        with self._lock:
+            self._expire(time.time())
+            job_ids = list(self._jobs)
+        jobs = [self.get(job_id, include_result=False) for job_id in reversed(job_ids)]
+        return [job for job in jobs if job is not None]
+
+    def events_since(self, job_id: str, cursor: int):
+        """
+        Return (new_events, new_cursor, finished) for streaming a job's events.
+        The cursor counts every event ever recorded, so events dropped for
+        JOB_MAX_EVENTS are skipped rather than shifting the stream.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return [], cursor, True
+            dropped = job["events_dropped"]
+            events = job["events"][max(cursor - dropped, 0):]
+            finished = job["status"] in ("succeeded", "failed")
+            return list(events), dropped + len(job["events"]), finished
+
+    def shutdown(self) -> None:
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
+
+
+# Shared, process-wide job manager used by the job endpoints.
+job_manager = JobManager()
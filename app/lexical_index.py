@@ -0,0 +1,200 @@
+# app/lexical_index.py
+import os
+import re
+import json
+import math
+import heapq
+import threading
+from collections import Counter
+from config import settings
+
+LEXICAL_INDEX_PATH = getattr(settings, "LEXICAL_INDEX_PATH", "lexical_index.json")
+# Standard Okapi BM25 parameters.
+BM25_K1 = getattr(settings, "BM25_K1", 1.2)
+BM25_B = getattr(settings, "BM25_B", 0.75)
+# Optional pruning, off by default: with it on, terms found in more than
+# COMMON_TERM_RATIO of the units (e.g. a project key present in every ticket)
+# only re-score units already matched by rarer query terms, so a query never
+# walks their long postings lists. That approximates BM25: a unit matching only
+# common terms is never scored when a rarer query term matched elsewhere.
+BM25_PRUNE_COMMON_TERMS = getattr(settings, "BM25_PRUNE_COMMON_TERMS", False)
+COMMON_TERM_RATIO = getattr(settings, "BM25_COMMON_TERM_RATIO", 0.2)
+
+# Tokens keep the characters that make identifiers exact: ticket keys (MCC-209),
+# paths (/v2/inventory), versions (1.4.2) and error codes (500).
+_TOKEN_RE = re.compile(r"[\w/][\w\-./]*")
+_PART_RE = re.compile(r"[\-./]+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Lowercase text and split it into tokens. Compound tokens such as "mcc-209"
+    or "/v2/inventory" are kept whole and also contribute their parts, so both
+    exact identifiers and the words inside them can be matched.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        token = token.strip("-./") or token
+        tokens.append(token)
+        parts = [part for part in _PART_RE.split(token) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    In-memory BM25 inverted index over the chunk_text and summary of every
+    knowledge unit, kept next to the vector index and updated with it.
+
+    Scoring only walks the postings of the query terms, so lookups need no
+    embedding and take well under a millisecond on typical corpora. The term
+    counts of each unit are written to a JSON file and the postings rebuilt from
+    it on load.
+    """
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH, k1: float = BM25_K1, b: float = BM25_B,
+                 prune_common_terms: bool = BM25_PRUNE_COMMON_TERMS):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.prune_common_terms = prune_common_terms
+        self._lock = threading.RLock()
+        self._doc_terms = {}  # unit id -> {term: term frequency}
+        self._postings = {}   # term -> {unit id: term frequency}
+        self._doc_len = {}
+        self._total_len = 0
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._doc_terms)
+
+    def load_or_build(self, load_documents, expected_count: int = None) -> None:
+        """
+        Load the index from disk, or rebuild it from load_documents() when there is
+        no saved index or it no longer matches the number of stored units.
+        """
+        with self._lock:
+            if self.load() and (expected_count is None or expected_count == self.ntotal):
+                return
+            self.rebuild(load_documents())
+
+    def load(self) -> bool:
+        """Load a previously saved index. Returns False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            doc_terms = json.load(f)
+        with self._lock:
+            self._clear()
+            for doc_id, terms in doc_terms.items():
+                self._index_terms(doc_id, terms)
+        return True
+
+    def save(self) -> None:
+        """Persist the per-unit term counts to disk."""
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._doc_terms, f)
+
+    def rebuild(self, documents) -> None:
+        """Replace the whole index with the given documents."""
+        with self._lock:
+            self._clear()
+            self.add(documents, persist=False)
+            self.save()
+
+    def add(self, documents, persist: bool = True) -> int:
+        """
+        Index (or re-index) the chunk_text and summary of the given documents.
+        Documents without an 'id' are skipped. Returns the number indexed.
+        """
+        added = 0
+        with self._lock:
+            for doc in documents:
+                doc_id = doc.get("id")
+                if doc_id is None:
+                    continue
+                text = f"{doc.get('chunk_text') or ''} {doc.get('summary') or ''}"
+                self._remove_terms(doc_id)
+                self._index_terms(doc_id, Counter(tokenize(text)))
+                added += 1
+            if persist and added:
+                self.save()
+        return added
+
+    def remove(self, doc_ids: list, persist: bool = True) -> int:
+        """Remove the given knowledge unit ids. Returns the number removed."""
+        with self._lock:
+            removed = sum(self._remove_terms(doc_id) for doc_id in doc_ids or [])
+            if persist and removed:
+                self.save()
+        return removed
+
+    def search(self, query: str, top_k: int = 3, allowed_ids: set = None):
+        """
+        Score the units against the query with BM25, only over allowed_ids when given.
+        Returns (doc_ids, scores) ordered by descending score; units that share
+        no term with the query are not returned. Scores are exact BM25 unless
+        prune_common_terms is set (see BM25_PRUNE_COMMON_TERMS).
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not terms or n_docs == 0:
+                return [], []
+            avg_len = self._total_len / n_docs
+            postings_by_term = sorted(
+                (self._postings[term] for term in terms if term in self._postings), key=len,
+            )
+            if not postings_by_term:
+                return [], []
+            # Rarest terms first, so with pruning exact identifiers decide the candidate set.
+            common_df = max(1, int(n_docs * COMMON_TERM_RATIO)) if self.prune_common_terms else n_docs
+            scores = {}
+            for postings in postings_by_term:
+                df = len(postings)
+                idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                if scores and df > common_df:
+                    matches = ((doc_id, postings.get(doc_id)) for doc_id in list(scores))
+                else:
+                    matches = postings.items()
+                for doc_id, tf in matches:
+                    if not tf or (allowed_ids is not None and doc_id not in allowed_ids):
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[doc_id] / avg_len)
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [doc_id for doc_id, _ in top], [score for _, score in top]
+
+    def _clear(self) -> None:
+        self._doc_terms = {}
+        self._postings = {}
+        self._doc_len = {}
+        self._total_len = 0
+
+    def _index_terms(self, doc_id: str, terms: dict) -> None:
+        terms = dict(terms)
+        self._doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def _remove_terms(self, doc_id: str) -> bool:
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return False
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+        return True
+
+
+# Shared, process-wide index used by the search and ingest endpoints.
+lexical_index = LexicalIndex()
@@ -1,14 +1,62 @@
 # app/main.py
-from fastapi import FastAPI
+import time
+# Measured from here so the reported startup time includes importing the routers.
+_startup_began = time.perf_counter()
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from config import settings
-from endpoints import auth, ingest, record, search, test, ingest_confluence  # Import your endpoint routers
+from endpoints import auth, ingest, record, search, test, ingest_confluence, jobs, models, metrics  # Import your endpoint routers
+from db import init_store, close_store, get_store
+from vector_index import vector_index
+from lexical_index import lexical_index
+from metadata_index import metadata_index
+from dedup_index import duplicate_index
+from job_queue import job_manager
+from model_registry import model_registry, WARM_MODELS
+from telemetry import configure_logging, metrics as telemetry_metrics, tracer
 import uvicorn
 # import your endpoint routers
 # If you have search endpoints: from app.endpoints import search
 
-app = FastAPI(title="Knowledge Transfer System")
+# Leveled, sampled logging (LOG_LEVEL, LOG_SAMPLE_RATE).
+configure_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled MongoDB client for the whole application.
+    init_store()
+    # Load the persisted FAISS index once (rebuilding it from MongoDB if it is
+    # missing or stale) so that /search never has to rebuild it per request.
+    vector_index.load_or_build(
+        search.get_mongo_documents,
+        expected_count=search.count_embedded_documents(),
+    )
+    # Same for the BM25 index used by lexical and hybrid search.
+    lexical_index.load_or_build(
+        search.get_lexical_documents,
+        expected_count=search.count_documents(),
+    )
+    # And for the per-attribute index behind the /search filters.
+    metadata_index.load_or_build(
+        search.get_metadata_documents,
+        expected_count=search.count_documents(),
+    )
+    # Fingerprints of the ingested sources, for duplicate detection at ingest.
+    duplicate_index.load(get_store().iter_fingerprints())
+    # Models load on first use; WARM_MODELS are loaded in the background instead.
+    model_registry.warmup(WARM_MODELS)
+    model_registry.startup_seconds = round(time.perf_counter() - _startup_began, 3)
+    yield
+    job_manager.shutdown()
+    # Ingests flush the indexes when they finish; this catches anything still pending.
+    ingest.flush_search_indexes()
+    # Streamed uploads cannot be resumed after a restart.
+    record.expire_stream_uploads(ttl=0)
+    close_store()
+
+app = FastAPI(title="Knowledge Transfer System", lifespan=lifespan)
 
 # Add middleware (adjust CORS and session configs as needed)
 app.add_middleware(
@@ -20,6 +68,25 @@ app.add_middleware(
 )
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    """Time every request by route template (and trace it when tracing is enabled)."""
+    start = time.perf_counter()
+    status = 500
+    with tracer.span("http.request", method=request.method, path=request.url.path) as span:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            if span is not None:
+                span["attributes"].update(route=route_path, status=status)
+            telemetry_metrics.observe("http_request_seconds", time.perf_counter() - start,
+                                      "Latency of API requests", method=request.method,
+                                      route=route_path, status=status)
+
 # Include endpoint routers
 app.include_router(auth.router, prefix="")
 app.include_router(ingest.router, prefix="")
@@ -27,6 +94,9 @@ app.include_router(record.router, prefix="")
 app.include_router(search.router, prefix="")  
 app.include_router(test.router, prefix="")
 app.include_router(ingest_confluence.router, prefix="")  # If you have a test endpoint
+app.include_router(jobs.router, prefix="")
+app.include_router(models.router, prefix="")
+app.include_router(metrics.router, prefix="")
 # If you have a record endpoint
 # app.include_router(search.router, prefix="")  # If you have a search endpoint
 
@@ -0,0 +1,218 @@
+# app/metadata_index.py
+import os
+import json
+import bisect
+import datetime
+import threading
+import numpy as np
+from config import settings
+from vector_index import to_faiss_id
+
+METADATA_INDEX_PATH = getattr(settings, "METADATA_INDEX_PATH", "metadata_index.json")
+# Knowledge unit fields with a value -> unit ids index. 'speaker' holds the
+# source (Jira, Confluence, Recording) and is filtered on as `source`.
+FILTER_FIELDS = ("speaker", "source_audio_id", "tags")
+# Unit timestamps are UTC, always with microseconds, so they sort as strings.
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+
+def normalize_timestamp(value: str, end_of_day: bool = False) -> str:
+    """
+    Parse an ISO 8601 date or time and return it in TIMESTAMP_FORMAT, in UTC.
+    Times without an offset are taken as UTC. A date alone means the start of
+    that day, or its last microsecond with end_of_day (for inclusive upper
+    bounds). Raises ValueError for anything else.
+    """
+    value = value.strip()
+    try:
+        day = datetime.date.fromisoformat(value)
+    except ValueError:
+        parsed = datetime.datetime.fromisoformat(value)
+    else:
+        parsed = datetime.datetime.combine(day, datetime.time.max if end_of_day else datetime.time.min)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed.strftime(TIMESTAMP_FORMAT)
+
+
+def _unit_metadata(doc: dict) -> dict:
+    timestamp = doc.get("timestamp")
+    try:
+        timestamp = normalize_timestamp(timestamp) if timestamp else timestamp
+    except (TypeError, ValueError):
+        pass
+    return {
+        "speaker": doc.get("speaker"),
+        "source_audio_id": doc.get("source_audio_id"),
+        "tags": list(doc.get("tags") or []),
+        "timestamp": timestamp,
+    }
+
+
+class MetadataIndex:
+    """
+    Per-attribute inverted indexes over the knowledge unit metadata used to
+    scope searches: source (the unit's 'speaker'), source_audio_id, tags and
+    the timestamp.
+
+    Every attribute value maps to the set of unit ids carrying it, and the
+    timestamps are kept in a sorted list, so a filter resolves to the matching
+    ids without touching MongoDB. The retrievers then only score that subset
+    (the vector index through a FAISS IDSelector). The metadata is written to a
+    JSON file and the indexes rebuilt from it on load.
+    """
+
+    def __init__(self, path: str = METADATA_INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._clear()
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._docs)
+
+    def load_or_build(self, load_documents, expected_count: int = None) -> None:
+        """
+        Load the index from disk, or rebuild it from load_documents() when there is
+        no saved index or it no longer matches the number of stored units.
+        """
+        with self._lock:
+            if self.load() and (expected_count is None or expected_count == self.ntotal):
+                return
+            self.rebuild(load_documents())
+
+    def load(self) -> bool:
+        """Load a previously saved index. Returns False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        with self._lock:
+            self._clear()
+            for doc_id, metadata in docs.items():
+                self._index(doc_id, metadata, keep_sorted=False)
+            self._timeline.sort()
+        return True
+
+    def save(self) -> None:
+        """Persist the per-unit metadata to disk."""
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._docs, f)
+
+    def rebuild(self, documents) -> None:
+        """Replace the whole index with the given documents."""
+        with self._lock:
+            self._clear()
+            self.add(documents, persist=False)
+            self.save()
+
+    def add(self, documents, persist: bool = True) -> int:
+        """
+        Index (or re-index) the metadata of the given documents.
+        Documents without an 'id' are skipped. Returns the number indexed.
+        """
+        added = 0
+        with self._lock:
+            # Filling an empty index (a rebuild) sorts the timeline once at the end.
+            bulk = not self._docs
+            for doc in documents:
+                doc_id = doc.get("id")
+                if doc_id is None:
+                    continue
+                self._unindex(doc_id)
+                self._index(doc_id, _unit_metadata(doc), keep_sorted=not bulk)
+                added += 1
+            if bulk:
+                self._timeline.sort()
+            if persist and added:
+                self.save()
+        return added
+
+    def remove(self, doc_ids: list, persist: bool = True) -> int:
+        """Remove the given knowledge unit ids. Returns the number removed."""
+        with self._lock:
+            removed = sum(self._unindex(doc_id) for doc_id in doc_ids or [])
+            if persist and removed:
+                self.save()
+        return removed
+
+    def select(self, source: str = None, source_audio_id: str = None, tags: list = None,
+               since: str = None, until: str = None):
+        """
+        Return the set of unit ids matching every given filter, or None when no
+        filter is given (meaning "all units"). A unit matches tags when it carries
+        all of them; since/until bound the timestamp, inclusive, and must be in
+        TIMESTAMP_FORMAT (see normalize_timestamp).
+        """
+        conditions = [("speaker", [source] if source else []),
+                      ("source_audio_id", [source_audio_id] if source_audio_id else []),
+                      ("tags", list(tags or []))]
+        with self._lock:
+            candidates = [self._values[field].get(value, set())
+                          for field, values in conditions for value in values]
+            if since or until:
+                lo = bisect.bisect_left(self._timeline, (since,)) if since else 0
+                # "\uffff" sorts after any unit id, so units stamped exactly `until` are kept.
+                hi = bisect.bisect_right(self._timeline, (until, "\uffff")) if until else len(self._timeline)
+                candidates.append({doc_id for _, doc_id in self._timeline[lo:hi]})
+            if not candidates:
+                return None
+            # Intersect starting from the smallest set.
+            candidates.sort(key=len)
+            selected = set(candidates[0])
+            for ids in candidates[1:]:
+                selected &= ids
+                if not selected:
+                    break
+            return selected
+
+    def faiss_ids(self, doc_ids) -> np.ndarray:
+        """The precomputed FAISS ids of the given unit ids, for an IDSelector."""
+        with self._lock:
+            return np.fromiter((self._faiss_ids[doc_id] for doc_id in doc_ids if doc_id in self._faiss_ids),
+                               dtype="int64")
+
+    def _clear(self) -> None:
+        self._docs = {}  # unit id -> metadata
+        self._values = {field: {} for field in FILTER_FIELDS}  # field -> value -> unit ids
+        self._timeline = []  # sorted (timestamp, unit id)
+        self._faiss_ids = {}
+
+    def _index(self, doc_id: str, metadata: dict, keep_sorted: bool = True) -> None:
+        self._docs[doc_id] = metadata
+        self._faiss_ids[doc_id] = to_faiss_id(doc_id)
+        for field in FILTER_FIELDS:
+            values = metadata.get(field)
+            for value in values if isinstance(values, list) else [values]:
+                if value is not None:
+                    self._values[field].setdefault(value, set()).add(doc_id)
+        if metadata.get("timestamp"):
+            if keep_sorted:
+                bisect.insort(self._timeline, (metadata["timestamp"], doc_id))
+            else:
+                self._timeline.append((metadata["timestamp"], doc_id))
+
+    def _unindex(self, doc_id: str) -> bool:
+        metadata = self._docs.pop(doc_id, None)
+        if metadata is None:
+            return False
+        self._faiss_ids.pop(doc_id, None)
+        for field in FILTER_FIELDS:
+            values = metadata.get(field)
+            for value in values if isinstance(values, list) else [values]:
+                ids = self._values[field].get(value)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self._values[field][value]
+        if metadata.get("timestamp"):
+            entry = (metadata["timestamp"], doc_id)
+            pos = bisect.bisect_left(self._timeline, entry)
+            if pos < len(self._timeline) and self._timeline[pos] == entry:
+                del self._timeline[pos]
+        return True
+
+
+# Shared, process-wide index used by the search and ingest endpoints.
+metadata_index = MetadataIndex()
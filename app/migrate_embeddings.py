@@ -0,0 +1,51 @@
+# app/migrate_embeddings.py
+"""
+Convert stored embeddings from BSON arrays of doubles to the compact binary
+format written by the ingestion pipeline (see embedding_codec).
+
+    python migrate_embeddings.py [--dtype float32|float16|int8] [--batch-size 1000] [--dry-run]
+
+Only documents whose embedding is still an array are touched, so the script can
+be re-run safely after an interruption. Use --reencode to also convert binary
+embeddings that were stored with a different dtype; those already stored with
+the target dtype are left alone.
+"""
+import argparse
+from pymongo import UpdateOne
+from db import get_store
+from embedding_codec import EMBEDDING_STORAGE_DTYPE, encode_embedding, decode_embedding, embedding_dtype
+
+def migrate_embeddings(dtype: str = EMBEDDING_STORAGE_DTYPE, batch_size: int = 1000,
+                       dry_run: bool = False, reencode: bool = False) -> int:
+    """Rewrite embeddings in place. Returns the number of documents converted."""
+    store = get_store()
+    query = {"embedding": {"$exists": True}} if reencode else {"embedding": {"$type": "array"}}
+    cursor = store.collection.find(query, {"_id": 1, "embedding": 1}, batch_size=batch_size)
+    converted = 0
+    pending = []
+    for doc in cursor:
+        if embedding_dtype(doc["embedding"]) == dtype:
+            continue
+        encoded = encode_embedding(decode_embedding(doc["embedding"]), dtype)
+        pending.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"embedding": encoded}}))
+        if len(pending) >= batch_size:
+            if not dry_run:
+                store.collection.bulk_write(pending, ordered=False)
+            converted += len(pending)
+            pending = []
+    if pending:
+        if not dry_run:
+            store.collection.bulk_write(pending, ordered=False)
+        converted += len(pending)
+    return converted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored embeddings to compact binary storage.")
+    parser.add_argument("--dtype", default=EMBEDDING_STORAGE_DTYPE, choices=["float32", "float16", "int8"])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Count the documents without writing")
+    parser.add_argument("--reencode", action="store_true", help="Also convert embeddings already stored as binary")
+    args = parser.parse_args()
+    count = migrate_embeddings(args.dtype, args.batch_size, args.dry_run, args.reencode)
+    action = "Would convert" if args.dry_run else "Converted"
+    print(f"{action} {count} embeddings to {args.dtype}.")
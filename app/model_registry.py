@@ -0,0 +1,163 @@
+# app/model_registry.py
+import time
+import threading
+from config import settings
+from inference_backends import backend_for, load_embedder, load_pipeline
+
+SPACY_MODEL_NAME = "en_core_web_sm"
+EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+SUMMARIZER_MODEL_NAME = "facebook/bart-large-cnn"
+NER_MODEL_NAME = "dslim/bert-base-NER"
+WHISPER_MODEL_SIZE = getattr(settings, "WHISPER_MODEL_SIZE", "medium")
+
+# Models used by run_pipeline; ingestion worker processes always host these.
+PIPELINE_MODELS = ["spacy", "embedder", "summarizer", "ner"]
+
+
+def _as_list(value) -> list:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [name.strip() for name in value.split(",") if name.strip()]
+    return list(value)
+
+
+# Which models this process may load (all registered models when unset), e.g.
+# HOSTED_MODELS="embedder" for search-only API replicas.
+HOSTED_MODELS = _as_list(getattr(settings, "HOSTED_MODELS", None))
+# Models to load in the background right after startup instead of on first use.
+WARM_MODELS = _as_list(getattr(settings, "WARM_MODELS", None)) or []
+
+
+def _load_spacy():
+    import spacy
+    return spacy.load(SPACY_MODEL_NAME)
+
+# The embedder, summarizer and NER model run on the backend chosen in
+# inference_backends (INFERENCE_BACKEND / INFERENCE_BACKENDS).
+def _load_embedder():
+    return load_embedder(EMBED_MODEL_NAME, backend_for("embedder"))
+
+def _load_summarizer():
+    return load_pipeline("summarization", SUMMARIZER_MODEL_NAME, backend_for("summarizer"))
+
+def _load_ner():
+    # Using aggregation_strategy="simple" groups tokens into one entity.
+    return load_pipeline("ner", NER_MODEL_NAME, backend_for("ner"), aggregation_strategy="simple")
+
+def _load_whisper():
+    import whisper
+    return whisper.load_model(WHISPER_MODEL_SIZE)
+
+
+class ModelRegistry:
+    """
+    Loads models on first use (or in the background on request) and keeps them
+    for the life of the process. Only models listed in `hosted` may be loaded,
+    so a process that does not need a model never pays for it. Load times and
+    the process startup time are recorded for sizing containers.
+    """
+
+    def __init__(self, hosted: list = None):
+        self._loaders = {}
+        self._models = {}
+        self._info = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.hosted = hosted
+        self.startup_seconds = None
+
+    def register(self, name: str, loader) -> None:
+        with self._lock:
+            self._loaders[name] = loader
+            self._locks[name] = threading.Lock()
+            self._info[name] = {"loaded": False, "load_seconds": None, "error": None,
+                                "backend": backend_for(name)}
+
+    def is_hosted(self, name: str) -> bool:
+        return self.hosted is None or name in self.hosted
+
+    def host(self, names: list) -> None:
+        """Allow this process to load the given models in addition to the current ones."""
+        if self.hosted is not None:
+            self.hosted = list(dict.fromkeys(self.hosted + list(names)))
+
+    def get(self, name: str):
+        """Return the named model, loading it first if needed."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        if name not in self._loaders:
+            raise KeyError(f"Unknown model '{name}'.")
+        if not self.is_hosted(name):
+            raise RuntimeError(f"Model '{name}' is not hosted by this process (HOSTED_MODELS={self.hosted}).")
+        with self._locks[name]:
+            # Another thread may have finished loading while we waited.
+            if name in self._models:
+                return self._models[name]
+            start = time.perf_counter()
+            try:
+                model = self._loaders[name]()
+            except Exception as e:
+                self._info[name]["error"] = str(e)
+                raise
+            self._info[name].update(loaded=True, load_seconds=round(time.perf_counter() - start, 3), error=None)
+            self._models[name] = model
+            return model
+
+    def warmup(self, names: list, background: bool = True):
+        """Load the given hosted models now, on a background thread by default."""
+        names = [name for name in names if self.is_hosted(name)]
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    # The error is recorded in status(); the model is retried on first use.
+                    pass
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict:
+        """Per-model hosted/loaded state and load time, plus the process startup time."""
+        with self._lock:
+            models = {
+                name: {**info, "hosted": self.is_hosted(name)}
+                for name, info in self._info.items()
+            }
+        return {"startup_seconds": self.startup_seconds, "models": models}
+
+
+class LazyModel:
+    """Stand-in that forwards calls and attribute access to a registry model."""
+
+    def __init__(self, registry: ModelRegistry, name: str):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._registry.get(self._name)(*args, **kwargs)
+
+
+# Shared, process-wide registry.
+model_registry = ModelRegistry(hosted=HOSTED_MODELS)
+model_registry.register("spacy", _load_spacy)
+model_registry.register("embedder", _load_embedder)
+model_registry.register("summarizer", _load_summarizer)
+model_registry.register("ner", _load_ner)
+model_registry.register("whisper", _load_whisper)
+
+nlp = LazyModel(model_registry, "spacy")
+embed_model = LazyModel(model_registry, "embedder")
+summarizer_pipeline = LazyModel(model_registry, "summarizer")
+ner_pipeline = LazyModel(model_registry, "ner")
+whisper_model = LazyModel(model_registry, "whisper")
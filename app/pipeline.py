@@ -1,21 +1,76 @@
 # app/pipeline.py
 import re
+import time
 import uuid
+import logging
 import datetime
-import spacy
+from contextlib import contextmanager
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
 from sklearn.cluster import AgglomerativeClustering
+from config import settings
+from pipeline_cache import pipeline_cache, content_hash
+from telemetry import metrics, tracer, SIZE_BUCKETS
+from inference_backends import version_suffix
+# Models are loaded lazily by the registry on first use, not at import.
+from model_registry import (
+    nlp, embed_model, summarizer_pipeline, ner_pipeline,
+    SPACY_MODEL_NAME, EMBED_MODEL_NAME, SUMMARIZER_MODEL_NAME, NER_MODEL_NAME,
+)
 
-# Cache models — load these once on startup.
-nlp = spacy.load("en_core_web_sm")
-embed_model = SentenceTransformer("all-MiniLM-L6-v2")
-summarizer_pipeline = pipeline("summarization", model="facebook/bart-large-cnn")
+logger = logging.getLogger(__name__)
 
-# Initialize the NER pipeline.
-# Using aggregation_strategy="simple" groups tokens into one entity.
-ner_pipeline = pipeline("ner", model="dslim/bert-base-NER", aggregation_strategy="simple")
+# Number of items sent through a model in one forward pass by the batched stages.
+PIPELINE_BATCH_SIZE = getattr(settings, "PIPELINE_BATCH_SIZE", 16)
+
+# Versions that key the cached outputs of each stage. Any change to a model or
+# its settings must change the matching version so stale results are not reused.
+CLUSTER_DISTANCE_THRESHOLD = 0.35
+# Documents with more sentences than this are segmented with sliding-window
+# similarity breakpoints instead of agglomerative clustering, which needs a full
+# pairwise distance matrix.
+CLUSTER_MAX_SENTENCES = getattr(settings, "CLUSTER_MAX_SENTENCES", 256)
+SEGMENT_WINDOW = getattr(settings, "SEGMENT_WINDOW", 3)
+# Upper bound on chunk length, in whitespace-delimited tokens.
+CHUNK_MAX_TOKENS = getattr(settings, "CHUNK_MAX_TOKENS", 400)
+# Chunks longer than this many summarizer tokens are summarized window by window
+# and the partial summaries reduced in a second pass (BART reads 1024 tokens).
+SUMMARY_MAX_INPUT_TOKENS = getattr(settings, "SUMMARY_MAX_INPUT_TOKENS", 1000)
+# Cap on windows per chunk; with it every chunk costs at most two summarizer
+# passes, which bounds per-chunk latency.
+SUMMARY_MAX_WINDOWS = getattr(settings, "SUMMARY_MAX_WINDOWS", 8)
+EMBEDDING_VERSION = EMBED_MODEL_NAME + version_suffix("embedder")
+SUMMARY_VERSION = (f"{SUMMARIZER_MODEL_NAME}{version_suffix('summarizer')}"
+                   f":max60:min15:win{SUMMARY_MAX_INPUT_TOKENS}x{SUMMARY_MAX_WINDOWS}")
+TAGS_VERSION = NER_MODEL_NAME + version_suffix("ner")
+DOCUMENT_VERSION = "|".join([
+    SPACY_MODEL_NAME, EMBEDDING_VERSION,
+    f"cluster{CLUSTER_DISTANCE_THRESHOLD}:max{CLUSTER_MAX_SENTENCES}:win{SEGMENT_WINDOW}:tok{CHUNK_MAX_TOKENS}",
+    SUMMARY_VERSION, TAGS_VERSION,
+])
+
+@contextmanager
+def _stage(name: str):
+    """Time a run_pipeline stage into the pipeline_stage_seconds histogram (and a trace span)."""
+    with tracer.span(f"pipeline.{name}"):
+        with metrics.timed("pipeline_stage_seconds", "Duration of run_pipeline stages", stage=name):
+            yield
+
+@contextmanager
+def _model_call(model: str, items: int):
+    """Record the number of items and the latency of one batched model call."""
+    metrics.observe("model_batch_items", items, "Items sent to a model per batched call",
+                    buckets=SIZE_BUCKETS, model=model)
+    with metrics.timed("model_call_seconds", "Latency of batched model calls", model=model):
+        yield
+
+def _entities_to_tags(entities: list) -> list:
+    tags = []
+    for entity in entities:
+        # Use the aggregated entity group if available
+        tag = entity.get("entity_group") or entity.get("entity")
+        if tag:
+            tags.append(tag.lower())
+    return list(set(tags))
 
 def extract_tags(text: str) -> list:
     """
@@ -27,15 +82,24 @@ def extract_tags(text: str) -> list:
     Returns:
         list: A list of unique, lowercase NER tags (e.g., 'org', 'per', etc.).
     """
-    entities = ner_pipeline(text)
-    print("NER Entities:", entities)  # Debug: Check what entities are detected
-    tags = []
-    for entity in entities:
-        # Use the aggregated entity group if available
-        tag = entity.get("entity_group") or entity.get("entity")
-        if tag:
-            tags.append(tag.lower())
-    return list(set(tags))
+    return extract_tags_batch([text])[0]
+
+def extract_tags_batch(texts: list, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
+    """
+    Extract NER tags for many texts with batched calls to the NER pipeline.
+
+    Args:
+        texts (list): The input texts.
+        batch_size (int): Number of texts per forward pass.
+
+    Returns:
+        list: One list of unique, lowercase NER tags per input text.
+    """
+    if not texts:
+        return []
+    with _model_call("ner", len(texts)):
+        entities_per_text = ner_pipeline(list(texts), batch_size=batch_size)
+    return [_entities_to_tags(entities) for entities in entities_per_text]
 
 
 def preprocess_text(text: str) -> str:
@@ -47,49 +111,203 @@ def spacy_sentence_tokenize(text: str) -> list:
     doc = nlp(text)
     return [sent.text.strip() for sent in doc.sents if sent.text.strip()]
 
-def cluster_chunks(sentences: list, distance_threshold: float = 0.35) -> list:
+def spacy_sentence_tokenize_many(texts: list, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
+    """Tokenize many texts into sentences with a single nlp.pipe pass."""
+    with _model_call("spacy", len(texts)):
+        return [
+            [sent.text.strip() for sent in doc.sents if sent.text.strip()]
+            for doc in nlp.pipe(texts, batch_size=batch_size)
+        ]
+
+def cluster_chunks(sentences: list, distance_threshold: float = CLUSTER_DISTANCE_THRESHOLD) -> list:
+    return cluster_chunks_with_embeddings(sentences, distance_threshold)[0]
+
+def cluster_chunks_with_embeddings(sentences: list, distance_threshold: float = CLUSTER_DISTANCE_THRESHOLD,
+                                   batch_size: int = PIPELINE_BATCH_SIZE):
+    """
+    Cluster sentences into chunks and return (chunks, chunk_embeddings).
+    A chunk made of a single sentence reuses that sentence's embedding so it does
+    not have to be encoded again; other chunks get None and are embedded later.
+    """
+    if not sentences:
+        return [], []
+    embeddings = np.array(embed_texts(sentences, batch_size=batch_size))
+    return cluster_sentence_embeddings(sentences, embeddings, distance_threshold)
+
+def cluster_sentence_embeddings(sentences: list, embeddings, distance_threshold: float = CLUSTER_DISTANCE_THRESHOLD):
+    """
+    Group already-embedded sentences into chunks.
+    Small inputs use agglomerative clustering; inputs longer than
+    CLUSTER_MAX_SENTENCES use order-preserving segmentation, so memory and time
+    stay linear in document length. No chunk exceeds CHUNK_MAX_TOKENS tokens
+    (unless a single sentence does).
+    Returns (chunks, chunk_embeddings) like cluster_chunks_with_embeddings.
+    """
     if not sentences:
-        return []
-    embeddings = embed_model.encode(sentences)
+        return [], []
     if len(sentences) == 1:
-        return sentences
-    clustering_model = AgglomerativeClustering(
-        n_clusters=None,
-        metric="cosine",
-        linkage="average",
-        distance_threshold=distance_threshold,
+        return sentences, [embeddings[0]]
+    if len(sentences) > CLUSTER_MAX_SENTENCES:
+        groups = segment_sentences(embeddings, distance_threshold=distance_threshold)
+    else:
+        clustering_model = AgglomerativeClustering(
+            n_clusters=None,
+            metric="cosine",
+            linkage="average",
+            distance_threshold=distance_threshold,
+        )
+        cluster_labels = clustering_model.fit_predict(embeddings)
+        # dict preserves insertion order, so labels come out in order of first appearance.
+        members = {}
+        for idx, label in enumerate(cluster_labels):
+            members.setdefault(label, []).append(idx)
+        groups = list(members.values())
+
+    token_counts = [len(sentence.split()) for sentence in sentences]
+    chunk_list = []
+    chunk_embeddings = []
+    for group in groups:
+        for idxs in _split_by_tokens(group, token_counts):
+            chunk_list.append(" ".join(sentences[i] for i in idxs))
+            chunk_embeddings.append(embeddings[idxs[0]] if len(idxs) == 1 else None)
+    return chunk_list, chunk_embeddings
+
+def segment_sentences(embeddings, distance_threshold: float = CLUSTER_DISTANCE_THRESHOLD,
+                      window: int = SEGMENT_WINDOW) -> list:
+    """
+    Split a sequence of sentence embeddings into runs of consecutive sentences.
+    At each gap between two sentences, the mean embedding of the `window`
+    sentences before it is compared with that of the `window` sentences after
+    it; the text is cut where that cosine similarity is a local minimum below
+    1 - distance_threshold. Uses prefix sums, so it is O(n) in the number of
+    sentences. Returns a list of index lists.
+    """
+    vectors = np.asarray(embeddings, dtype="float32")
+    n = len(vectors)
+    if n < 2:
+        return [list(range(n))]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+    prefix = np.vstack([np.zeros((1, vectors.shape[1]), dtype="float32"), np.cumsum(vectors, axis=0)])
+
+    gaps = np.arange(1, n)  # gap g lies between sentence g-1 and sentence g
+    left = prefix[gaps] - prefix[np.maximum(gaps - window, 0)]
+    right = prefix[np.minimum(gaps + window, n)] - prefix[gaps]
+    similarity = np.einsum("ij,ij->i", left, right) / np.maximum(
+        np.linalg.norm(left, axis=1) * np.linalg.norm(right, axis=1), 1e-12
     )
-    cluster_labels = clustering_model.fit_predict(embeddings)
-    chunks = {}
-    for idx, label in enumerate(cluster_labels):
-        chunks.setdefault(label, []).append(sentences[idx])
-    sorted_labels = sorted(chunks.keys(), key=lambda lab: next(i for i, l in enumerate(cluster_labels) if l == lab))
-    chunk_list = [" ".join(chunks[label]) for label in sorted_labels]
-    return chunk_list
-
-def summarize_chunks(chunks: list) -> list:
-    results = []
-    for chunk in chunks:
-        if len(chunk.split()) < 30:
-            summary = chunk  # Too short to summarize
-        else:
-            summary_res = summarizer_pipeline(chunk, max_length=60, min_length=15, do_sample=False)
-            summary = summary_res[0]['summary_text']
-        results.append({
-            "chunk_text": chunk,
-            "summary": summary
-        })
-    return results
+    padded = np.concatenate([[np.inf], similarity, [np.inf]])
+    is_minimum = (similarity <= padded[:-2]) & (similarity <= padded[2:])
+    cuts = gaps[is_minimum & (similarity < 1.0 - distance_threshold)]
+
+    bounds = [0] + cuts.tolist() + [n]
+    return [list(range(start, end)) for start, end in zip(bounds, bounds[1:])]
+
+def _split_by_tokens(idxs: list, token_counts: list, max_tokens: int = CHUNK_MAX_TOKENS) -> list:
+    """Split a group of sentence indices into consecutive pieces of at most max_tokens tokens."""
+    pieces = []
+    current = []
+    current_tokens = 0
+    for i in idxs:
+        if current and current_tokens + token_counts[i] > max_tokens:
+            pieces.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += token_counts[i]
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _summarize_texts(texts: list, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
+    """One batched summarizer call; inputs are truncated as a last resort."""
+    if not texts:
+        return []
+    with _model_call("summarizer", len(texts)):
+        summary_res = summarizer_pipeline(
+            texts,
+            batch_size=batch_size,
+            max_length=60,
+            min_length=15,
+            do_sample=False,
+            truncation=True,
+        )
+    return [res['summary_text'] for res in summary_res]
+
+def _token_windows(text: str, tokenizer, max_tokens: int = SUMMARY_MAX_INPUT_TOKENS,
+                   max_windows: int = SUMMARY_MAX_WINDOWS) -> list:
+    """
+    Split text into consecutive windows of at most max_tokens summarizer tokens.
+    When there would be more than max_windows, evenly spaced windows are kept.
+    """
+    ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+    if len(ids) <= max_tokens:
+        return [text]
+    windows = [ids[start:start + max_tokens] for start in range(0, len(ids), max_tokens)]
+    if len(windows) > max_windows:
+        keep = np.linspace(0, len(windows) - 1, max_windows).round().astype(int)
+        windows = [windows[i] for i in sorted(set(keep.tolist()))]
+    return [tokenizer.decode(window, skip_special_tokens=True) for window in windows]
 
-def package_for_db(summaries: list, source_id: str, source: str = "Jira") -> list:
+def summarize_chunks(chunks: list, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
+    """
+    Summarize every chunk that is long enough, in batched calls to the summarizer.
+
+    Chunks are measured with the summarizer's tokenizer. Those that do not fit
+    its input window are split into token windows; the windows of all chunks are
+    summarized together (map), then each chunk's partial summaries are joined and
+    summarized once more (reduce).
+    """
+    summaries = list(chunks)
+    # Chunks under 30 words are too short to summarize and are kept as they are.
+    long_idxs = [i for i, chunk in enumerate(chunks) if len(chunk.split()) >= 30]
+    if not long_idxs:
+        return [{"chunk_text": chunk, "summary": summary} for chunk, summary in zip(chunks, summaries)]
+
+    tokenizer = summarizer_pipeline.tokenizer
+    windows = []
+    owners = []
+    for i in long_idxs:
+        chunk_windows = _token_windows(chunks[i], tokenizer)
+        windows.extend(chunk_windows)
+        owners.extend([i] * len(chunk_windows))
+
+    start = time.perf_counter()
+    partials = {}
+    for i, summary in zip(owners, _summarize_texts(windows, batch_size=batch_size)):
+        partials.setdefault(i, []).append(summary)
+    map_seconds = time.perf_counter() - start
+
+    reduce_idxs = [i for i in long_idxs if len(partials[i]) > 1]
+    for i in long_idxs:
+        if len(partials[i]) == 1:
+            summaries[i] = partials[i][0]
+    start = time.perf_counter()
+    reduced = _summarize_texts([" ".join(partials[i]) for i in reduce_idxs], batch_size=batch_size)
+    for i, summary in zip(reduce_idxs, reduced):
+        summaries[i] = summary
+    reduce_seconds = time.perf_counter() - start
+
+    # Every chunk finishes within the map pass plus (if it was split) the reduce pass.
+    logger.info(
+        "Summarized %d chunks as %d windows (%d reduced): map %.2fs, reduce %.2fs, max per-chunk %.2fs",
+        len(long_idxs), len(windows), len(reduce_idxs), map_seconds, reduce_seconds,
+        map_seconds + (reduce_seconds if reduce_idxs else 0.0),
+    )
+    return [{"chunk_text": chunk, "summary": summary} for chunk, summary in zip(chunks, summaries)]
+
+def package_for_db(summaries: list, source_id: str, source: str = "Jira",
+                   batch_size: int = PIPELINE_BATCH_SIZE, tags: list = None) -> list:
     """
     Package each summarized chunk into a document suitable for database storage.
     Now enriched with NER tags extracted from the chunk's text.
+    Pass precomputed tags (one list per summary) to skip the NER stage.
     """
     timestamp = datetime.datetime.utcnow().isoformat() + "Z"
+    if tags is None:
+        tags = extract_tags_batch([item["chunk_text"] for item in summaries], batch_size=batch_size)
     output = []
-    for item in summaries:
-        ner_tags = extract_tags(item["chunk_text"])
+    for item, ner_tags in zip(summaries, tags):
         output.append({
             "id": str(uuid.uuid4()),
             "chunk_text": item["chunk_text"],
@@ -101,13 +319,26 @@ def package_for_db(summaries: list, source_id: str, source: str = "Jira") -> lis
         })
     return output
 
-def add_embeddings(data: list) -> list:
-    """Compute and insert semantic embeddings into each document."""
-    for item in data:
-        item["embedding"] = embed_model.encode(item["chunk_text"]).tolist()
+def add_embeddings(data: list, embeddings: list = None, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
+    """
+    Compute and insert semantic embeddings into each document.
+    Precomputed embeddings (one per document, None where missing) are reused and
+    the remaining chunk texts are encoded in a single batched call.
+    """
+    if embeddings is None:
+        embeddings = [None] * len(data)
+    missing = [i for i, emb in enumerate(embeddings) if emb is None]
+    if missing:
+        with _model_call("embedding", len(missing)):
+            encoded = embed_model.encode([data[i]["chunk_text"] for i in missing], batch_size=batch_size)
+        embeddings = list(embeddings)
+        for i, emb in zip(missing, encoded):
+            embeddings[i] = emb
+    for item, emb in zip(data, embeddings):
+        item["embedding"] = np.asarray(emb).tolist()
     return data
 
-def run_pipeline(raw_text: str, source_id: str) -> list:
+def run_pipeline(raw_text: str, source_id: str, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
     """
     Run the entire ingestion pipeline:
       - Clean and preprocess input text.
@@ -115,11 +346,115 @@ def run_pipeline(raw_text: str, source_id: str) -> list:
       - Cluster sentences into chunks.
       - Summarize each chunk.
       - Package results for the database (including extracting NER tags).
+    Each model stage runs over all chunks in batches of batch_size.
+    """
+    results = run_pipeline_many([{"raw_text": raw_text, "source_id": source_id}], batch_size=batch_size)
+    return results.get(source_id, [])
+
+def embed_texts(texts: list, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
+    """Embed texts in batches, reusing cached embeddings of texts seen before."""
+    def encode(missing):
+        with _model_call("embedding", len(missing)):
+            return list(embed_model.encode(missing, batch_size=batch_size))
+
+    return pipeline_cache.get_or_compute("embedding", EMBEDDING_VERSION, texts, encode)
+
+def _process_texts(clean_texts: list, batch_size: int = PIPELINE_BATCH_SIZE) -> list:
+    """
+    Run the NLP stages over already-cleaned texts, pooling the work of all texts
+    into shared batches. Returns, per text, a list of chunk dicts with
+    'chunk_text', 'summary', 'tags' and 'embedding'.
+    """
+    if not clean_texts:
+        return []
+    with _stage("sentences"):
+        sentences_per_doc = spacy_sentence_tokenize_many(clean_texts, batch_size=batch_size)
+
+    # One embedding pass over the sentences of every document, then cluster per document.
+    all_sentences = [sent for sentences in sentences_per_doc for sent in sentences]
+    with _stage("embed_sentences"):
+        sentence_embeddings = np.array(embed_texts(all_sentences, batch_size=batch_size))
+    chunks_per_doc = []
+    all_chunk_embeddings = []
+    offset = 0
+    with _stage("cluster"):
+        for sentences in sentences_per_doc:
+            doc_embeddings = sentence_embeddings[offset:offset + len(sentences)]
+            offset += len(sentences)
+            chunks, chunk_embeddings = cluster_sentence_embeddings(sentences, doc_embeddings)
+            chunks_per_doc.append(chunks)
+            all_chunk_embeddings.extend(chunk_embeddings)
+
+    # Summarize, tag and embed the chunks of all documents together.
+    all_chunks = [chunk for chunks in chunks_per_doc for chunk in chunks]
+    with _stage("summarize"):
+        all_summaries = pipeline_cache.get_or_compute(
+            "summary", SUMMARY_VERSION, all_chunks,
+            lambda missing: [item["summary"] for item in summarize_chunks(missing, batch_size=batch_size)],
+        )
+    with _stage("tags"):
+        all_tags = pipeline_cache.get_or_compute(
+            "tags", TAGS_VERSION, all_chunks,
+            lambda missing: extract_tags_batch(missing, batch_size=batch_size),
+        )
+    unembedded = [i for i, emb in enumerate(all_chunk_embeddings) if emb is None]
+    with _stage("embed_chunks"):
+        for i, emb in zip(unembedded, embed_texts([all_chunks[i] for i in unembedded], batch_size=batch_size)):
+            all_chunk_embeddings[i] = emb
+
+    results = []
+    offset = 0
+    for chunks in chunks_per_doc:
+        end = offset + len(chunks)
+        results.append([
+            {
+                "chunk_text": all_chunks[i],
+                "summary": all_summaries[i],
+                "tags": all_tags[i],
+                "embedding": np.asarray(all_chunk_embeddings[i], dtype="float32"),
+            }
+            for i in range(offset, end)
+        ])
+        offset = end
+    return results
+
+def run_pipeline_many(docs: list, batch_size: int = PIPELINE_BATCH_SIZE) -> dict:
+    """
+    Run the ingestion pipeline over many documents at once.
+
+    Each document is a dict with 'raw_text', 'source_id' and optionally 'source'
+    (defaults to "Jira"). spaCy runs over all texts with nlp.pipe, and the sentences
+    and chunks of every document are pooled into shared batches for embedding,
+    summarization and NER, so short documents do not each pay a full model call.
+    Documents whose normalized text was processed before are served from the
+    pipeline cache with a single hash lookup.
+
+    Returns a dict mapping each source_id to its list of packaged knowledge units.
+    Every unit carries the 'content_hash' of the document text it came from.
     """
-    clean_text = preprocess_text(raw_text)
-    sentences = spacy_sentence_tokenize(clean_text)
-    chunks = cluster_chunks(sentences)
-    summaries = summarize_chunks(chunks)
-    packaged_data = package_for_db(summaries, source_id)
-    packaged_data = add_embeddings(packaged_data)
-    return packaged_data
+    if not docs:
+        return {}
+    with _stage("preprocess"):
+        clean_texts = [preprocess_text(doc["raw_text"]) for doc in docs]
+    processed = pipeline_cache.get_or_compute(
+        "document", DOCUMENT_VERSION, clean_texts,
+        lambda missing: _process_texts(missing, batch_size=batch_size),
+    )
+    metrics.inc("pipeline_documents", len(docs), "Documents run through the pipeline")
+
+    # Route the results back to their source documents.
+    results = {}
+    with _stage("package"):
+        for doc, clean_text, chunks in zip(docs, clean_texts, processed):
+            units = package_for_db(
+                [{"chunk_text": c["chunk_text"], "summary": c["summary"]} for c in chunks],
+                doc["source_id"],
+                source=doc.get("source", "Jira"),
+                tags=[c["tags"] for c in chunks],
+            )
+            add_embeddings(units, [c["embedding"] for c in chunks])
+            text_hash = content_hash(clean_text)
+            for unit in units:
+                unit["content_hash"] = text_hash
+            results.setdefault(doc["source_id"], []).extend(units)
+    return results
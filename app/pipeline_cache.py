@@ -0,0 +1,143 @@
+# app/pipeline_cache.py
+import time
+import pickle
+import sqlite3
+import hashlib
+import threading
+from config import settings
+
+CACHE_PATH = getattr(settings, "PIPELINE_CACHE_PATH", "pipeline_cache.db")
+CACHE_MAX_ENTRIES = getattr(settings, "PIPELINE_CACHE_MAX_ENTRIES", 200000)
+# Seconds a connection waits for another process's write lock before failing.
+CACHE_BUSY_TIMEOUT = getattr(settings, "PIPELINE_CACHE_BUSY_TIMEOUT", 30.0)
+
+
+def content_hash(text: str) -> str:
+    """Hash of the whitespace-normalized text, used to detect unchanged content."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class PipelineCache:
+    """
+    Persistent cache of pipeline outputs, stored in a local SQLite file.
+
+    Entries are keyed on (kind, version, text hash), where version names the model
+    (and its settings) that produced the value, so switching models never serves
+    stale results. The number of entries is bounded; the least recently used
+    entries are evicted first. Hit and miss counts are kept per kind.
+
+    The API process and every ingest worker process open the same file, so it
+    runs in WAL mode (readers never block the writer) and each connection waits
+    up to busy_timeout seconds for the write lock instead of failing with
+    "database is locked".
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 busy_timeout: float = CACHE_BUSY_TIMEOUT):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False)
+        # WAL persists in the file; synchronous=NORMAL is durable enough for a cache.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, kind TEXT NOT NULL, value BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        self._conn.commit()
+        self._hits = {}
+        self._misses = {}
+
+    @staticmethod
+    def _key(kind: str, version: str, text: str) -> str:
+        return f"{kind}:{version}:{content_hash(text)}"
+
+    def get_many(self, kind: str, version: str, texts: list) -> dict:
+        """Return a dict mapping each cached text to its value; missing texts are left out."""
+        keys = {self._key(kind, version, text): text for text in set(texts)}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            # Stay well under SQLite's limit on bound parameters.
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, value in rows:
+                    found[keys[key]] = pickle.loads(value)
+                if rows:
+                    self._conn.execute(
+                        f"UPDATE cache SET last_used = ? WHERE key IN ({placeholders})",
+                        [time.time()] + batch,
+                    )
+            self._conn.commit()
+            self._hits[kind] = self._hits.get(kind, 0) + len(found)
+            self._misses[kind] = self._misses.get(kind, 0) + len(keys) - len(found)
+        return found
+
+    def set_many(self, kind: str, version: str, values: dict) -> None:
+        """Store a dict mapping text -> value, then evict old entries if over the size bound."""
+        if not values:
+            return
+        now = time.time()
+        rows = [
+            (self._key(kind, version, text), kind, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now)
+            for text, value in values.items()
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)", rows)
+            count = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN "
+                    "(SELECT key FROM cache ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def get_or_compute(self, kind: str, version: str, texts: list, compute) -> list:
+        """
+        Return one value per text, calling compute(list_of_texts) -> list_of_values
+        only for the distinct texts that are not cached yet.
+        """
+        if not texts:
+            return []
+        cached = self.get_many(kind, version, texts)
+        missing = [text for text in dict.fromkeys(texts) if text not in cached]
+        if missing:
+            computed = dict(zip(missing, compute(missing)))
+            self.set_many(kind, version, computed)
+            cached.update(computed)
+        return [cached[text] for text in texts]
+
+    def stats(self) -> dict:
+        """Entry count, size bound and per-kind hit/miss counts and hit rates."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            kinds = {}
+            for kind in set(self._hits) | set(self._misses):
+                hits = self._hits.get(kind, 0)
+                misses = self._misses.get(kind, 0)
+                total = hits + misses
+                kinds[kind] = {
+                    "hits": hits,
+                    "misses": misses,
+                    "hit_rate": hits / total if total else 0.0,
+                }
+        return {"entries": entries, "max_entries": self.max_entries, "kinds": kinds}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+            self._conn.commit()
+            self._hits.clear()
+            self._misses.clear()
+
+
+# Shared, process-wide cache used by the ingestion pipeline.
+pipeline_cache = PipelineCache()
@@ -2,9 +2,11 @@
 
 import uuid
 import datetime
-from pymongo import MongoClient
-from config import settings  # Ensure the correct path based on your project structure
-from pipeline import run_pipeline
+from db import get_store
+from pipeline import run_pipeline_many
+from vector_index import vector_index
+from lexical_index import lexical_index
+from metadata_index import metadata_index
 
 # A list of 30 sample, project-relevant Jira ticket texts.
 # In a real scenario, these would be based on actual project incidents.
@@ -42,29 +44,32 @@ SAMPLE_TICKETS = [
 ]
 
 def populate_db_with_pipeline_entries():
-    client = MongoClient(settings.MONGO_URI)
-    db = client[settings.DB_NAME]
-    collection = db[settings.COLLECTION_NAME]
+    store = get_store()
 
     # Optional: clear existing documents
-    collection.delete_many({})
+    store.delete_all()
 
-    all_documents = []
-    # Iterate over 30 sample tickets and process each using the pipeline.
-    for i, ticket_text in enumerate(SAMPLE_TICKETS, start=1):
-        # Here, we invoke the pipeline for each sample ticket.
-        # run_pipeline returns a list of documents (typically one document per raw text).
-        pipeline_output = run_pipeline(ticket_text, source_id=f"MCC-{200+i}")
-        # Extend our master list with documents from this ticket.
-        all_documents.extend(pipeline_output)
+    # Process all 30 sample tickets in one pipeline run so the model stages
+    # share batches instead of paying the setup cost once per ticket.
+    docs = [
+        {"raw_text": ticket_text, "source_id": f"MCC-{200+i}"}
+        for i, ticket_text in enumerate(SAMPLE_TICKETS, start=1)
+    ]
+    results = run_pipeline_many(docs)
+    all_documents = [doc for pipeline_output in results.values() for doc in pipeline_output]
 
     if all_documents:
-        result = collection.insert_many(all_documents)
-        print(f"Inserted {len(result.inserted_ids)} documents into the collection.")
+        inserted = store.insert_many(all_documents)
+        print(f"Inserted {inserted} documents into the collection.")
     else:
         print("No documents were generated by the pipeline.")
 
-    client.close()
+    # The collection was wiped, so rebuild the on-disk search indexes to match it.
+    vector_index.rebuild(all_documents)
+    lexical_index.rebuild(all_documents)
+    metadata_index.rebuild(all_documents)
+
+    store.close()
 
 if __name__ == "__main__":
     populate_db_with_pipeline_entries()
@@ -0,0 +1,96 @@
+# app/query_cache.py
+import time
+import threading
+from collections import OrderedDict
+from config import settings
+
+QUERY_EMBEDDING_CACHE_SIZE = getattr(settings, "QUERY_EMBEDDING_CACHE_SIZE", 4096)
+QUERY_EMBEDDING_CACHE_TTL = getattr(settings, "QUERY_EMBEDDING_CACHE_TTL", 24 * 3600)
+SEARCH_RESULT_CACHE_SIZE = getattr(settings, "SEARCH_RESULT_CACHE_SIZE", 1024)
+SEARCH_RESULT_CACHE_TTL = getattr(settings, "SEARCH_RESULT_CACHE_TTL", 600)
+
+_MISSING = object()
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: lowercased with runs of whitespace collapsed."""
+    return " ".join((query or "").lower().split())
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory LRU cache whose entries also expire ttl seconds after
+    they were stored. Keeps hit and miss counts for stats().
+    """
+
+    def __init__(self, max_entries: int, ttl: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING and (entry[0] is None or entry[0] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._entries[key]
+            self._misses += 1
+            return default
+
+    def set(self, key, value) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Entry count, size bound and hit/miss counts and hit rate."""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / total if total else 0.0,
+            }
+
+
+class CorpusVersion:
+    """
+    Counter bumped on every write to the knowledge units. Cached search results
+    are keyed on it, so an ingest or delete makes all earlier entries unreachable
+    (they then age out of the LRU).
+    """
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+# Shared, process-wide caches used by the search endpoint.
+query_embedding_cache = TTLCache(QUERY_EMBEDDING_CACHE_SIZE, QUERY_EMBEDDING_CACHE_TTL)
+search_result_cache = TTLCache(SEARCH_RESULT_CACHE_SIZE, SEARCH_RESULT_CACHE_TTL)
+corpus_version = CorpusVersion()
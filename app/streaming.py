@@ -0,0 +1,106 @@
+# app/streaming.py
+import queue
+import threading
+import contextvars
+from config import settings
+
+# Items (pages of issues or documents) buffered between two ingestion stages.
+# Together with the page size this bounds how much an ingest holds in memory.
+INGEST_QUEUE_SIZE = getattr(settings, "INGEST_QUEUE_SIZE", 2)
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def run_stages(source, stages: list, ctx, queue_size: int = INGEST_QUEUE_SIZE):
+    """
+    Run an ingest as concurrent stages connected by bounded queues and yield
+    what the last stage returns, in source order.
+
+    source is an iterable of items (e.g. pages fetched from Jira); it is consumed
+    on its own thread as the "fetch" stage. stages is a list of (name, fn): each
+    runs on its own thread and maps every item of the previous stage to the item
+    for the next, timed through ctx.stage(name). So the next page is fetched
+    while the current one is in inference and the previous one is being written.
+    A full queue blocks its producer, so a slow stage holds back the ones
+    before it instead of letting fetched pages pile up in memory.
+
+    An exception in any stage stops the others and is raised here; items the
+    last stage already returned have been fully processed.
+    """
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+
+    def put(q, item) -> bool:
+        # Blocks while the queue is full, but gives up once the run is stopped.
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if stop.is_set():
+                    return _DONE
+
+    def fetch(outbox):
+        try:
+            items = iter(source)
+            while not stop.is_set():
+                with ctx.stage("fetch"):
+                    item = next(items, _DONE)
+                if item is _DONE:
+                    break
+                if not put(outbox, item):
+                    return
+            put(outbox, _DONE)
+        except BaseException as e:
+            put(outbox, _Failure(e))
+
+    def work(name, fn, inbox, outbox):
+        while True:
+            item = get(inbox)
+            if item is _DONE or isinstance(item, _Failure):
+                put(outbox, item)
+                return
+            try:
+                with ctx.stage(name):
+                    result = fn(item)
+            except BaseException as e:
+                put(outbox, _Failure(e))
+                return
+            if not put(outbox, result):
+                return
+
+    # Each thread runs in a copy of the caller's context, so its spans join the job's trace.
+    threads = [threading.Thread(target=contextvars.copy_context().run, args=(fetch, queues[0]),
+                                name="ingest-fetch", daemon=True)]
+    for i, (name, fn) in enumerate(stages):
+        threads.append(threading.Thread(target=contextvars.copy_context().run,
+                                        args=(work, name, fn, queues[i], queues[i + 1]),
+                                        name=f"ingest-{name}", daemon=True))
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        # Wait for in-flight work (e.g. a Mongo write) so nothing runs after we return.
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,302 @@
+# app/telemetry.py
+"""
+Built-in instrumentation: latency and size histograms and counters exposed in
+the Prometheus text format on GET /metrics, optional trace spans for ingest jobs
+and API requests, and leveled, sampled logging.
+
+Metrics live in the process that records them. Pipeline stages of background
+jobs run in worker processes, so the worker returns a snapshot of what it
+recorded and the job merges it into the API process's registry (see job_queue).
+"""
+import time
+import uuid
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from config import settings
+
+LOG_LEVEL = getattr(settings, "LOG_LEVEL", "INFO")
+# Share of DEBUG/INFO records that are emitted; warnings and errors are always kept.
+LOG_SAMPLE_RATE = getattr(settings, "LOG_SAMPLE_RATE", 1.0)
+TRACING_ENABLED = getattr(settings, "TRACING_ENABLED", False)
+# Number of finished traces kept in memory for GET /metrics/traces.
+TRACE_HISTORY = getattr(settings, "TRACE_HISTORY", 200)
+
+# Seconds; spans everything from a FAISS search to a BART pass over a large job.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096)
+
+logger = logging.getLogger(__name__)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.family = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+
+    def observe(self, key: tuple, value: float, count: int = 1) -> None:
+        series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += count
+        series[-2] += value * count
+        series[-1] += count
+
+    def merge(self, key: tuple, other: list) -> None:
+        series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, value in enumerate(other):
+            series[i] += value
+
+    def render(self) -> list:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-2] + [series[-1]]):
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', _format_number(float(bound))),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_number(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    """
+    Monotonic counter per label set. Exposed as <name>_total, which is also the
+    name its HELP and TYPE lines carry in the text format.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.family = f"{name}_total"
+        self.description = description
+        self._series = {}  # label key -> [value]
+
+    def inc(self, key: tuple, amount: float = 1) -> None:
+        series = self._series.setdefault(key, [0])
+        series[0] += amount
+
+    def merge(self, key: tuple, other: list) -> None:
+        self.inc(key, other[0])
+
+    def render(self) -> list:
+        return [f"{self.family}{_format_labels(key)} {_format_number(series[0])}"
+                for key, series in sorted(self._series.items())]
+
+
+class MetricsRegistry:
+    """
+    Thread-safe registry of the named histograms and counters. Metrics are
+    created on first use; observe() and inc() take the labels as keywords.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def histogram(self, name: str, description: str = "", buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, description, buckets)
+            return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Counter(name, description)
+            return metric
+
+    def observe(self, name: str, value: float, description: str = "", buckets: tuple = LATENCY_BUCKETS,
+                count: int = 1, **labels) -> None:
+        """Record value (count times) in the named histogram."""
+        metric = self.histogram(name, description, buckets)
+        with self._lock:
+            metric.observe(_label_key(labels), value, count)
+
+    def inc(self, name: str, amount: float = 1, description: str = "", **labels) -> None:
+        metric = self.counter(name, description)
+        with self._lock:
+            metric.inc(_label_key(labels), amount)
+
+    @contextmanager
+    def timed(self, name: str, description: str = "", **labels):
+        """Observe the duration of the block, in seconds, in the named histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, description, **labels)
+
+    def snapshot(self, reset: bool = False) -> list:
+        """
+        Picklable copy of every series, as (kind, name, description, buckets,
+        label key, values) tuples, optionally resetting them. See merge().
+        """
+        with self._lock:
+            rows = [(metric.kind, metric.name, metric.description, getattr(metric, "buckets", None), key, list(series))
+                    for metric in self._metrics.values() for key, series in metric._series.items()]
+            if reset:
+                for metric in self._metrics.values():
+                    metric._series.clear()
+        return rows
+
+    def merge(self, rows: list) -> None:
+        """Add a snapshot taken in another process (a pipeline worker) to this registry."""
+        for kind, name, description, buckets, key, values in rows or []:
+            if kind == "histogram":
+                metric = self.histogram(name, description, buckets)
+            else:
+                metric = self.counter(name, description)
+            with self._lock:
+                metric.merge(key, values)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            for name in sorted(self._metrics):
+                metric = self._metrics[name]
+                family = metric.family
+                if metric.description:
+                    lines.append(f"# HELP {family} {metric.description}")
+                lines.append(f"# TYPE {family} {metric.kind}")
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Minimal span recorder. A span opened while another one is active in the same
+    thread or task becomes its child; a span without a parent starts a trace,
+    which is kept (with all its spans) once it finishes. Does nothing unless
+    enabled, so call sites need no checks of their own.
+    """
+
+    def __init__(self, enabled: bool = TRACING_ENABLED, history: int = TRACE_HISTORY):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._traces = deque(maxlen=history)
+
+    @contextmanager
+    def span(self, name: str, trace_id: str = None, **attributes):
+        """Record the block as a span named name with the given attributes."""
+        if not self.enabled:
+            yield None
+            return
+        parent = _current_span.get()
+        span = {
+            "trace_id": parent["trace_id"] if parent else (trace_id or uuid.uuid4().hex),
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_id": parent["span_id"] if parent else None,
+            "name": name,
+            "attributes": attributes,
+            "start": time.time(),
+            "duration": None,
+            "status": "ok",
+            "_spans": parent["_spans"] if parent else [],
+        }
+        span["_spans"].append(span)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span["status"] = "error"
+            span["attributes"]["error"] = str(e)
+            raise
+        finally:
+            span["duration"] = round(time.perf_counter() - start, 6)
+            _current_span.reset(token)
+            if parent is None:
+                self._finish(span)
+
+    def _finish(self, root: dict) -> None:
+        spans = [{k: v for k, v in span.items() if k != "_spans"} for span in root["_spans"]]
+        trace = {"trace_id": root["trace_id"], "name": root["name"], "start": root["start"],
+                 "duration": root["duration"], "status": root["status"], "spans": spans}
+        with self._lock:
+            self._traces.append(trace)
+        logger.debug("trace %s %s %.3fs (%d spans)", root["name"], root["trace_id"], root["duration"], len(spans))
+
+    def traces(self, limit: int = 50, name: str = None) -> list:
+        """The most recent finished traces, newest first, optionally by root span name."""
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        if name:
+            traces = [trace for trace in traces if trace["name"] == name]
+        return traces[:limit]
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a rate share of records below WARNING; warnings and errors always pass."""
+
+    def __init__(self, rate: float = LOG_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+def configure_logging(level: str = LOG_LEVEL, sample_rate: float = LOG_SAMPLE_RATE) -> None:
+    """Set the root log level and install the sampling filter on its handlers."""
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    root = logging.getLogger()
+    root.setLevel(level)
+    for handler in root.handlers:
+        if not any(isinstance(f, SamplingFilter) for f in handler.filters):
+            handler.addFilter(SamplingFilter(sample_rate))
+
+
+def record_http_response(connector: str):
+    """
+    requests response hook that records a connector call's latency (until the
+    response headers arrived) by connector and status code.
+    """
+    def hook(response, *args, **kwargs):
+        metrics.observe("connector_request_seconds", response.elapsed.total_seconds(),
+                        "Latency of connector HTTP requests", connector=connector, status=response.status_code)
+        if response.status_code >= 400:
+            logger.warning("%s request failed: %s %s", connector, response.status_code, response.url)
+        else:
+            logger.debug("%s request %s in %.3fs", connector, response.url, response.elapsed.total_seconds())
+        return response
+    return hook
+
+
+# Shared, process-wide registry and tracer.
+metrics = MetricsRegistry()
+tracer = Tracer()
@@ -0,0 +1,193 @@
+# app/tests/conftest.py
+import os
+import re
+import sys
+import types
+import zlib
+import tempfile
+import pytest
+
+# The app uses flat imports (from db import ...), as when run from app/;
+# rag_system.py sits at the repository root.
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.dirname(APP_DIR), APP_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+try:
+    import config  # noqa: F401
+except ImportError:
+    # config.py holds the deployment's credentials and is not committed; the
+    # tests only need placeholders, and keep every file they write out of the tree.
+    _data_dir = tempfile.mkdtemp(prefix="kt-tests-")
+
+    class TestSettings:
+        MONGO_URI = "mongodb://localhost:27017"
+        DB_NAME = "kt_tests"
+        COLLECTION_NAME = "knowledge_units"
+        JIRA_BASE_URL = "https://jira.example.com"
+        JIRA_USERNAME = "tests@example.com"
+        JIRA_API_TOKEN = "token"
+        JQL_QUERY = "project = KT"
+        CONFLUENCE_BASE_URL = "https://confluence.example.com"
+        CONFLUENCE_USER = "tests@example.com"
+        CONFLUENCE_API_TOKEN = "token"
+        SECRET_KEY = "tests"
+        ATLASSIAN_CLIENT_ID = "client"
+        ATLASSIAN_CLIENT_SECRET = "secret"
+        BASE_URL = "http://localhost:8000"
+        PIPELINE_CACHE_PATH = os.path.join(_data_dir, "pipeline_cache.db")
+        FAISS_INDEX_PATH = os.path.join(_data_dir, "faiss_index.bin")
+        LEXICAL_INDEX_PATH = os.path.join(_data_dir, "lexical_index.json")
+        METADATA_INDEX_PATH = os.path.join(_data_dir, "metadata_index.json")
+
+        def dict(self) -> dict:
+            return {name: getattr(self, name) for name in dir(self) if name.isupper()}
+
+    sys.modules["config"] = types.SimpleNamespace(settings=TestSettings())
+
+
+@pytest.fixture
+def store():
+    """A fresh KnowledgeStore on mongomock, with empty search and duplicate indexes."""
+    mongomock = pytest.importorskip("mongomock")
+    from db import init_store, close_store
+    from vector_index import vector_index
+    from lexical_index import lexical_index
+    from metadata_index import metadata_index
+    from dedup_index import duplicate_index
+
+    knowledge_store = init_store(mongomock.MongoClient())
+    for index in (vector_index, lexical_index, metadata_index):
+        index.rebuild([])
+    duplicate_index.load([])
+    yield knowledge_store
+    close_store()
+
+
+class FakeJobContext:
+    """JobContext stand-in whose pipeline returns one unit per document, without models."""
+
+    def __init__(self, fail_on: str = None):
+        self.fail_on = fail_on
+        self.processed = []
+        self.progress = {}
+
+    def stage(self, name: str):
+        from contextlib import nullcontext
+        return nullcontext()
+
+    def update(self, **progress) -> None:
+        self.progress.update(progress)
+
+    def run_pipeline_many(self, docs: list) -> dict:
+        from pipeline_cache import content_hash
+        results = {}
+        for doc in docs:
+            if doc["source_id"] == self.fail_on:
+                raise RuntimeError(f"pipeline failed on {doc['source_id']}")
+            self.processed.append(doc["source_id"])
+            results[doc["source_id"]] = [{
+                "id": f"{doc['source_id']}-unit",
+                "chunk_text": doc["raw_text"],
+                "summary": doc["raw_text"][:40],
+                "timestamp": "2024-01-01T00:00:00Z",
+                "speaker": doc.get("source", "Jira"),
+                "tags": [],
+                "source_audio_id": doc["source_id"],
+                "content_hash": content_hash(doc["raw_text"]),
+            }]
+        return results
+
+
+@pytest.fixture
+def job_context():
+    return FakeJobContext
+
+
+class StubSentences:
+    """spaCy stand-in splitting on sentence-ending punctuation."""
+
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    def _doc(self, text: str):
+        sents = [types.SimpleNamespace(text=sent) for sent in re.split(r"(?<=[.!?])\s+", text) if sent]
+        return types.SimpleNamespace(sents=sents)
+
+    def __call__(self, text: str):
+        return self._doc(text)
+
+    def pipe(self, texts, batch_size: int = None):
+        texts = list(texts)
+        self.calls.append(("spacy", len(texts)))
+        return [self._doc(text) for text in texts]
+
+
+class StubEmbedder:
+    """Bag-of-words embedder: texts sharing words get similar vectors."""
+
+    def __init__(self, calls: list, dim: int = 384):
+        self.calls = calls
+        self.dim = dim
+
+    def encode(self, texts, batch_size: int = None):
+        import numpy as np
+        self.calls.append(("embedder", len(texts)))
+        vectors = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z]+", text.lower()):
+                vectors[row, zlib.crc32(word.encode()) % self.dim] += 1.0
+        return vectors
+
+
+class StubTokenizer:
+    """One token per whitespace-separated word."""
+
+    def __call__(self, text: str, add_special_tokens: bool = True):
+        return {"input_ids": text.split()}
+
+    def decode(self, ids, skip_special_tokens: bool = True) -> str:
+        return " ".join(ids)
+
+
+class StubSummarizer:
+    """Summarizer stand-in recording every input; a summary names its input's first and last word."""
+
+    def __init__(self, calls: list):
+        self.calls = calls
+        self.inputs = []
+        self.tokenizer = StubTokenizer()
+
+    def __call__(self, texts, batch_size: int = None, **kwargs):
+        self.calls.append(("summarizer", len(texts)))
+        self.inputs.append(list(texts))
+        return [{"summary_text": f"summary {text.split()[0]} to {text.split()[-1]}"} for text in texts]
+
+
+class StubNer:
+    def __init__(self, calls: list):
+        self.calls = calls
+
+    def __call__(self, texts, batch_size: int = None):
+        self.calls.append(("ner", len(texts)))
+        return [[{"entity_group": "ORG"}] if "Atlassian" in text else [] for text in texts]
+
+
+@pytest.fixture
+def stub_models(monkeypatch, tmp_path):
+    """
+    Install stub spaCy, embedder, summarizer and NER models in the model registry,
+    with an empty pipeline cache. Model calls are recorded as (model, items) in .calls.
+    """
+    import pipeline
+    from model_registry import model_registry
+    from pipeline_cache import PipelineCache
+
+    calls = []
+    stubs = types.SimpleNamespace(calls=calls, spacy=StubSentences(calls), embedder=StubEmbedder(calls),
+                                  summarizer=StubSummarizer(calls), ner=StubNer(calls))
+    for name in ("spacy", "embedder", "summarizer", "ner"):
+        monkeypatch.setitem(model_registry._models, name, getattr(stubs, name))
+    monkeypatch.setattr(pipeline, "pipeline_cache", PipelineCache(str(tmp_path / "pipeline_cache.db")))
+    return stubs
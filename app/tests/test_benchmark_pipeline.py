@@ -0,0 +1,36 @@
+# app/tests/test_benchmark_pipeline.py
+import argparse
+import pytest
+import pipeline
+import benchmark_pipeline
+from model_registry import model_registry
+from vector_index import vector_index
+from lexical_index import lexical_index
+from metadata_index import metadata_index
+
+
+@pytest.fixture
+def isolated(monkeypatch, store):
+    """Undo the benchmark's process-wide changes: stub models, pipeline cache and index paths."""
+    for attr in ("_loaders", "_info", "_locks"):
+        monkeypatch.setattr(model_registry, attr, dict(getattr(model_registry, attr)))
+    monkeypatch.setattr(model_registry, "_models", {})
+    monkeypatch.setattr(pipeline, "pipeline_cache", pipeline.pipeline_cache)
+    for index, attrs in ((vector_index, ("path", "ids_path")), (lexical_index, ("path",)), (metadata_index, ("path",))):
+        for attr in attrs:
+            monkeypatch.setattr(index, attr, getattr(index, attr))
+
+
+def test_stub_benchmark_reports_every_stage_and_search_mode(isolated):
+    args = argparse.Namespace(jira=6, confluence=2, batch_docs=4, batch_size=4, queries=3, modes="dense,lexical",
+                              stub_models=True, mongo_uri=None, seed=0)
+
+    report = benchmark_pipeline.run_benchmark(args)
+
+    assert set(report["stages"]) == {"preprocess", "sentences", "sentence_embedding", "clustering",
+                                     "summarization", "ner", "chunk_embedding", "pipeline_total"}
+    assert all(stage["items"] == 8 for stage in report["stages"].values())
+    assert report["units"] > 0
+    assert set(report["search"]) == {"dense_uncached", "dense_cached", "lexical_uncached", "lexical_cached"}
+    assert all(timings["items"] == 3 for timings in report["search"].values())
+    assert report["config"]["stub_models"] is True
@@ -0,0 +1,93 @@
+# app/tests/test_chroma_sync.py
+import time
+import pytest
+import chroma_sync
+from chroma_sync import sync_to_chroma
+
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection, recording the ids of every upsert and delete."""
+
+    def __init__(self):
+        self.entries = {}
+        self.upserts = []
+        self.deletes = []
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.upserts.append(list(ids))
+        for doc_id, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+            self.entries[doc_id] = (embedding, document, metadata)
+
+    def delete(self, ids):
+        self.deletes.append(list(ids))
+        for doc_id in ids:
+            self.entries.pop(doc_id, None)
+
+    def get(self, include=None):
+        return {"ids": list(self.entries)}
+
+
+def _unit(unit_id: str, source_id: str, text: str) -> dict:
+    return {"id": unit_id, "chunk_text": text, "summary": text, "tags": ["deploy"], "speaker": "Jira",
+            "timestamp": "2024-05-01T10:00:00.000000Z", "source_audio_id": source_id,
+            "embedding": [1.0, 0.0, 0.5]}
+
+
+@pytest.fixture
+def collection(monkeypatch, store):
+    # Only units written after the previous sync are re-read.
+    monkeypatch.setattr(chroma_sync, "CHROMA_SYNC_OVERLAP_SECONDS", 0)
+    return FakeCollection()
+
+
+def _sync(collection, **kwargs) -> dict:
+    # Keeps the writes of each step apart from the sync mark on millisecond clocks.
+    time.sleep(0.01)
+    result = sync_to_chroma(collection, **kwargs)
+    time.sleep(0.01)
+    return result
+
+
+def test_incremental_sync_applies_only_changes_since_the_last_run(store, collection):
+    store.insert_many([_unit("KT-1-0", "KT-1", "Deploys run nightly."), _unit("KT-2-0", "KT-2", "Rollbacks are manual.")])
+    first = _sync(collection)
+    assert first == {"status": "success", "full": True, "upserted": 2, "deleted": 0}
+
+    store.replace_sources(["KT-1"], [_unit("KT-1-1", "KT-1", "Deploys run hourly.")])
+    store.insert_many([_unit("KT-3-0", "KT-3", "Backups are kept for a week.")])
+    second = _sync(collection)
+
+    assert second == {"status": "success", "full": False, "upserted": 2, "deleted": 1}
+    assert sorted(collection.upserts[-1]) == ["KT-1-1", "KT-3-0"]
+    assert collection.deletes == [["KT-1-0"]]
+    assert sorted(collection.entries) == ["KT-1-1", "KT-2-0", "KT-3-0"]
+    _, document, metadata = collection.entries["KT-1-1"]
+    assert document == "Deploys run hourly."
+    assert metadata == {"source": "Jira", "source_audio_id": "KT-1", "summary": "Deploys run hourly.",
+                        "timestamp": "2024-05-01T10:00:00.000000Z", "tags": "deploy"}
+
+    assert _sync(collection)["upserted"] == 0
+
+
+def test_wiped_collection_falls_back_to_a_full_resync(store, collection):
+    store.insert_many([_unit("KT-1-0", "KT-1", "Deploys run nightly."), _unit("KT-2-0", "KT-2", "Rollbacks are manual.")])
+    _sync(collection)
+
+    store.delete_all()
+    store.insert_many([_unit("KT-3-0", "KT-3", "Backups are kept for a week.")])
+    result = _sync(collection)
+
+    # delete_all records no per-unit deletions; only a full sync can find the stale entries.
+    assert result == {"status": "success", "full": True, "upserted": 1, "deleted": 2}
+    assert sorted(collection.entries) == ["KT-3-0"]
+
+
+def test_full_sync_can_be_forced(store, collection):
+    store.insert_many([_unit("KT-1-0", "KT-1", "Deploys run nightly.")])
+    _sync(collection)
+    collection.entries["orphan"] = ([0.0, 1.0, 0.0], "Left over", {})
+
+    result = _sync(collection, full=True)
+
+    assert result == {"status": "success", "full": True, "upserted": 1, "deleted": 1}
+    assert sorted(collection.entries) == ["KT-1-0"]
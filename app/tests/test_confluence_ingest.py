@@ -0,0 +1,91 @@
+# app/tests/test_confluence_ingest.py
+import pytest
+from urllib.parse import urlparse, parse_qs
+from connectors import documentation
+from endpoints import ingest_confluence
+
+
+def _page(page_id: str, version: int, text: str) -> dict:
+    return {"id": page_id, "title": f"Page {page_id}", "text": text, "version": version}
+
+
+def _ingest(monkeypatch, ctx, pages: list) -> dict:
+    monkeypatch.setattr(ingest_confluence, "iter_confluence_pages", lambda space_key, limit: iter([pages]))
+    return ingest_confluence.ingest_confluence_space(ctx, "KT", None)
+
+
+def test_new_version_with_same_text_records_version_without_reprocessing(monkeypatch, store, job_context):
+    text = "Deployment runbook for the inventory service, covering rollbacks and alerts."
+    _ingest(monkeypatch, job_context(), [_page("100", 1, text), _page("200", 1, "The on-call rota and escalation.")])
+
+    ctx = job_context()
+    result = _ingest(monkeypatch, ctx, [_page("100", 2, text), _page("200", 1, "The on-call rota and escalation.")])
+
+    assert ctx.processed == []
+    assert result["pages_found"] == 2
+    assert result["skipped_unchanged"] == 2
+    assert result["pages_ingested"] == 0
+    assert store.source_versions(["100", "200"]) == {"100": 2, "200": 1}
+
+    # The recorded version now skips the page before its text is even compared.
+    ctx = job_context()
+    result = _ingest(monkeypatch, ctx, [_page("100", 2, text)])
+    assert ctx.processed == [] and result["skipped_unchanged"] == 1
+
+
+def test_new_version_with_new_text_is_reprocessed(monkeypatch, store, job_context):
+    _ingest(monkeypatch, job_context(), [_page("100", 1, "Deployment runbook, first draft.")])
+
+    ctx = job_context()
+    result = _ingest(monkeypatch, ctx, [_page("100", 2, "Deployment runbook, rewritten for the new cluster.")])
+
+    assert ctx.processed == ["100"]
+    assert result["pages_ingested"] == 1 and result["skipped_unchanged"] == 0
+    assert store.source_versions(["100"]) == {"100": 2}
+
+
+class CursorSearch:
+    """
+    Confluence Cloud content/search stand-in: pages with an opaque cursor in
+    '_links.next' and ignores 'start', serving the first page without a cursor.
+    """
+
+    def __init__(self, count: int, page_size: int):
+        self.pages = [{"id": str(100 + i), "title": f"Page {i}", "version": {"number": 1},
+                       "body": {"export_view": {"value": f"Text of page {i}"}}} for i in range(count)]
+        self.page_size = page_size
+        self.urls = []
+
+    def get(self, url, params=None):
+        self.urls.append(url)
+        if len(self.urls) > 20:
+            raise AssertionError("the search never ended")
+        query = parse_qs(urlparse(url).query)
+        offset = int(query["cursor"][0][1:]) if "cursor" in query else 0
+        results = self.pages[offset:offset + self.page_size]
+        links = {"base": "https://example.atlassian.net/wiki"}
+        if offset + self.page_size < len(self.pages):
+            links["next"] = f"/rest/api/content/search?cql=space&limit={self.page_size}&cursor=c{offset + self.page_size}"
+        return CursorResponse({"results": results, "_links": links})
+
+
+class CursorResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    def json(self) -> dict:
+        return self._data
+
+
+@pytest.mark.parametrize("limit, expected", [(None, 7), (5, 5)])
+def test_search_follows_the_cursor_in_next_links(monkeypatch, limit, expected):
+    search = CursorSearch(7, page_size=3)
+    monkeypatch.setattr(documentation, "_session", search)
+
+    pages = [page for batch in documentation.iter_confluence_pages("KT", limit, page_size=3) for page in batch]
+
+    assert [page["id"] for page in pages] == [str(100 + i) for i in range(expected)]
+    assert all(url.startswith("https://example.atlassian.net/wiki/rest/api/content/search") for url in search.urls[1:])
@@ -0,0 +1,51 @@
+# app/tests/test_db.py
+import pytest
+
+
+def _unit(unit_id: str, source_id: str, text: str = "text") -> dict:
+    return {"id": unit_id, "source_audio_id": source_id, "chunk_text": text, "embedding": [0.1, 0.2]}
+
+
+def _stored(store) -> dict:
+    return {doc["id"]: doc["chunk_text"] for doc in store.collection.find({}, {"_id": 0, "id": 1, "chunk_text": 1})}
+
+
+def test_replace_sources_swaps_units_and_records_removed_ids(store):
+    store.upsert_many([_unit("a1", "KT-1"), _unit("a2", "KT-1"), _unit("b1", "KT-2")])
+
+    old_ids = store.replace_sources(["KT-1"], [_unit("a2", "KT-1", "edited"), _unit("a3", "KT-1")])
+
+    assert sorted(old_ids) == ["a1", "a2"]
+    assert _stored(store) == {"a2": "edited", "a3": "text", "b1": "text"}
+    assert [doc["id"] for doc in store.deleted_units.find()] == ["a1"]
+
+
+def test_failed_write_keeps_the_old_units(store, monkeypatch):
+    store.upsert_many([_unit("a1", "KT-1"), _unit("a2", "KT-1")])
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("connection reset")
+    monkeypatch.setattr(store.collection, "bulk_write", fail)
+
+    with pytest.raises(RuntimeError):
+        store.replace_sources(["KT-1"], [_unit("a3", "KT-1")])
+    assert _stored(store) == {"a1": "text", "a2": "text"}
+
+
+def test_unit_ids_are_unique(store):
+    from pymongo.errors import DuplicateKeyError
+    store.collection.insert_one(_unit("a1", "KT-1"))
+
+    with pytest.raises(DuplicateKeyError):
+        store.collection.insert_one(_unit("a1", "KT-2"))
+    # Units without an id (legacy data) are not constrained.
+    store.collection.insert_many([{"chunk_text": "legacy"}, {"chunk_text": "legacy"}])
+
+
+def test_plain_id_index_is_rebuilt_as_unique(store):
+    store.collection.drop_index("id")
+    store.collection.create_index("id", name="id")
+
+    store.ensure_indexes()
+
+    assert store.collection.index_information()["id"].get("unique")
@@ -0,0 +1,81 @@
+# app/tests/test_dedup_ingest.py
+from endpoints.ingest import prepare_batch, infer_batch, store_batch, delete_from_mongo
+from dedup_index import duplicate_index
+from telemetry import metrics
+
+RELEASE = "Release checklist: freeze the branch, run the smoke tests and tag the build."
+ROLLBACK = "Rollback steps: revert the deploy, restore the snapshot and page the on-call engineer."
+
+
+def _ingest(job_context, docs: list) -> dict:
+    return store_batch(infer_batch(job_context(), prepare_batch(docs)))
+
+
+def _doc(source_id: str, text: str) -> dict:
+    return {"source_id": source_id, "raw_text": text}
+
+
+def _duplicates_counted() -> list:
+    return [row for row in metrics.snapshot() if row[1] == "ingest_duplicates"]
+
+
+def _duplicate_sources(store, source_id: str) -> set:
+    units = store.collection.find({"source_audio_id": source_id})
+    return {dup for unit in units for dup in unit.get("duplicate_sources", [])}
+
+
+def test_unchanged_duplicates_are_skipped_on_resync(store, job_context):
+    docs = [_doc("KT-1", RELEASE), _doc("KT-2", RELEASE)]
+    first = _ingest(job_context, docs)
+    assert list(first["duplicates"]) == ["KT-2"]
+
+    counted = _duplicates_counted()
+    second = _ingest(job_context, docs)
+
+    assert second["skipped_unchanged"] == 2
+    assert second["examined"] == 0 and not second["duplicates"]
+    assert _duplicates_counted() == counted
+    assert _duplicate_sources(store, "KT-1") == {"KT-2"}
+
+
+def test_demoted_canonical_hands_its_duplicates_over(store, job_context):
+    _ingest(job_context, [_doc("KT-1", RELEASE), _doc("KT-2", RELEASE), _doc("KT-3", ROLLBACK)])
+    assert _duplicate_sources(store, "KT-1") == {"KT-2"}
+
+    # KT-1 is rewritten into a copy of KT-3: KT-2 must follow it there.
+    counts = _ingest(job_context, [_doc("KT-1", ROLLBACK)])
+
+    assert counts["duplicates"]["KT-1"][0] == "KT-3"
+    assert store.collection.count_documents({"source_audio_id": "KT-1"}) == 0
+    assert _duplicate_sources(store, "KT-3") == {"KT-1", "KT-2"}
+    assert store.duplicates_of(["KT-3"]) == {"KT-1": "KT-3", "KT-2": "KT-3"}
+    assert not store.duplicates_of(["KT-1"])
+    assert duplicate_index.ntotal == 1
+
+
+def test_deleting_a_canonical_promotes_its_first_duplicate(store, job_context):
+    _ingest(job_context, [_doc("KT-1", RELEASE), _doc("KT-2", RELEASE), _doc("KT-4", RELEASE)])
+    doc_ids = store.ids_for_sources(["KT-1"])
+
+    assert delete_from_mongo("KT-1") == 0
+
+    assert store.ids_for_sources(["KT-2"]) == doc_ids
+    assert store.duplicates_of(["KT-2"]) == {"KT-4": "KT-2"}
+    assert not store.duplicates_of(["KT-1"])
+    assert _duplicate_sources(store, "KT-2") == {"KT-4"}
+    assert duplicate_index.ntotal == 1
+
+    # New copies of the text now match the promoted source.
+    counts = _ingest(job_context, [_doc("KT-5", RELEASE)])
+    assert counts["duplicates"]["KT-5"][0] == "KT-2"
+    assert _duplicate_sources(store, "KT-2") == {"KT-4", "KT-5"}
+
+
+def test_deleting_a_source_without_duplicates_removes_its_units(store, job_context):
+    _ingest(job_context, [_doc("KT-1", RELEASE), _doc("KT-3", ROLLBACK)])
+
+    assert delete_from_mongo("KT-1") > 0
+
+    assert not store.ids_for_sources(["KT-1"])
+    assert store.fingerprints.count_documents({"source_id": "KT-1"}) == 0
+    assert duplicate_index.ntotal == 1
@@ -0,0 +1,79 @@
+# app/tests/test_embedding_codec.py
+import struct
+import numpy as np
+import pytest
+from embedding_codec import encode_embedding, decode_embedding, decode_embeddings, encode_unit, embedding_dtype
+
+
+def _vector(dim: int = 384, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=dim).astype("float32")
+
+
+@pytest.mark.parametrize("dtype, code, itemsize, tolerance", [
+    ("float32", 1, 4, 0.0),
+    ("float16", 2, 2, 1e-2),
+    ("int8", 3, 1, None),
+])
+def test_round_trip_per_dtype(dtype, code, itemsize, tolerance):
+    vector = _vector()
+    encoded = encode_embedding(vector, dtype)
+
+    header = 4 + (4 if dtype == "int8" else 0)
+    assert encoded[0] == code and bytes(encoded[1:4]) == b"\0\0\0"
+    assert len(encoded) == header + vector.size * itemsize
+
+    decoded = decode_embedding(encoded)
+    assert decoded.dtype == np.float32 and decoded.shape == vector.shape
+    if tolerance is None:
+        # Symmetric quantization: off by at most half a step of max|v| / 127.
+        tolerance = np.abs(vector).max() / 127 / 2 + 1e-6
+    assert np.abs(decoded - vector).max() <= tolerance
+
+
+def test_int8_stores_the_scale_and_keeps_the_extremes():
+    vector = np.array([0.5, -2.54, 1.27, 0.0], dtype="float32")
+    encoded = encode_embedding(vector, "int8")
+
+    scale = struct.unpack_from("<f", encoded, 4)[0]
+    assert scale == pytest.approx(2.54 / 127)
+    assert np.frombuffer(encoded, dtype="int8", offset=8).tolist() == [25, -127, 64, 0]
+    assert decode_embedding(encoded)[1] == pytest.approx(-2.54)
+
+
+def test_int8_zero_vector_decodes_to_zeros():
+    assert not decode_embedding(encode_embedding(np.zeros(8), "int8")).any()
+
+
+def test_legacy_lists_and_bad_input():
+    assert decode_embedding([0.25, -1.0]).tolist() == [0.25, -1.0]
+    with pytest.raises(ValueError):
+        encode_embedding([1.0], "bfloat16")
+    with pytest.raises(ValueError):
+        decode_embedding(bytes([9, 0, 0, 0]) + b"\0" * 8)
+
+
+def test_decode_embeddings_stacks_mixed_formats():
+    vectors = [_vector(16, seed) for seed in range(3)]
+    stored = [encode_embedding(vectors[0], "float32"), encode_embedding(vectors[1], "float16"), vectors[2].tolist()]
+
+    matrix = decode_embeddings(stored)
+
+    assert matrix.shape == (3, 16)
+    assert np.allclose(matrix, np.vstack(vectors), atol=1e-2)
+    assert decode_embeddings([]).shape == (0, 0)
+
+
+def test_encode_unit_leaves_the_input_and_encoded_values_alone():
+    unit = {"id": "u1", "embedding": [0.1, 0.2]}
+    encoded = encode_unit(unit, "float16")
+
+    assert unit["embedding"] == [0.1, 0.2]
+    assert isinstance(encoded["embedding"], bytes) and encoded["embedding"][0] == 2
+    assert encode_unit(encoded, "int8")["embedding"] == encoded["embedding"]
+    assert encode_unit({"id": "u2"}) == {"id": "u2"}
+
+
+def test_embedding_dtype_reads_the_header():
+    assert [embedding_dtype(encode_embedding([1.0], dtype)) for dtype in ("float32", "float16", "int8")] == \
+        ["float32", "float16", "int8"]
+    assert embedding_dtype([1.0]) is None
@@ -0,0 +1,78 @@
+# app/tests/test_inference_backends.py
+import types
+import numpy as np
+import pytest
+import inference_backends
+from inference_backends import backend_for, version_suffix, OnnxSentenceEmbedder, _parse_backends, _onnx_file
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    def configure(default: str, overrides: str = None):
+        monkeypatch.setattr(inference_backends, "INFERENCE_BACKEND", default)
+        monkeypatch.setattr(inference_backends, "INFERENCE_BACKENDS", _parse_backends(overrides))
+    return configure
+
+
+def test_per_model_overrides_take_precedence_over_the_default(configure):
+    configure("torch_int8", "summarizer=onnx_int8, ner = onnx,bogus")
+
+    assert backend_for("embedder") == "torch_int8"
+    assert backend_for("summarizer") == "onnx_int8"
+    assert backend_for("ner") == "onnx"
+    # Models without alternative backends always run on torch.
+    assert backend_for("spacy") == "torch" and backend_for("whisper") == "torch"
+
+
+def test_cache_versions_differ_per_backend(configure):
+    configure("torch", "ner=onnx_int8")
+
+    assert version_suffix("embedder") == ""
+    assert version_suffix("ner") == "@onnx_int8"
+    assert version_suffix("ner", "torch") == ""
+
+
+def test_unknown_backends_are_rejected(configure):
+    configure("torch", "embedder=tensorrt")
+
+    with pytest.raises(ValueError, match="tensorrt"):
+        backend_for("embedder")
+
+
+def test_quantized_graphs_are_used_when_present(tmp_path):
+    (tmp_path / "model.onnx").touch()
+    (tmp_path / "encoder_model.onnx").touch()
+    (tmp_path / "encoder_model_quantized.onnx").touch()
+
+    assert _onnx_file(str(tmp_path), "encoder_model", quantize=True) == "encoder_model_quantized.onnx"
+    assert _onnx_file(str(tmp_path), "encoder_model", quantize=False) == "encoder_model.onnx"
+    assert _onnx_file(str(tmp_path), "model", quantize=True) is None
+    assert _onnx_file(str(tmp_path), "decoder_model", quantize=False) is None
+
+
+class FakeTokenizer:
+    """One token per word, padded to the longest sentence of the batch."""
+
+    def __call__(self, sentences, padding=True, truncation=True, max_length=None, return_tensors="np"):
+        lengths = [min(len(sentence.split()), max_length) for sentence in sentences]
+        width = max(lengths)
+        mask = np.array([[1] * n + [0] * (width - n) for n in lengths])
+        return {"input_ids": mask.copy(), "attention_mask": mask}
+
+
+def test_onnx_embedder_mean_pools_unpadded_tokens_and_normalizes():
+    def model(input_ids, attention_mask):
+        # Token i of every sentence gets the hidden state [i + 1, 1]; padding gets a large value.
+        width = input_ids.shape[1]
+        hidden = np.stack([np.arange(1, width + 1), np.ones(width)], axis=-1)[None].repeat(len(input_ids), 0)
+        hidden[attention_mask == 0] = 100.0
+        return types.SimpleNamespace(last_hidden_state=hidden)
+
+    embedder = OnnxSentenceEmbedder(model, FakeTokenizer(), max_seq_length=3)
+    embeddings = embedder.encode(["a b c d", "a", "a b"], batch_size=2)
+
+    expected = np.array([[2.0, 1.0], [1.0, 1.0], [1.5, 1.0]])
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert embeddings.dtype == np.float32
+    np.testing.assert_allclose(embeddings, expected, rtol=1e-6)
+    np.testing.assert_allclose(embedder.encode("a b"), expected[2], rtol=1e-6)
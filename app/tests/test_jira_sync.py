@@ -0,0 +1,133 @@
+# app/tests/test_jira_sync.py
+import re
+import datetime
+import pytest
+from connectors import jira
+from connectors.jira import format_jira_datetime, parse_jira_datetime, issue_position
+
+
+class FakeJira:
+    """
+    In-memory Jira search endpoint honouring the JQL build_jql produces
+    ('updated >= -Nm' and 'ORDER BY updated ASC, key ASC') with startAt paging.
+    on_page(page_number) runs before each response, to change issues mid-sync.
+    """
+
+    def __init__(self, issues: list, on_page=None):
+        self.issues = {issue["key"]: issue for issue in issues}
+        self.on_page = on_page
+        self.requests = []
+
+    def update(self, key: str, when: datetime.datetime) -> None:
+        self.issues[key]["fields"]["updated"] = format_jira_datetime(when)
+
+    def get(self, url, params=None):
+        if self.on_page is not None:
+            self.on_page(len(self.requests))
+        self.requests.append(dict(params))
+        matching = list(self.issues.values())
+        bound = re.search(r"updated >= -(\d+)m", params["jql"])
+        if bound:
+            since = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=int(bound.group(1)))
+            matching = [issue for issue in matching if parse_jira_datetime(issue["fields"]["updated"]) >= since]
+        matching.sort(key=issue_position)
+        page = matching[params["startAt"]:params["startAt"] + params["maxResults"]]
+        return FakeResponse({"issues": [_copy(issue) for issue in page], "total": len(matching)})
+
+
+class FakeResponse:
+    status_code = 200
+    text = ""
+
+    def __init__(self, data: dict):
+        self._data = data
+
+    def json(self) -> dict:
+        return self._data
+
+
+def _copy(issue: dict) -> dict:
+    return {"key": issue["key"], "fields": dict(issue["fields"])}
+
+
+def _issues(count: int, start: datetime.datetime) -> list:
+    return [{"key": f"KT-{i + 1}",
+             "fields": {"summary": f"Issue {i + 1}", "description": f"Details of issue number {i + 1}",
+                        "updated": format_jira_datetime(start + datetime.timedelta(minutes=i))}}
+            for i in range(count)]
+
+
+@pytest.fixture
+def now():
+    return datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+
+def test_issue_updated_mid_sync_does_not_skip_others(monkeypatch, now):
+    fake = FakeJira(_issues(9, now - datetime.timedelta(minutes=30)))
+    # After the first page, an issue of that page is edited and moves to the end
+    # of the result set; with startAt offsets KT-4 would slide into the served slots.
+    fake.on_page = lambda page: fake.update("KT-2", now) if page == 1 else None
+    monkeypatch.setattr(jira, "_session", fake)
+
+    pages = list(jira.iter_jira_issues("project = KT", page_size=3))
+
+    seen = [issue["key"] for page in pages for issue in page]
+    assert set(seen) == {f"KT-{i}" for i in range(1, 10)}
+    # The edited issue comes again, with its new timestamp, after the others.
+    assert seen.count("KT-2") == 2 and seen[-1] == "KT-2"
+    assert all(request["jql"].endswith("ORDER BY updated ASC, key ASC") for request in fake.requests)
+
+
+def test_pages_within_one_minute_fall_back_to_offsets(monkeypatch, now):
+    # More issues share the overlap window than fit on a page.
+    issues = _issues(7, now - datetime.timedelta(minutes=10))
+    for issue in issues:
+        issue["fields"]["updated"] = format_jira_datetime(now - datetime.timedelta(minutes=10))
+    monkeypatch.setattr(jira, "_session", FakeJira(issues))
+
+    seen = [issue["key"] for page in jira.iter_jira_issues("project = KT", page_size=2) for issue in page]
+
+    assert seen == [f"KT-{i}" for i in range(1, 8)]
+
+
+def test_sync_mark_stays_behind_the_sync_start(monkeypatch, store, job_context, now):
+    from endpoints import ingest
+    fake = FakeJira(_issues(3, now - datetime.timedelta(minutes=5)))
+    fake.update("KT-3", now)
+    monkeypatch.setattr(jira, "_session", fake)
+    monkeypatch.setattr(ingest, "iter_jira_issues", jira.iter_jira_issues)
+
+    started = datetime.datetime.now(datetime.timezone.utc)
+    result = ingest.sync_jira(job_context())
+    finished = datetime.datetime.now(datetime.timezone.utc)
+
+    mark = parse_jira_datetime(store.get_sync_mark(f"jira:{ingest.settings.JQL_QUERY}"))
+    assert result["updated_issues"] == 3
+    # KT-3 was updated "now": the mark is held a minute before the sync started.
+    minute = datetime.timedelta(minutes=1)
+    assert started - minute - datetime.timedelta(milliseconds=1) <= mark <= finished - minute
+
+
+def test_failed_stage_keeps_the_mark_and_drops_reservations(monkeypatch, store, job_context, now):
+    from endpoints import ingest
+    from dedup_index import duplicate_index
+    issues = _issues(6, now - datetime.timedelta(minutes=30))
+    monkeypatch.setattr(jira, "_session", FakeJira(issues))
+    monkeypatch.setattr(ingest, "iter_jira_issues", lambda jql, updated_since=None:
+                        jira.iter_jira_issues(jql, updated_since=updated_since, page_size=2))
+    mark_key = f"jira:{ingest.settings.JQL_QUERY}"
+
+    # The pipeline stage fails on the second page, while later pages may already be prepared.
+    with pytest.raises(RuntimeError):
+        ingest.sync_jira(job_context(fail_on="KT-4"))
+
+    assert store.get_sync_mark(mark_key) == issues[1]["fields"]["updated"]
+    stored = {record["source_id"] for record in store.iter_fingerprints()}
+    assert stored == {"KT-1", "KT-2"}
+    assert duplicate_index.ntotal == len(stored)
+
+    result = ingest.sync_jira(job_context(), incremental=True)
+
+    assert result["updated_issues"] == 4
+    assert result["duplicates_exact"] == result["duplicates_near"] == 0
+    assert store.get_sync_mark(mark_key) == issues[-1]["fields"]["updated"]
@@ -0,0 +1,54 @@
+# app/tests/test_job_queue.py
+import time
+import pytest
+from job_queue import JobManager
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_active=1, ttl=60, max_events=5)
+    yield manager
+    manager.shutdown()
+
+
+def _wait(manager: JobManager, job_id: str) -> dict:
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def _report_pages(ctx, pages: int) -> dict:
+    for page in range(pages):
+        ctx.update(fetched=page + 1)
+    return {"status": "success"}
+
+
+def test_events_are_capped_without_shifting_the_stream(manager):
+    job_id = manager.submit("pages", _report_pages, 20)
+    job = _wait(manager, job_id)
+
+    # queued, running, 20 progress events and succeeded.
+    assert job["events_dropped"] == 18
+    events, cursor, finished = manager.events_since(job_id, 0)
+    assert finished and cursor == 23 and len(events) == 5
+    assert events[-1]["status"] == "succeeded"
+    assert [event["fetched"] for event in events[:-1]] == [17, 18, 19, 20]
+
+    assert manager.events_since(job_id, 21) == (events[-2:], 23, True)
+    assert manager.events_since(job_id, 23) == ([], 23, True)
+
+
+def test_finished_jobs_expire_after_the_ttl(manager):
+    done = manager.submit("pages", _report_pages, 1)
+    _wait(manager, done)
+    recent = manager.submit("pages", _report_pages, 1)
+    _wait(manager, recent)
+
+    manager._jobs[done]["finished_at"] -= 120
+
+    assert [job["id"] for job in manager.list()] == [recent]
+    assert manager.get(done) is None
@@ -0,0 +1,65 @@
+# app/tests/test_lexical_index.py
+import math
+from collections import Counter
+import pytest
+from lexical_index import LexicalIndex, tokenize
+
+CORPUS = [
+    "MCC-209 login fails with a 500 error on /api/login",
+    "Deploy the inventory service; the deploy pipeline runs nightly",
+    "The login page times out for the service account",
+    "Rotate the API keys of the billing service",
+    "The service health check of the inventory service",
+    "Login audit log rotation for the service",
+    "Nightly backup of the billing database",
+]
+
+
+def _units():
+    return [{"id": f"u{i}", "chunk_text": text, "summary": ""} for i, text in enumerate(CORPUS)]
+
+
+def _reference_bm25(query: str, k1: float = 1.2, b: float = 0.75) -> dict:
+    """Textbook BM25 over every unit, term by term."""
+    docs = {f"u{i}": Counter(tokenize(f"{text} ")) for i, text in enumerate(CORPUS)}
+    avg_len = sum(sum(terms.values()) for terms in docs.values()) / len(docs)
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for terms in docs.values() if term in terms)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for doc_id, terms in docs.items():
+            tf = terms.get(term)
+            if tf:
+                norm = k1 * (1 - b + b * sum(terms.values()) / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return scores
+
+
+@pytest.mark.parametrize("query", ["the service", "login service", "MCC-209 service", "inventory deploy nightly"])
+def test_search_matches_reference_bm25(tmp_path, query):
+    index = LexicalIndex(path=str(tmp_path / "lexical.json"))
+    index.rebuild(_units())
+
+    doc_ids, scores = index.search(query, top_k=len(CORPUS))
+
+    expected = _reference_bm25(query)
+    assert dict(zip(doc_ids, scores)) == pytest.approx(expected)
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_common_term_pruning_is_opt_in_and_approximate(tmp_path):
+    exact = LexicalIndex(path=str(tmp_path / "exact.json"))
+    pruned = LexicalIndex(path=str(tmp_path / "pruned.json"), prune_common_terms=True)
+    exact.rebuild(_units())
+    pruned.rebuild(_units())
+
+    # "service" is in most units; with pruning only the unit matching the rare
+    # identifier is scored, while exact BM25 also ranks those matching "service" alone.
+    exact_ids, _ = exact.search("MCC-209 service", top_k=len(CORPUS))
+    pruned_ids, _ = pruned.search("MCC-209 service", top_k=len(CORPUS))
+
+    assert exact_ids[0] == pruned_ids[0] == "u0"
+    assert pruned_ids == ["u0"]
+    assert len(exact_ids) > 1
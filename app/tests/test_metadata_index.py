@@ -0,0 +1,35 @@
+# app/tests/test_metadata_index.py
+from metadata_index import MetadataIndex, normalize_timestamp
+
+
+def _unit(doc_id: str, timestamp: str, **fields) -> dict:
+    return {"id": doc_id, "timestamp": timestamp, "speaker": "Jira", "tags": [], **fields}
+
+
+def _index(tmp_path) -> MetadataIndex:
+    index = MetadataIndex(path=str(tmp_path / "metadata.json"))
+    index.rebuild([
+        _unit("a", "2024-04-30T23:59:59.999999Z"),
+        _unit("b", "2024-05-01T00:00:00.000000Z"),
+        _unit("c", "2024-05-01T17:45:12.345678Z", tags=["billing"]),
+        _unit("d", "2024-05-02T00:00:00.000001Z"),
+    ])
+    return index
+
+
+def test_date_only_until_includes_the_whole_day(tmp_path):
+    index = _index(tmp_path)
+
+    until = normalize_timestamp("2024-05-01", end_of_day=True)
+    since = normalize_timestamp("2024-05-01")
+
+    assert index.select(until=until) == {"a", "b", "c"}
+    assert index.select(since=since, until=until) == {"b", "c"}
+    assert index.select(since=since, until=until, tags=["billing"]) == {"c"}
+
+
+def test_stored_timestamps_without_microseconds_still_sort_correctly(tmp_path):
+    index = MetadataIndex(path=str(tmp_path / "metadata.json"))
+    index.rebuild([_unit("x", "2024-05-01T12:00:00Z"), _unit("y", "2024-05-01T12:00:00.500000Z")])
+
+    assert index.select(until=normalize_timestamp("2024-05-01T12:00:00.25")) == {"x"}
@@ -0,0 +1,49 @@
+# app/tests/test_metrics.py
+from telemetry import MetricsRegistry
+from endpoints import metrics as metrics_endpoint
+
+
+def _client():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    app = FastAPI()
+    app.include_router(metrics_endpoint.router, prefix="")
+    return TestClient(app)
+
+
+def _families(text: str) -> dict:
+    """{family: (type, [sample names])} of a text exposition, checking every sample belongs to a family."""
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            current = families[name] = (kind, [])
+        elif line.startswith("# HELP "):
+            assert line.split()[2] not in families, line
+        elif line:
+            assert current is not None, line
+            current[1].append(line.split("{")[0].split()[0])
+    return families
+
+
+def test_metrics_text_declares_each_sample_under_its_family(monkeypatch):
+    registry = MetricsRegistry()
+    registry.inc("pipeline_documents", 4, "Documents run through the pipeline", stage="embed")
+    registry.inc("pipeline_documents", 2, "Documents run through the pipeline", stage="ner")
+    registry.observe("search_seconds", 0.02, "Search latency", mode="dense")
+    monkeypatch.setattr(metrics_endpoint, "metrics", registry)
+
+    response = _client().get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert "# HELP pipeline_documents_total Documents run through the pipeline" in text
+    assert 'pipeline_documents_total{stage="embed"} 4' in text
+    families = _families(text)
+    assert families["pipeline_documents_total"] == ("counter", ["pipeline_documents_total"] * 2)
+    kind, samples = families["search_seconds"]
+    assert kind == "histogram"
+    assert set(samples) == {"search_seconds_bucket", "search_seconds_sum", "search_seconds_count"}
+    assert families["faiss_index_vectors"][0] == "gauge"
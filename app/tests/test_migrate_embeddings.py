@@ -0,0 +1,54 @@
+# app/tests/test_migrate_embeddings.py
+import numpy as np
+from embedding_codec import encode_embedding, decode_embedding
+from migrate_embeddings import migrate_embeddings
+
+
+def _insert(store, count: int, start: int = 0, encode: str = None) -> list:
+    vectors = [np.random.default_rng(i).normal(size=8).astype("float32") for i in range(start, start + count)]
+    store.collection.insert_many([
+        {"id": f"u{start + i}", "embedding": encode_embedding(v, encode) if encode else v.tolist()}
+        for i, v in enumerate(vectors)
+    ])
+    return vectors
+
+
+def _embeddings(store) -> dict:
+    return {doc["id"]: doc["embedding"] for doc in store.collection.find({}, {"id": 1, "embedding": 1})}
+
+
+def test_dry_run_counts_without_writing(store):
+    _insert(store, 5)
+    before = _embeddings(store)
+
+    assert migrate_embeddings("float16", batch_size=2, dry_run=True) == 5
+    assert _embeddings(store) == before
+
+
+def test_converts_arrays_in_batches_and_is_resumable(store):
+    vectors = _insert(store, 5)
+    _insert(store, 2, start=5, encode="float32")
+
+    assert migrate_embeddings("float16", batch_size=2) == 5
+
+    stored = _embeddings(store)
+    assert all(isinstance(value, bytes) for value in stored.values())
+    assert [stored[f"u{i}"][0] for i in range(7)] == [2] * 5 + [1] * 2
+    for i, vector in enumerate(vectors):
+        assert np.allclose(decode_embedding(stored[f"u{i}"]), vector, atol=1e-2)
+    # Nothing is left as an array, so a re-run converts nothing.
+    assert migrate_embeddings("float16", batch_size=2) == 0
+
+
+def test_reencode_converts_binary_of_another_dtype(store):
+    vectors = _insert(store, 3, encode="float32")
+    _insert(store, 1, start=3, encode="int8")
+
+    assert migrate_embeddings("int8", reencode=True, dry_run=True) == 3
+    assert migrate_embeddings("int8", reencode=True) == 3
+
+    stored = _embeddings(store)
+    assert all(value[0] == 3 for value in stored.values())
+    for i, vector in enumerate(vectors):
+        assert np.abs(decode_embedding(stored[f"u{i}"]) - vector).max() <= np.abs(vector).max() / 127
+    assert migrate_embeddings("int8", reencode=True) == 0
@@ -0,0 +1,69 @@
+# app/tests/test_model_registry.py
+import threading
+import time
+import pytest
+from model_registry import ModelRegistry, LazyModel
+
+
+class Loader:
+    """Loader counting its calls; each call returns a new model object."""
+
+    def __init__(self, delay: float = 0.0, error: str = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise OSError(self.error)
+        return lambda text: text.upper()
+
+
+def test_models_load_on_first_use_only_once():
+    loader = Loader(delay=0.05)
+    registry = ModelRegistry()
+    registry.register("embedder", loader)
+    model = LazyModel(registry, "embedder")
+    assert loader.calls == 0 and not registry.status()["models"]["embedder"]["loaded"]
+
+    threads = [threading.Thread(target=model, args=("x",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
+    assert model("deploy") == "DEPLOY"
+    status = registry.status()["models"]["embedder"]
+    assert status["loaded"] and status["hosted"] and status["load_seconds"] >= 0.05
+
+
+def test_models_outside_hosted_are_never_loaded():
+    loader = Loader()
+    registry = ModelRegistry(hosted=["embedder"])
+    registry.register("embedder", Loader())
+    registry.register("summarizer", loader)
+
+    with pytest.raises(RuntimeError, match="not hosted"):
+        registry.get("summarizer")
+    registry.warmup(["embedder", "summarizer"], background=False)
+
+    assert loader.calls == 0
+    assert registry.status()["models"]["summarizer"]["hosted"] is False
+    registry.host(["summarizer"])
+    assert registry.get("summarizer")("ok") == "OK"
+
+
+def test_failed_loads_are_reported_and_retried():
+    loader = Loader(error="weights missing")
+    registry = ModelRegistry()
+    registry.register("ner", loader)
+
+    registry.warmup(["ner"], background=False)
+    assert registry.status()["models"]["ner"]["error"] == "weights missing"
+
+    loader.error = None
+    assert registry.get("ner")("tag") == "TAG"
+    assert loader.calls == 2 and registry.status()["models"]["ner"]["error"] is None
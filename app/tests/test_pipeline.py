@@ -0,0 +1,143 @@
+# app/tests/test_pipeline.py
+import numpy as np
+import pytest
+import pipeline
+from pipeline import segment_sentences, cluster_sentence_embeddings, _split_by_tokens, CHUNK_MAX_TOKENS
+
+TOPICS = {
+    "deploy": "deploy rollout canary release pipeline artifact staging promote",
+    "billing": "invoice billing payment refund ledger currency tax receipt",
+    "login": "login password session token expiry lockout credential sso",
+    "search": "search index query ranking relevance shard replica recall",
+    "backup": "backup snapshot restore archive retention volume schedule copy",
+    "alerts": "alert pager oncall threshold incident escalation runbook triage",
+    "network": "network latency packet firewall route subnet gateway dns",
+    "storage": "storage disk quota bucket object blob capacity tier",
+}
+
+
+def _sentence(topic: str, i: int, words: int = 12) -> str:
+    vocab = TOPICS[topic].split()
+    return " ".join(vocab[(i + k) % len(vocab)] for k in range(words)) + "."
+
+
+def _document(topics: list, per_topic: int, words: int = 12) -> list:
+    return [_sentence(topic, i, words) for topic in topics for i in range(per_topic)]
+
+
+def _embed(stub_models, sentences: list) -> np.ndarray:
+    return np.asarray(stub_models.embedder.encode(sentences))
+
+
+def test_segment_sentences_cuts_between_topics(stub_models):
+    embeddings = _embed(stub_models, _document(["deploy", "billing", "login"], 20))
+
+    groups = segment_sentences(embeddings)
+
+    assert groups == [list(range(0, 20)), list(range(20, 40)), list(range(40, 60))]
+    assert segment_sentences(embeddings[:1]) == [[0]]
+
+
+@pytest.mark.parametrize("extra, segmented", [(0, False), (1, True)])
+def test_only_documents_over_the_sentence_cap_skip_clustering(monkeypatch, stub_models, extra, segmented):
+    sentences = _document(list(TOPICS), 40)[:pipeline.CLUSTER_MAX_SENTENCES + extra]
+    used = []
+    segment = pipeline.segment_sentences
+    monkeypatch.setattr(pipeline, "segment_sentences", lambda *a, **kw: used.append("segment") or segment(*a, **kw))
+    agglomerative = pipeline.AgglomerativeClustering
+    monkeypatch.setattr(pipeline, "AgglomerativeClustering",
+                        lambda **kw: used.append("agglomerative") or agglomerative(**kw))
+
+    chunks, _ = cluster_sentence_embeddings(sentences, _embed(stub_models, sentences))
+
+    assert used == ["segment" if segmented else "agglomerative"]
+    # Either way each topic run stays together, in document order.
+    assert " ".join(chunks) == " ".join(sentences)
+
+
+def test_split_by_tokens_caps_chunks():
+    token_counts = [30] * 60 + [500]
+
+    pieces = _split_by_tokens(list(range(61)), token_counts)
+
+    assert [len(piece) for piece in pieces] == [13, 13, 13, 13, 8, 1]
+    assert all(sum(token_counts[i] for i in piece) <= CHUNK_MAX_TOKENS for piece in pieces[:-1])
+    # A single sentence over the cap is kept whole rather than cut mid-sentence.
+    assert pieces[-1] == [60]
+
+
+def test_long_document_runs_through_the_pipeline_in_capped_chunks(stub_models):
+    sentences = _document(list(TOPICS), 50)
+    assert len(sentences) == 400
+
+    units = pipeline.run_pipeline(" ".join(sentences), "KT-1")
+
+    # Each 50-sentence (600-word) topic run becomes a 396-word and a 204-word chunk.
+    assert [len(unit["chunk_text"].split()) for unit in units] == [396, 204] * len(TOPICS)
+    assert " ".join(unit["chunk_text"] for unit in units) == " ".join(sentences)
+    assert all(len(unit["embedding"]) == stub_models.embedder.dim for unit in units)
+
+
+def _words(count: int) -> str:
+    return " ".join(f"w{i}" for i in range(count))
+
+
+def test_token_windows_split_long_text_and_cap_the_window_count(stub_models):
+    tokenizer = stub_models.summarizer.tokenizer
+    assert pipeline._token_windows(_words(1000), tokenizer) == [_words(1000)]
+
+    windows = pipeline._token_windows(_words(2500), tokenizer)
+    assert [len(window.split()) for window in windows] == [1000, 1000, 500]
+    assert " ".join(windows) == _words(2500)
+
+    # 20 windows' worth of text keeps 8 evenly spaced ones, including the first and last.
+    capped = pipeline._token_windows(_words(20000), tokenizer)
+    assert len(capped) == pipeline.SUMMARY_MAX_WINDOWS
+    assert capped[0].split()[0] == "w0" and capped[-1].split()[-1] == "w19999"
+
+
+def test_summarize_chunks_maps_windows_and_reduces_split_chunks(stub_models):
+    short = "Too short to summarize."
+    single = _words(200)
+    split = _words(2500)
+
+    results = pipeline.summarize_chunks([short, single, split, _words(30000)])
+
+    assert results[0] == {"chunk_text": short, "summary": short}
+    assert results[1]["summary"] == "summary w0 to w199"
+    # One map call over every window of every chunk, one reduce call over the split chunks.
+    assert [len(texts) for texts in stub_models.summarizer.inputs] == [1 + 3 + pipeline.SUMMARY_MAX_WINDOWS, 2]
+    assert stub_models.summarizer.inputs[1][0] == "summary w0 to w999 summary w1000 to w1999 summary w2000 to w2499"
+    assert results[2]["summary"] == "summary summary to w2499"
+    assert all(len(text.split()) <= pipeline.SUMMARY_MAX_INPUT_TOKENS for text in stub_models.summarizer.inputs[0])
+
+
+def test_each_model_stage_runs_as_one_batched_call(stub_models):
+    sentences = _document(["deploy", "billing", "login"], 4)
+
+    units = pipeline.run_pipeline(" ".join(sentences), "KT-1", batch_size=2)
+
+    # Three chunks, but one call per stage: the batch size is the model's, not a loop over chunks.
+    assert len(units) == 3
+    assert stub_models.calls == [("spacy", 1), ("embedder", 12), ("summarizer", 3), ("ner", 3), ("embedder", 3)]
+
+
+def _topic_docs() -> list:
+    pairs = [("deploy", "billing"), ("login", "search"), ("backup", "alerts"), ("network", "storage")]
+    return [{"raw_text": " ".join(_document(list(pair), 3)), "source_id": f"KT-{i}"} for i, pair in enumerate(pairs)]
+
+
+def test_run_pipeline_many_pools_documents_into_shared_model_calls(stub_models):
+    docs = _topic_docs()
+
+    results = pipeline.run_pipeline_many(docs)
+
+    # Four documents of two topics each: 24 sentences and 8 chunks, embedded in one call per stage.
+    assert [call for call in stub_models.calls if call[0] == "embedder"] == [("embedder", 24), ("embedder", 8)]
+    assert stub_models.calls.count(("spacy", 4)) == 1
+    assert list(results) == [doc["source_id"] for doc in docs]
+    for doc in docs:
+        units = results[doc["source_id"]]
+        assert len(units) == 2
+        assert all(unit["source_audio_id"] == doc["source_id"] for unit in units)
+        assert " ".join(unit["chunk_text"] for unit in units) == doc["raw_text"]
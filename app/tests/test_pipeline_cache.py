@@ -0,0 +1,52 @@
+# app/tests/test_pipeline_cache.py
+import itertools
+import sqlite3
+import types
+import pipeline
+import pipeline_cache
+from pipeline_cache import PipelineCache
+from test_pipeline import _topic_docs
+
+
+def test_cache_runs_in_wal_mode_so_readers_do_not_block_the_writer(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = PipelineCache(path)
+    cache.set_many("summary", "v1", {"deploy notes": "summary"})
+
+    assert cache._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    reader = sqlite3.connect(path, isolation_level=None)
+    reader.execute("BEGIN")
+    assert reader.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 1
+    try:
+        # Another process is mid-read; the write still commits without waiting for it.
+        PipelineCache(path, busy_timeout=0.1).set_many("summary", "v1", {"billing notes": "summary"})
+        assert reader.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 1
+    finally:
+        reader.execute("COMMIT")
+    assert reader.execute("SELECT COUNT(*) FROM cache").fetchone()[0] == 2
+
+
+def test_least_recently_used_entries_are_evicted_first(monkeypatch, tmp_path):
+    clock = itertools.count(1)
+    monkeypatch.setattr(pipeline_cache, "time", types.SimpleNamespace(time=lambda: next(clock)))
+    cache = PipelineCache(str(tmp_path / "cache.db"), max_entries=3)
+    cache.set_many("summary", "v1", {"a": 1, "b": 2, "c": 3})
+
+    assert cache.get_many("summary", "v1", ["a"]) == {"a": 1}
+    cache.set_many("summary", "v1", {"d": 4})
+
+    assert cache.get_many("summary", "v1", ["a", "b", "c", "d"]) == {"a": 1, "c": 3, "d": 4}
+    assert cache.stats()["entries"] == 3
+
+
+def test_unchanged_documents_are_served_from_the_document_cache(stub_models):
+    docs = _topic_docs()
+    first = pipeline.run_pipeline_many(docs)
+    stub_models.calls.clear()
+
+    second = pipeline.run_pipeline_many(docs)
+
+    assert stub_models.calls == []
+    assert pipeline.pipeline_cache.stats()["kinds"]["document"] == {"hits": 4, "misses": 4, "hit_rate": 0.5}
+    assert [[unit["chunk_text"] for unit in second[key]] for key in second] == \
+        [[unit["chunk_text"] for unit in first[key]] for key in first]
@@ -0,0 +1,152 @@
+# app/tests/test_rag_system.py
+import json
+import time
+import asyncio
+import threading
+import pytest
+import requests
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+import rag_system  # noqa: E402
+
+
+class FakeRaw:
+    """Raw response body handing out the given byte chunks one read at a time, then endlessly `tail`."""
+
+    def __init__(self, chunks: list, tail: bytes = None):
+        self.chunks = list(chunks)
+        self.tail = tail
+        self.closed = False
+
+    def read(self, amount=None, **kwargs):
+        if self.chunks:
+            return self.chunks.pop(0)
+        if self.tail is not None and not self.closed:
+            time.sleep(0.01)
+            return self.tail
+        return b""
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    def __init__(self, raw: FakeRaw, status_code: int = 200):
+        self.raw = raw
+        self.status_code = status_code
+        self.payloads = []
+
+    def post(self, url, json=None, stream=False, timeout=None):
+        self.payloads.append(json)
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.raw = self.raw
+        return response
+
+
+def _ndjson(*objects) -> bytes:
+    return b"".join(json.dumps(obj).encode() + b"\n" for obj in objects)
+
+
+def _rag(raw: FakeRaw, max_concurrent: int = 1):
+    # Skips __init__: no embedding model or Chroma store is needed to test the LLM stream.
+    rag = rag_system.LocalRAGSystem.__new__(rag_system.LocalRAGSystem)
+    rag.model = "mistral"
+    rag.ollama_endpoint = "http://ollama.test/api/generate"
+    rag.session = FakeSession(raw)
+    rag._generation_slots = threading.BoundedSemaphore(max_concurrent)
+    rag.max_concurrent = max_concurrent
+    rag.cache_size = 8
+    rag._answer_cache = rag_system.OrderedDict()
+    rag._cache_lock = threading.Lock()
+    rag.retrieve_context = lambda question, n_results=3: (["doc-1"], ["Deploys run nightly."])
+    return rag
+
+
+def _slots_free(rag) -> bool:
+    acquired = [rag._generation_slots.acquire(blocking=False) for _ in range(rag.max_concurrent)]
+    for ok in acquired:
+        if ok:
+            rag._generation_slots.release()
+    return all(acquired)
+
+
+def test_stream_llm_parses_lines_split_across_chunks():
+    body = _ndjson({"response": "Deploys ", "done": False}, {"response": "run ", "done": False},
+                   {"response": "nightly.", "done": False}, {"response": "", "done": True})
+    # Cut mid-object and mid-line, and add a trailing object after "done".
+    chunks = [body[:7], body[7:30], body[30:31], body[31:]] + [_ndjson({"response": "ignored"})]
+    rag = _rag(FakeRaw(chunks))
+
+    assert list(rag.stream_llm("prompt")) == ["Deploys ", "run ", "nightly."]
+    assert rag.session.payloads[0]["stream"] is True
+    assert _slots_free(rag)
+
+
+def test_stream_llm_raises_on_error_objects():
+    rag = _rag(FakeRaw([_ndjson({"response": "Dep", "done": False}, {"error": "model 'mistral' not found"})]))
+
+    with pytest.raises(Exception, match="not found"):
+        list(rag.stream_llm("prompt"))
+    assert _slots_free(rag)
+
+
+def test_truncated_stream_raises_and_is_not_cached():
+    rag = _rag(FakeRaw([_ndjson({"response": "Deploys run", "done": False})]))
+
+    with pytest.raises(Exception, match="ended before"):
+        rag.answer_question("When do deploys run?")
+    assert not rag._answer_cache
+    assert _slots_free(rag)
+
+
+def test_client_disconnect_mid_stream_frees_the_generation_slot():
+    pytest.importorskip("fastapi")
+    raw = FakeRaw([_ndjson({"response": "Deploys ", "done": False})],
+                  tail=_ndjson({"response": "and ", "done": False}))
+    rag = _rag(raw)
+    app = rag_system.create_app(rag)
+
+    async def disconnect_after_first_event():
+        first_event = asyncio.Event()
+
+        async def receive():
+            if not hasattr(receive, "called"):
+                receive.called = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await first_event.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                first_event.set()
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                 "scheme": "http", "path": "/ask/stream", "raw_path": b"/ask/stream",
+                 "query_string": b"question=When+do+deploys+run", "headers": [], "server": ("test", 80),
+                 "client": ("test", 1234), "root_path": ""}
+        await asyncio.wait_for(app(scope, receive, send), timeout=5)
+
+    asyncio.run(disconnect_after_first_event())
+
+    assert raw.closed
+    assert _slots_free(rag)
+    assert not rag._answer_cache
+
+
+def test_answers_are_not_reused_once_a_retrieved_document_changes():
+    answer = _ndjson({"response": "Nightly.", "done": False}, {"response": "", "done": True})
+    rag = _rag(FakeRaw([answer]))
+
+    assert rag.answer_question("When do deploys run?") == "Nightly."
+    assert rag.answer_question("when do  deploys run?") == "Nightly."
+    assert len(rag.session.payloads) == 1
+
+    # Re-synced under the same id with new content.
+    rag.retrieve_context = lambda question, n_results=3: (["doc-1"], ["Deploys run every hour."])
+    rag.session = FakeSession(FakeRaw([_ndjson({"response": "Hourly.", "done": False}, {"response": "", "done": True})]))
+
+    assert rag.answer_question("When do deploys run?") == "Hourly."
+    assert len(rag.session.payloads) == 1
+    assert "every hour" in rag.session.payloads[0]["prompt"]
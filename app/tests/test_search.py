@@ -0,0 +1,107 @@
+# app/tests/test_search.py
+import pytest
+from endpoints import search
+
+
+def test_requests_without_a_mode_search_dense():
+    assert search.DEFAULT_SEARCH_MODE == "dense"
+    assert search._search_request({"query": "login timeout"})["mode"] == "dense"
+    assert search.SearchQuery(query="login timeout").mode == "dense"
+
+
+def _client():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    app = FastAPI()
+    app.include_router(search.router, prefix="")
+    return TestClient(app)
+
+
+def test_malformed_time_bounds_are_rejected():
+    client = _client()
+
+    assert client.get("/search", params={"query": "login", "until": "last tuesday"}).status_code == 422
+    response = client.post("/search/batch", json={"queries": [{"query": "login", "filters": {"since": "2024-13-01"}}]})
+    assert response.status_code == 422
+
+
+def test_time_bounds_are_normalized_to_the_stored_format():
+    filters = search.SearchFilters(since="2024-05-01T10:00:00+02:00", until="2024-05-01").to_dict()
+
+    assert filters["since"] == "2024-05-01T08:00:00.000000Z"
+    assert filters["until"] == "2024-05-01T23:59:59.999999Z"
+
+
+def _unit(stub_models, unit_id: str, source_id: str, text: str) -> dict:
+    return {"id": unit_id, "chunk_text": text, "summary": text, "tags": [], "speaker": "Jira",
+            "timestamp": "2024-05-01T10:00:00.000000Z", "source_audio_id": source_id,
+            "embedding": stub_models.embedder.encode([text])[0].tolist()}
+
+
+def test_writes_bump_the_corpus_version_and_invalidate_cached_results(store, stub_models):
+    from endpoints import ingest
+    from query_cache import search_result_cache, corpus_version
+    search_result_cache.clear()
+    ingest.insert_to_mongo([_unit(stub_models, "u1", "KT-1", "deploy rollout canary release"),
+                            _unit(stub_models, "u2", "KT-3", "invoice billing payment refund")])
+
+    first, _ = search.search_documents("deploy rollout canary release", top_k=1)
+    hits = search_result_cache.stats()["hits"]
+    again, _ = search.search_documents("Deploy  rollout canary release", top_k=1)
+    assert [doc["id"] for doc in first] == [doc["id"] for doc in again] == ["u1"]
+    assert search_result_cache.stats()["hits"] == hits + 1
+
+    version = corpus_version.value
+    ingest.upsert_to_mongo({"KT-1": [_unit(stub_models, "u3", "KT-1", "deploy rollout canary release staging")]})
+    assert corpus_version.value > version
+    replaced, _ = search.search_documents("deploy rollout canary release", top_k=1)
+    assert [doc["id"] for doc in replaced] == ["u3"]
+
+    version = corpus_version.value
+    ingest.delete_from_mongo("KT-1")
+    assert corpus_version.value > version
+    remaining, _ = search.search_documents("deploy rollout canary release", top_k=1)
+    assert [doc["id"] for doc in remaining] == ["u2"]
+
+
+def test_batch_search_groups_queries_by_filters(monkeypatch, store, stub_models):
+    from endpoints import ingest
+    from query_cache import search_result_cache
+    search_result_cache.clear()
+    ingest.insert_to_mongo([_unit(stub_models, "u1", "KT-1", "deploy rollout canary release"),
+                            _unit(stub_models, "u2", "KT-2", "deploy rollout canary staging"),
+                            _unit(stub_models, "u3", "KT-3", "invoice billing payment refund")])
+    calls = []
+    search_many = search.vector_index.search_many
+    monkeypatch.setattr(search.vector_index, "search_many",
+                        lambda queries, top_k, allowed=None: calls.append((len(queries), allowed is not None))
+                        or search_many(queries, top_k, allowed))
+    del stub_models.calls[:]
+
+    response = _client().post("/search/batch", json={"queries": [
+        {"query": "deploy rollout", "top_k": 2},
+        {"query": "billing refund", "top_k": 1},
+        {"query": "deploy canary", "top_k": 1, "filters": {"source_audio_id": "KT-2"}},
+        {"query": "canary release", "top_k": 1, "filters": {"source_audio_id": "KT-2"}},
+        {"query": "invoice", "top_k": 1, "mode": "lexical"},
+    ]})
+
+    assert response.status_code == 200
+    results = [[hit["id"] for hit in item["results"]] for item in response.json()["results"]]
+    assert sorted(results[0]) == ["u1", "u2"]
+    assert results[1:] == [["u3"], ["u2"], ["u2"], ["u3"]]
+    # One embedding call for the four dense queries, one FAISS call per distinct filter set.
+    assert stub_models.calls == [("embedder", 4)]
+    assert sorted(calls) == [(2, False), (2, True)]
+
+
+def test_top_k_must_be_positive_and_bounded():
+    client = _client()
+
+    assert client.get("/search", params={"query": "login", "top_k": 0}).status_code == 422
+    assert client.get("/search", params={"query": "login", "top_k": -2}).status_code == 422
+    response = client.post("/search/batch", json={"queries": [{"query": "login", "top_k": search.SEARCH_MAX_TOP_K + 1}]})
+    assert response.status_code == 422
+    assert search._search_request({"query": "login"})["top_k"] == 3
+    with pytest.raises(ValueError):
+        search._search_request({"query": "login", "top_k": 0})
@@ -0,0 +1,70 @@
+# app/tests/test_transcription.py
+import os
+import time
+import numpy as np
+import pytest
+from transcription import split_on_silence, SAMPLE_RATE
+
+
+def test_split_on_silence_cuts_at_the_quietest_frame():
+    audio = np.full(SAMPLE_RATE * 50, 0.5, dtype="float32")
+    silence = (SAMPLE_RATE * 20, SAMPLE_RATE * 20 + SAMPLE_RATE // 10)
+    audio[silence[0]:silence[1]] = 0.0
+
+    (first_start, cut), (second_start, end) = split_on_silence(audio, max_seconds=30, min_seconds=10)
+
+    assert first_start == 0 and second_start == cut and end == len(audio)
+    assert silence[0] <= cut < silence[1]
+
+
+@pytest.mark.parametrize("min_seconds, max_seconds", [(0, 30), (-1, 30), (10, 0)])
+def test_split_on_silence_rejects_non_positive_lengths(min_seconds, max_seconds):
+    with pytest.raises(ValueError):
+        split_on_silence(np.zeros(SAMPLE_RATE * 40, dtype="float32"),
+                         max_seconds=max_seconds, min_seconds=min_seconds)
+
+
+@pytest.fixture
+def record_client(monkeypatch):
+    # Form uploads need python-multipart, which FastAPI checks for when the router is imported.
+    pytest.importorskip("python_multipart")
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from endpoints import record
+
+    queued = []
+    monkeypatch.setattr(record.job_manager, "submit", lambda kind, fn, *args: queued.append(args) or "job-1")
+    app = FastAPI()
+    app.include_router(record.router, prefix="")
+    return TestClient(app), record, queued
+
+
+def test_streamed_upload_appends_chunks_and_queues_the_file(record_client):
+    client, record, queued = record_client
+    upload_id = client.post("/transcribe/stream", params={"filename": "talk.wav"}).json()["upload_id"]
+
+    client.put(f"/transcribe/stream/{upload_id}", content=b"RIFF")
+    response = client.put(f"/transcribe/stream/{upload_id}", content=iter([b"ab", b"cd"]))
+    assert response.json() == {"status": "success", "received_bytes": 4, "total_bytes": 8}
+
+    result = client.post(f"/transcribe/stream/{upload_id}/finish", params={"source_id": "talk"}).json()
+    path, source_id, _ = queued[0]
+    assert result["job_id"] == "job-1" and source_id == "talk"
+    with open(path, "rb") as f:
+        assert f.read() == b"RIFFabcd"
+    os.remove(path)
+
+
+def test_abandoned_streamed_uploads_expire(record_client):
+    client, record, _ = record_client
+    stale = client.post("/transcribe/stream").json()["upload_id"]
+    fresh = client.post("/transcribe/stream").json()["upload_id"]
+    stale_path = record._stream_uploads[stale]["path"]
+    record._stream_uploads[stale]["touched"] = time.time() - record.STREAM_UPLOAD_TTL_SECONDS - 1
+
+    assert record.expire_stream_uploads() == 1
+
+    assert not os.path.exists(stale_path)
+    assert client.put(f"/transcribe/stream/{stale}", content=b"x").status_code == 404
+    assert client.put(f"/transcribe/stream/{fresh}", content=b"x").status_code == 200
+    record.expire_stream_uploads(ttl=0)
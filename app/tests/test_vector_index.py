@@ -0,0 +1,85 @@
+# app/tests/test_vector_index.py
+import functools
+import numpy as np
+import pytest
+import vector_index
+from vector_index import VectorIndex, INDEX_TYPES, to_faiss_id
+
+DIM = 48
+
+
+def _docs(count: int, seed: int = 0, prefix: str = "u") -> list:
+    vectors = np.random.default_rng(seed).normal(size=(count, DIM)).astype("float32")
+    return [{"id": f"{prefix}{i}", "embedding": vector.tolist()} for i, vector in enumerate(vectors)]
+
+
+def _top(index: VectorIndex, doc: dict, top_k: int = 1, allowed_ids=None) -> list:
+    return index.search(np.asarray(doc["embedding"], dtype="float32"), top_k, allowed_ids)[0]
+
+
+@pytest.fixture(params=INDEX_TYPES)
+def built(request, tmp_path, monkeypatch):
+    # Small PQ codes keep ivf_pq's training set (39 vectors per centroid) and time down.
+    monkeypatch.setattr(vector_index, "new_faiss_index",
+                        functools.partial(vector_index.new_faiss_index, pq_m=8, pq_nbits=4))
+    docs = _docs(1500)
+    index = VectorIndex(path=str(tmp_path / "faiss.bin"), embedding_dim=DIM, index_type=request.param)
+    index.rebuild(docs)
+    return index, docs
+
+
+def test_add_remove_replace(built):
+    index, docs = built
+    assert index.kind == index.index_type
+    assert _top(index, docs[7]) == ["u7"]
+
+    index.remove(["u7"], persist=False)
+    assert "u7" not in _top(index, docs[7], top_k=5)
+
+    # Replacing u8 with the vector of u9: u8 now only matches there.
+    index.add([{"id": "u8", "embedding": docs[9]["embedding"]}], persist=False)
+    assert set(_top(index, docs[9], top_k=2)) == {"u8", "u9"}
+    assert "u8" not in _top(index, docs[8], top_k=3)
+    assert index.ntotal == len(docs) - 1 + index._stale
+
+
+def test_save_and_reload(built, tmp_path):
+    index, docs = built
+    index.remove(["u3"], persist=False)
+    index.save()
+
+    reloaded = VectorIndex(path=index.path, embedding_dim=DIM, index_type=index.index_type)
+    assert reloaded.load()
+    assert reloaded.kind == index.index_type
+    assert _top(reloaded, docs[11]) == ["u11"]
+    assert "u3" not in _top(reloaded, docs[3], top_k=5)
+
+
+def test_filtered_search_only_scores_allowed_ids(built):
+    index, docs = built
+    allowed = np.array([to_faiss_id(f"u{i}") for i in (2, 4, 6)], dtype="int64")
+
+    doc_ids, _ = index.search(np.asarray(docs[4]["embedding"], dtype="float32"), 5, allowed)
+
+    assert doc_ids[0] == "u4" and set(doc_ids) <= {"u2", "u4", "u6"}
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "hnsw_sq8"])
+def test_hnsw_compacts_once_enough_vectors_are_stale(tmp_path, index_type):
+    docs = _docs(100)
+    index = VectorIndex(path=str(tmp_path / "faiss.bin"), embedding_dim=DIM, index_type=index_type,
+                        compact_stale_fraction=0.2)
+    index.rebuild(docs)
+
+    index.remove([f"u{i}" for i in range(10)], persist=False)
+    assert index.ntotal == 100 and index._stale == 10
+
+    index.remove([f"u{i}" for i in range(10, 20)], persist=False)
+    assert index.ntotal == 80 and index._stale == 0
+    assert index.kind == index_type
+    assert _top(index, docs[50]) == ["u50"]
+
+    # Re-adding an id compacts right away: its old vector must not match any more.
+    index.add([{"id": "u60", "embedding": docs[61]["embedding"]}], persist=False)
+    assert index.ntotal == 80 and index._stale == 0
+    assert "u60" not in _top(index, docs[60], top_k=3)
@@ -0,0 +1,90 @@
+# app/transcription.py
+import numpy as np
+from config import settings
+from model_registry import model_registry
+
+SAMPLE_RATE = 16000  # Whisper works on 16 kHz mono audio
+# Whisper decodes 30 second windows, so segments never exceed that.
+SEGMENT_MAX_SECONDS = min(getattr(settings, "TRANSCRIBE_SEGMENT_MAX_SECONDS", 30), 30)
+SEGMENT_MIN_SECONDS = getattr(settings, "TRANSCRIBE_SEGMENT_MIN_SECONDS", 10)
+# Number of segments decoded together in one batched Whisper forward pass.
+TRANSCRIBE_BATCH_SIZE = getattr(settings, "TRANSCRIBE_BATCH_SIZE", 8)
+WHISPER_LANGUAGE = getattr(settings, "WHISPER_LANGUAGE", None)
+
+
+def split_on_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                     max_seconds: float = SEGMENT_MAX_SECONDS, min_seconds: float = SEGMENT_MIN_SECONDS,
+                     frame_ms: int = 30) -> list:
+    """
+    Split audio into (start, end) sample ranges no longer than max_seconds.
+    Each cut is placed at the quietest frame (lowest RMS energy) between
+    min_seconds and max_seconds after the previous cut, so words are rarely
+    split. Runs in time linear in the audio length.
+    """
+    if min_seconds <= 0 or max_seconds <= 0:
+        # A zero minimum lets a cut land on the previous one, so the split never advances.
+        raise ValueError(f"min_seconds and max_seconds must be positive, got {min_seconds} and {max_seconds}.")
+    total = len(audio)
+    max_len = int(max_seconds * sample_rate)
+    if total <= max_len:
+        return [(0, total)] if total else []
+
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    n_frames = total // frame
+    energy = np.sqrt(np.mean(audio[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+
+    bounds = []
+    start = 0
+    while total - start > max_len:
+        lo = (start + int(min_seconds * sample_rate)) // frame
+        hi = min((start + max_len) // frame, n_frames)
+        if hi <= lo:
+            cut = start + max_len
+        else:
+            cut = (lo + int(np.argmin(energy[lo:hi]))) * frame
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, total))
+    return bounds
+
+
+def transcribe_audio(audio: np.ndarray, batch_size: int = TRANSCRIBE_BATCH_SIZE) -> dict:
+    """
+    Transcribe 16 kHz mono float32 audio.
+    The audio is split at silences into segments of at most 30 seconds, and the
+    segments are decoded in batches of batch_size with the cached Whisper model.
+    Returns the full text, the per-segment texts with their offsets and the duration.
+    """
+    import torch
+    import whisper
+
+    model = model_registry.get("whisper")
+    bounds = split_on_silence(audio)
+    options = whisper.DecodingOptions(language=WHISPER_LANGUAGE, fp16=model.device.type != "cpu")
+    segments = []
+    for batch_start in range(0, len(bounds), batch_size):
+        batch = bounds[batch_start:batch_start + batch_size]
+        mels = [
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(audio[start:end]), n_mels=model.dims.n_mels)
+            for start, end in batch
+        ]
+        results = whisper.decode(model, torch.stack(mels).to(model.device), options)
+        for (start, end), result in zip(batch, results):
+            segments.append({
+                "start": round(start / SAMPLE_RATE, 2),
+                "end": round(end / SAMPLE_RATE, 2),
+                "text": result.text.strip(),
+            })
+    return {
+        "text": " ".join(segment["text"] for segment in segments if segment["text"]),
+        "segments": segments,
+        "duration_seconds": round(len(audio) / SAMPLE_RATE, 2),
+    }
+
+
+def transcribe_file(path: str, batch_size: int = TRANSCRIBE_BATCH_SIZE) -> dict:
+    """Decode any audio file ffmpeg understands and transcribe it; see transcribe_audio."""
+    import whisper
+
+    return transcribe_audio(whisper.load_audio(path, sr=SAMPLE_RATE), batch_size=batch_size)
+
@@ -0,0 +1,360 @@
+# app/vector_index.py
+import os
+import json
+import math
+import hashlib
+import threading
+import numpy as np
+import faiss
+from config import settings
+from embedding_codec import decode_embeddings
+from telemetry import metrics, SIZE_BUCKETS
+
+EMBEDDING_DIM = 384
+INDEX_PATH = getattr(settings, "FAISS_INDEX_PATH", "faiss_index.bin")
+
+# Index backends, from exact to most compressed:
+#   flat       exact brute-force scan (the default)
+#   sq8        exact scan over 8-bit scalar-quantized vectors (4x less memory)
+#   ivf_flat   inverted file over k-means cells, scanning nprobe cells per query
+#   ivf_sq8    ivf_flat with 8-bit scalar-quantized vectors
+#   ivf_pq     ivf with product-quantized vectors (pq_m bytes per vector at 8 bits)
+#   hnsw       HNSW graph over full vectors
+#   hnsw_sq8   HNSW graph over 8-bit scalar-quantized vectors
+INDEX_TYPES = ("flat", "sq8", "ivf_flat", "ivf_sq8", "ivf_pq", "hnsw", "hnsw_sq8")
+FAISS_INDEX_TYPE = getattr(settings, "FAISS_INDEX_TYPE", "flat")
+# Number of IVF cells; derived from the corpus size when unset.
+FAISS_NLIST = getattr(settings, "FAISS_NLIST", None)
+FAISS_NPROBE = getattr(settings, "FAISS_NPROBE", 16)
+FAISS_HNSW_M = getattr(settings, "FAISS_HNSW_M", 32)
+FAISS_EF_CONSTRUCTION = getattr(settings, "FAISS_EF_CONSTRUCTION", 80)
+FAISS_EF_SEARCH = getattr(settings, "FAISS_EF_SEARCH", 64)
+# Sub-quantizers per vector for ivf_pq; must divide the embedding dimension.
+FAISS_PQ_M = getattr(settings, "FAISS_PQ_M", 48)
+FAISS_PQ_NBITS = getattr(settings, "FAISS_PQ_NBITS", 8)
+# Maximum number of vectors used to train IVF/PQ/SQ indexes.
+FAISS_TRAIN_SAMPLE = getattr(settings, "FAISS_TRAIN_SAMPLE", 100000)
+# Share of removed-but-still-stored vectors (HNSW) at which the index is compacted.
+FAISS_COMPACT_STALE_FRACTION = getattr(settings, "FAISS_COMPACT_STALE_FRACTION", 0.2)
+
+
+def to_faiss_id(doc_id: str) -> int:
+    """Map a knowledge unit's string id onto a stable, positive int64 FAISS id."""
+    digest = hashlib.blake2b(str(doc_id).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") & 0x7FFFFFFFFFFFFFFF
+
+
+def auto_nlist(n_vectors: int) -> int:
+    """About 4 * sqrt(n) IVF cells, keeping at least 39 training vectors per cell."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def index_factory_string(index_type: str, n_vectors: int, nlist: int = FAISS_NLIST,
+                         hnsw_m: int = FAISS_HNSW_M, pq_m: int = FAISS_PQ_M,
+                         pq_nbits: int = FAISS_PQ_NBITS) -> str:
+    """The faiss.index_factory description of an index backend."""
+    nlist = nlist or auto_nlist(n_vectors)
+    return {
+        "flat": "Flat",
+        "sq8": "SQ8",
+        "ivf_flat": f"IVF{nlist},Flat",
+        "ivf_sq8": f"IVF{nlist},SQ8",
+        "ivf_pq": f"IVF{nlist},PQ{pq_m}x{pq_nbits}",
+        "hnsw": f"HNSW{hnsw_m},Flat",
+        "hnsw_sq8": f"HNSW{hnsw_m},SQ8",
+    }[index_type]
+
+
+def index_kind(index) -> str:
+    """Name the backend (see INDEX_TYPES) of a FAISS index, looking through IndexIDMap."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)
+    kinds = {
+        faiss.IndexFlat: "flat",
+        faiss.IndexScalarQuantizer: "sq8",
+        faiss.IndexIVFFlat: "ivf_flat",
+        faiss.IndexIVFScalarQuantizer: "ivf_sq8",
+        faiss.IndexIVFPQ: "ivf_pq",
+        faiss.IndexHNSWFlat: "hnsw",
+        faiss.IndexHNSWSQ: "hnsw_sq8",
+    }
+    for cls, kind in kinds.items():
+        if isinstance(index, cls):
+            return kind
+    return type(index).__name__
+
+
+def new_faiss_index(index_type: str, vectors: np.ndarray, embedding_dim: int = EMBEDDING_DIM,
+                    nlist: int = FAISS_NLIST, train_sample: int = FAISS_TRAIN_SAMPLE,
+                    nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH,
+                    pq_m: int = FAISS_PQ_M, pq_nbits: int = FAISS_PQ_NBITS):
+    """
+    Create an empty inner-product index of the given backend, trained on (a
+    random sample of) vectors when the backend needs training. Backends that
+    cannot be trained on so few vectors fall back to flat until the next rebuild.
+    Returns an index that takes add_with_ids/remove_ids: IVF indexes store ids
+    themselves, the others are wrapped in an IndexIDMap.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown FAISS index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}.")
+    n_vectors = len(vectors)
+    nlist = nlist or auto_nlist(n_vectors)
+    if index_type.startswith("ivf"):
+        # k-means wants about 39 training points per centroid (IVF cells, PQ codes).
+        needed = 39 * max(nlist, 2 ** pq_nbits if index_type == "ivf_pq" else 1)
+        if n_vectors < needed:
+            index_type = "flat"
+    elif index_type in ("sq8", "hnsw_sq8") and n_vectors == 0:
+        index_type = "flat"
+    index = faiss.index_factory(embedding_dim, index_factory_string(index_type, n_vectors, nlist,
+                                                                   pq_m=pq_m, pq_nbits=pq_nbits),
+                                faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        sample = vectors
+        if n_vectors > train_sample:
+            rows = np.random.default_rng(0).choice(n_vectors, train_sample, replace=False)
+            sample = vectors[np.sort(rows)]
+        index.train(np.ascontiguousarray(sample, dtype="float32"))
+    if index_type.startswith("ivf"):
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    elif index_type.startswith("hnsw"):
+        index.hnsw.efConstruction = FAISS_EF_CONSTRUCTION
+        index.hnsw.efSearch = ef_search
+    if index_type.startswith("ivf"):
+        # IndexIDMap cannot remove from IVF lists, but IVF keeps external ids natively.
+        return index
+    return faiss.IndexIDMap(index)
+
+
+def search_parameters(index, selector=None, nprobe: int = FAISS_NPROBE, ef_search: int = FAISS_EF_SEARCH):
+    """SearchParameters carrying the id selector and the nprobe/efSearch of the backend."""
+    kind = index_kind(index)
+    if kind.startswith("ivf"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=nprobe)
+    if kind.startswith("hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=ef_search)
+    return faiss.SearchParameters(sel=selector) if selector is not None else None
+
+
+class VectorIndex:
+    """
+    Long-lived FAISS index over the knowledge unit embeddings.
+
+    The index is an inner-product index of the configured backend (see
+    INDEX_TYPES) addressed by FAISS ids, so units can be added, replaced and
+    removed by id without rebuilding. Backends that need training are trained on
+    the first batch added to an empty index, normally the full rebuild. It is
+    written to disk with faiss.write_index (plus a small JSON id map next to it)
+    and reloaded on the next startup, so /search only has to do the vector lookup.
+
+    HNSW graphs cannot delete vectors: removed units are dropped from the id map
+    and their old vectors skipped at search time, until they make up
+    compact_stale_fraction of the index and it is rebuilt from its own live
+    vectors (see compact). Re-adding an id compacts right away, since its old
+    vector would otherwise still match under the same id. HNSW also explores
+    only efSearch candidates, so very selective filters can return fewer than
+    top_k results.
+    """
+
+    def __init__(self, path: str = INDEX_PATH, embedding_dim: int = EMBEDDING_DIM,
+                 index_type: str = FAISS_INDEX_TYPE, nprobe: int = FAISS_NPROBE,
+                 ef_search: int = FAISS_EF_SEARCH, compact_stale_fraction: float = FAISS_COMPACT_STALE_FRACTION):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}.")
+        self.path = path
+        self.ids_path = path + ".ids.json"
+        self.embedding_dim = embedding_dim
+        self.index_type = index_type
+        # Search-time accuracy/speed knobs for IVF (cells scanned) and HNSW (candidate list size).
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.compact_stale_fraction = compact_stale_fraction
+        self._lock = threading.RLock()
+        self._index = self._new_index()
+        self._ids = {}  # faiss id -> knowledge unit id
+        self._stale = 0  # vectors left behind by removals the backend cannot perform
+
+    def _new_index(self, vectors: np.ndarray = None):
+        if vectors is None:
+            # Placeholder until the first vectors arrive to train the configured backend on.
+            return faiss.IndexIDMap(faiss.IndexFlatIP(self.embedding_dim))
+        return new_faiss_index(self.index_type, vectors, self.embedding_dim,
+                               nprobe=self.nprobe, ef_search=self.ef_search)
+
+    @property
+    def ntotal(self) -> int:
+        return self._index.ntotal
+
+    @property
+    def kind(self) -> str:
+        """The backend actually in use, which is flat while the corpus is too small to train on."""
+        return index_kind(self._index)
+
+    def load_or_build(self, load_documents, expected_count: int = None) -> None:
+        """
+        Load the index from disk, or rebuild it from load_documents() when there is
+        no saved index, it no longer matches the number of stored embeddings or it
+        was built with a different backend.
+        """
+        with self._lock:
+            if (self.load() and (expected_count is None or expected_count == self.ntotal)
+                    and self.kind == self.index_type):
+                return
+            self.rebuild(load_documents())
+
+    def load(self) -> bool:
+        """Load a previously saved index. Returns False if there is none."""
+        if not (os.path.exists(self.path) and os.path.exists(self.ids_path)):
+            return False
+        with self._lock:
+            self._index = faiss.read_index(self.path)
+            with open(self.ids_path, "r", encoding="utf-8") as f:
+                self._ids = {int(k): v for k, v in json.load(f).items()}
+            self._stale = self._index.ntotal - len(self._ids)
+        return True
+
+    def save(self) -> None:
+        """Persist the index and its id map to disk."""
+        with self._lock:
+            faiss.write_index(self._index, self.path)
+            with open(self.ids_path, "w", encoding="utf-8") as f:
+                json.dump({str(k): v for k, v in self._ids.items()}, f)
+
+    def rebuild(self, documents: list) -> None:
+        """Replace the whole index with the embeddings of the given documents."""
+        with self._lock:
+            self._index = self._new_index()
+            self._ids = {}
+            self._stale = 0
+            self.add(documents, persist=False)
+            self.save()
+
+    def add(self, documents: list, persist: bool = True) -> int:
+        """
+        Add (or replace) the embeddings of the given documents.
+        Documents without an 'id' or 'embedding' are skipped.
+        Returns the number of vectors added.
+        """
+        pairs = [(doc["id"], doc["embedding"]) for doc in documents
+                 if doc.get("id") is not None and doc.get("embedding") is not None]
+        if not pairs:
+            return 0
+        doc_ids = [doc_id for doc_id, _ in pairs]
+        faiss_ids = np.array([to_faiss_id(doc_id) for doc_id in doc_ids], dtype="int64")
+        vectors = np.array(decode_embeddings([emb for _, emb in pairs]), dtype="float32")
+        # Normalize vectors to unit length for cosine similarity via inner product.
+        faiss.normalize_L2(vectors)
+        with self._lock:
+            if self._index.ntotal == 0 and self.kind != self.index_type:
+                # Train the configured backend on the first vectors it receives.
+                self._index = self._new_index(vectors)
+            # Re-ingested units replace their previous vectors.
+            stale = self._stale
+            self._remove_faiss_ids(faiss_ids)
+            self._index.add_with_ids(vectors, faiss_ids)
+            self._ids.update(zip(faiss_ids.tolist(), doc_ids))
+            if self._stale > stale:
+                self.compact()
+            if persist:
+                self.save()
+        return len(pairs)
+
+    def remove(self, doc_ids: list, persist: bool = True) -> int:
+        """Remove the vectors of the given knowledge unit ids. Returns the number removed."""
+        if not doc_ids:
+            return 0
+        faiss_ids = np.array([to_faiss_id(doc_id) for doc_id in doc_ids], dtype="int64")
+        with self._lock:
+            removed = self._remove_faiss_ids(faiss_ids)
+            for faiss_id in faiss_ids.tolist():
+                self._ids.pop(faiss_id, None)
+            if self._stale and self._stale >= self.compact_stale_fraction * self._index.ntotal:
+                self.compact()
+            if persist:
+                self.save()
+        return removed
+
+    def compact(self) -> None:
+        """
+        Rebuild the index from the vectors it holds, dropping those left behind by
+        removals the backend cannot perform; the newest vector of an id is its live one.
+        """
+        with self._lock:
+            if not self._stale:
+                return
+            index = faiss.downcast_index(self._index)
+            live = {}
+            for offset, faiss_id in enumerate(faiss.vector_to_array(index.id_map).tolist()):
+                if faiss_id in self._ids:
+                    live[faiss_id] = offset
+            if live:
+                vectors = index.index.reconstruct_n(0, index.ntotal)[list(live.values())]
+                self._index = self._new_index(vectors)
+                self._index.add_with_ids(vectors, np.array(list(live), dtype="int64"))
+            else:
+                self._index = self._new_index()
+            self._stale = 0
+            metrics.inc("faiss_compactions", 1, "FAISS indexes rebuilt to drop removed vectors", index=self.kind)
+
+    def _remove_faiss_ids(self, faiss_ids: np.ndarray) -> int:
+        try:
+            return self._index.remove_ids(faiss_ids)
+        except RuntimeError:
+            # HNSW: leave the vectors in place; search skips them (see class docstring).
+            stale = sum(1 for faiss_id in faiss_ids.tolist() if faiss_id in self._ids)
+            self._stale += stale
+            return stale
+
+    def search(self, query_embedding, top_k: int = 3, allowed_ids: np.ndarray = None):
+        """
+        Search the index with a single query embedding.
+        When allowed_ids (FAISS ids, see to_faiss_id) is given, only those vectors
+        are scored, through a FAISS IDSelector, instead of filtering a global top_k.
+        Returns (doc_ids, scores) ordered by descending similarity.
+        """
+        return self.search_many(np.asarray(query_embedding).reshape(1, -1), top_k, allowed_ids)[0]
+
+    def search_many(self, query_embeddings, top_k: int = 3, allowed_ids: np.ndarray = None) -> list:
+        """
+        Search the index with several query embeddings in one multi-row FAISS
+        search. Returns one (doc_ids, scores) pair per query; see search.
+        """
+        queries = np.array(query_embeddings, dtype="float32").reshape(-1, self.embedding_dim)
+        empty = [([], []) for _ in range(len(queries))]
+        if len(queries) == 0:
+            return empty
+        faiss.normalize_L2(queries)
+        selector = None
+        if allowed_ids is not None:
+            if len(allowed_ids) == 0:
+                return empty
+            selector = faiss.IDSelectorBatch(np.asarray(allowed_ids, dtype="int64"))
+            top_k = min(top_k, len(allowed_ids))
+        with self._lock:
+            if self._index.ntotal == 0:
+                return empty
+            params = search_parameters(self._index, selector, self.nprobe, self.ef_search)
+            # Over-fetch by the number of stale vectors so skipping them cannot shorten the results.
+            k = min(top_k + self._stale, self._index.ntotal)
+            with metrics.timed("faiss_search_seconds", "Latency of FAISS searches", index=self.kind,
+                               filtered=str(selector is not None).lower()):
+                distances, indices = self._index.search(queries, k, params=params)
+            metrics.observe("faiss_search_queries", len(queries), "Queries per FAISS search call",
+                            buckets=SIZE_BUCKETS, index=self.kind)
+            results = []
+            for row_ids, row_scores in zip(indices.tolist(), distances.tolist()):
+                doc_ids, scores, seen = [], [], set()
+                for faiss_id, score in zip(row_ids, row_scores):
+                    # FAISS pads missing results with -1
+                    if faiss_id == -1 or faiss_id not in self._ids or faiss_id in seen:
+                        continue
+                    seen.add(faiss_id)
+                    doc_ids.append(self._ids[faiss_id])
+                    scores.append(score)
+                results.append((doc_ids[:top_k], scores[:top_k]))
+        return results
+
+
+# Shared, process-wide index used by the search and ingest endpoints.
+vector_index = VectorIndex()
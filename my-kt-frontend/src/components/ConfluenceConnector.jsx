@@ -1,5 +1,5 @@
 // src/components/ConfluenceBulkIngest.jsx
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 
 const API_BASE_URL = "http://127.0.0.1:8000";
 
@@ -7,8 +7,13 @@ const ConfluenceIngest = () => {
   const [spaceKey, setSpaceKey] = useState("");
   const [limit, setLimit] = useState(10);
   const [result, setResult] = useState(null);
+  const [progress, setProgress] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  const eventSourceRef = useRef(null);
+
+  // Close any open event stream when the component unmounts.
+  useEffect(() => () => eventSourceRef.current?.close(), []);
 
   const handleBulkIngest = async () => {
     if (!spaceKey.trim()) {
@@ -18,19 +23,45 @@ const ConfluenceIngest = () => {
     setLoading(true);
     setError("");
     setResult(null);
+    setProgress(null);
 
     try {
-      const response = await fetch(
-        `${API_BASE_URL}/ingest/confluence/bulk?space_key=${encodeURIComponent(spaceKey)}&limit=${limit}`
-      );
+      const response = await fetch(`${API_BASE_URL}/jobs/ingest/confluence`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ space_key: spaceKey, limit: Number(limit) || null }),
+      });
       if (!response.ok) {
         throw new Error(`HTTP error: ${response.status}`);
       }
-      const data = await response.json();
-      setResult(data.data);
+      const { job_id } = await response.json();
+
+      // Follow the background job instead of holding the request open.
+      const events = new EventSource(`${API_BASE_URL}/jobs/${job_id}/events`);
+      eventSourceRef.current = events;
+      events.onmessage = (e) => {
+        const event = JSON.parse(e.data);
+        if (event.type === "progress" || event.type === "stage") {
+          setProgress((prev) => ({ ...prev, ...event }));
+        }
+      };
+      events.addEventListener("done", (e) => {
+        const job = JSON.parse(e.data);
+        if (job.status === "failed") {
+          setError(job.error);
+        } else {
+          setResult(job.result);
+        }
+        events.close();
+        setLoading(false);
+      });
+      events.onerror = () => {
+        setError("Lost connection to the ingestion job.");
+        events.close();
+        setLoading(false);
+      };
     } catch (err) {
       setError(err.message);
-    } finally {
       setLoading(false);
     }
   };
@@ -55,10 +86,16 @@ const ConfluenceIngest = () => {
       <button onClick={handleBulkIngest} disabled={loading}>
         {loading ? "Ingesting..." : "Ingest Documentation"}
       </button>
+      {loading && progress && (
+        <p>
+          Stage: {progress.stage || "starting"} · found {progress.pages_found || 0} · ingested{" "}
+          {progress.pages_ingested || 0} · skipped {progress.skipped_unchanged || 0}
+        </p>
+      )}
       {error && <p style={{ color: "red" }}>Error: {error}</p>}
       {result && (
         <div style={{ marginTop: "1rem" }}>
-          <h3>Processed Documents:</h3>
+          <h3>Ingestion Summary:</h3>
           <pre style={{ background: "#f4f4f4", padding: "1rem" }}>
             {JSON.stringify(result, null, 2)}
           </pre>
@@ -1,25 +1,59 @@
-import React, { useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 
 const API_BASE_URL = "http://127.0.0.1:8000";
 
 const JiraConnector = () => {
   const [responseData, setResponseData] = useState(null);
+  const [progress, setProgress] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  const eventSourceRef = useRef(null);
+
+  // Close any open event stream when the component unmounts.
+  useEffect(() => () => eventSourceRef.current?.close(), []);
 
   const handleIngestJira = async () => {
     setLoading(true);
     setError("");
+    setResponseData(null);
+    setProgress(null);
     try {
-      const res = await fetch(`${API_BASE_URL}/ingest/jira`);
+      const res = await fetch(`${API_BASE_URL}/jobs/ingest/jira`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ incremental: true }),
+      });
       if (!res.ok) {
         throw new Error(`HTTP error: ${res.status}`);
       }
-      const data = await res.json();
-      setResponseData(data);
+      const { job_id } = await res.json();
+
+      // Follow the background job instead of holding the request open.
+      const events = new EventSource(`${API_BASE_URL}/jobs/${job_id}/events`);
+      eventSourceRef.current = events;
+      events.onmessage = (e) => {
+        const event = JSON.parse(e.data);
+        if (event.type === "progress" || event.type === "stage") {
+          setProgress((prev) => ({ ...prev, ...event }));
+        }
+      };
+      events.addEventListener("done", (e) => {
+        const job = JSON.parse(e.data);
+        if (job.status === "failed") {
+          setError(job.error);
+        } else {
+          setResponseData(job.result);
+        }
+        events.close();
+        setLoading(false);
+      });
+      events.onerror = () => {
+        setError("Lost connection to the ingestion job.");
+        events.close();
+        setLoading(false);
+      };
     } catch (err) {
       setError(err.message);
-    } finally {
       setLoading(false);
     }
   };
@@ -30,6 +64,12 @@ const JiraConnector = () => {
       <button onClick={handleIngestJira} disabled={loading}>
         {loading ? "Ingesting..." : "Ingest Jira Data"}
       </button>
+      {loading && progress && (
+        <p>
+          Stage: {progress.stage || "starting"} · fetched {progress.fetched || 0} · processed{" "}
+          {progress.processed || 0} · skipped {progress.skipped_unchanged || 0}
+        </p>
+      )}
       {error && <p style={{ color: "red" }}>Error: {error}</p>}
       {responseData && (
         <div style={{ marginTop: "1rem" }}>
@@ -1,67 +1,131 @@
 import os
-from typing import List, Dict
+import sys
+import hashlib
+import threading
+from contextlib import closing
+from collections import OrderedDict
+from typing import List, Dict, Iterator, Tuple
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 import requests
+from requests.adapters import HTTPAdapter
 import json
 from pathlib import Path
 
+# Ollama generate endpoint and model; point OLLAMA_ENDPOINT at a stub server to test without a GPU.
+OLLAMA_ENDPOINT = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434/api/generate")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+# Seconds to establish a connection, and to wait for the next streamed chunk.
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "120"))
+# Generations allowed to run at once; further callers wait up to LLM_QUEUE_TIMEOUT seconds.
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", "2"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+# On-disk Chroma store; app/chroma_sync.py fills it from the MongoDB knowledge base.
+CHROMA_PATH = os.getenv("CHROMA_PATH", "chroma_db")
+CHROMA_COLLECTION = os.getenv("CHROMA_COLLECTION", "documents")
+
 class LocalRAGSystem:
-    def __init__(self):
+    def __init__(self, ollama_endpoint: str = OLLAMA_ENDPOINT, model: str = OLLAMA_MODEL,
+                 max_concurrent: int = LLM_MAX_CONCURRENT, cache_size: int = ANSWER_CACHE_SIZE):
         # Initialize the embedding model
         self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
         
-        # Initialize ChromaDB
-        self.chroma_client = chromadb.Client(Settings(
-            persist_directory="chroma_db",
-            anonymized_telemetry=False
-        ))
+        # Initialize ChromaDB (persistent, so synced knowledge units survive restarts)
+        self.chroma_client = chromadb.PersistentClient(
+            path=CHROMA_PATH,
+            settings=Settings(anonymized_telemetry=False)
+        )
         
         # Create or get the collection
         self.collection = self.chroma_client.get_or_create_collection(
-            name="documents",
+            name=CHROMA_COLLECTION,
             metadata={"hnsw:space": "cosine"}
         )
         
-        # Ollama API endpoint
-        self.ollama_endpoint = "http://localhost:11434/api/generate"
+        # Ollama API endpoint, called through one pooled keep-alive session
+        self.ollama_endpoint = ollama_endpoint
+        self.model = model
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrent)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Caps the number of generations running against the LLM at once
+        self._generation_slots = threading.BoundedSemaphore(max_concurrent)
+        
+        # Answers keyed on the question and the ids of the retrieved context (LRU)
+        self.cache_size = cache_size
+        self._answer_cache = OrderedDict()
+        self._cache_lock = threading.Lock()
         
     def create_embeddings(self, texts: List[str]) -> List[List[float]]:
         """Generate embeddings for a list of texts."""
         return self.embedding_model.encode(texts).tolist()
     
-    def add_documents(self, texts: List[str], metadata: List[Dict] = None):
-        """Add documents to the vector database."""
+    def add_documents(self, texts: List[str], metadata: List[Dict] = None, ids: List[str] = None,
+                      embeddings: List[List[float]] = None):
+        """
+        Add documents to the vector database, replacing documents with the same ids.
+        Without ids, each text gets a stable id derived from its content, so adding
+        the same text twice does not duplicate it and separate batches never collide.
+        Pass precomputed embeddings to skip encoding.
+        """
+        if ids is None:
+            ids = [f"doc_{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}" for text in texts]
         if metadata is None:
-            metadata = [{"source": f"doc_{i}"} for i in range(len(texts))]
-            
-        embeddings = self.create_embeddings(texts)
-        ids = [f"doc_{i}" for i in range(len(texts))]
+            metadata = [{"source": doc_id} for doc_id in ids]
+        if embeddings is None:
+            embeddings = self.create_embeddings(texts)
         
-        self.collection.add(
+        self.collection.upsert(
             embeddings=embeddings,
             documents=texts,
             metadatas=metadata,
             ids=ids
         )
     
-    def query_llm(self, prompt: str) -> str:
-        """Query the local LLM using Ollama."""
+    def stream_llm(self, prompt: str) -> Iterator[str]:
+        """
+        Query the local LLM using Ollama and yield the answer as it is generated.
+        Ollama streams one JSON object per line; the last one has "done": true.
+        An error object, or a stream that ends before "done", raises. The
+        generation slot is held until the generator finishes or is closed.
+        """
         payload = {
-            "model": "mistral",
+            "model": self.model,
             "prompt": prompt,
-            "stream": False
+            "stream": True
         }
         
-        response = requests.post(self.ollama_endpoint, json=payload)
-        if response.status_code == 200:
-            return response.json()["response"]
-        else:
-            raise Exception(f"Error querying LLM: {response.text}")
+        if not self._generation_slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+            raise Exception("Error querying LLM: too many concurrent generations")
+        try:
+            with self.session.post(self.ollama_endpoint, json=payload, stream=True,
+                                   timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)) as response:
+                if response.status_code != 200:
+                    raise Exception(f"Error querying LLM: {response.text}")
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if "error" in chunk:
+                        raise Exception(f"Error querying LLM: {chunk['error']}")
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        return
+                raise Exception("Error querying LLM: the response ended before the answer was done")
+        finally:
+            self._generation_slots.release()
     
-    def retrieve_relevant_documents(self, query: str, n_results: int = 3) -> List[str]:
-        """Retrieve relevant documents for a query."""
+    def query_llm(self, prompt: str) -> str:
+        """Query the local LLM using Ollama and return the whole answer."""
+        return "".join(self.stream_llm(prompt))
+    
+    def retrieve_context(self, query: str, n_results: int = 3) -> Tuple[List[str], List[str]]:
+        """Retrieve the ids and texts of the relevant documents for a query."""
         query_embedding = self.create_embeddings([query])[0]
         
         results = self.collection.query(
@@ -69,16 +133,16 @@ class LocalRAGSystem:
             n_results=n_results
         )
         
-        return results["documents"][0]
+        return results["ids"][0], results["documents"][0]
     
-    def answer_question(self, question: str) -> str:
-        """Answer a question using RAG."""
-        # Retrieve relevant documents
-        relevant_docs = self.retrieve_relevant_documents(question)
-        
-        # Construct the prompt
+    def retrieve_relevant_documents(self, query: str, n_results: int = 3) -> List[str]:
+        """Retrieve relevant documents for a query."""
+        return self.retrieve_context(query, n_results)[1]
+    
+    def build_prompt(self, question: str, relevant_docs: List[str]) -> str:
+        """Construct the prompt"""
         context = "\n".join(relevant_docs)
-        prompt = f"""Based on the following context, please answer the question. If the context doesn't contain relevant information, say so.
+        return f"""Based on the following context, please answer the question. If the context doesn't contain relevant information, say so.
 
 Context:
 {context}
@@ -86,9 +150,94 @@ Context:
 Question: {question}
 
 Answer:"""
+    
+    def _cache_key(self, question: str, doc_ids: List[str], docs: List[str]) -> str:
+        # Ids alone would keep serving answers built from documents since re-synced under the same id.
+        normalized = " ".join(question.lower().split())
+        content = [hashlib.sha256(doc.encode("utf-8")).hexdigest() for doc in docs]
+        return hashlib.sha256("\x1f".join([self.model, normalized, *doc_ids, *content]).encode("utf-8")).hexdigest()
+    
+    def _cached_answer(self, key: str):
+        with self._cache_lock:
+            answer = self._answer_cache.get(key)
+            if answer is not None:
+                self._answer_cache.move_to_end(key)
+            return answer
+    
+    def _cache_answer(self, key: str, answer: str):
+        with self._cache_lock:
+            self._answer_cache[key] = answer
+            self._answer_cache.move_to_end(key)
+            while len(self._answer_cache) > self.cache_size:
+                self._answer_cache.popitem(last=False)
+    
+    def answer_question(self, question: str) -> str:
+        """Answer a question using RAG."""
+        return "".join(self.stream_answer(question))
+    
+    def stream_answer(self, question: str) -> Iterator[str]:
+        """
+        Answer a question using RAG, yielding the answer as it is generated.
+        A question asked again with the same retrieved documents, unchanged, is
+        answered from the cache; only answers that finished generating are cached.
+        """
+        # Retrieve relevant documents
+        doc_ids, relevant_docs = self.retrieve_context(question)
+        key = self._cache_key(question, doc_ids, relevant_docs)
+        cached = self._cached_answer(key)
+        if cached is not None:
+            yield cached
+            return
         
         # Get answer from LLM
-        return self.query_llm(prompt)
+        parts = []
+        # Closed explicitly, so abandoning this generator frees the LLM slot at once.
+        with closing(self.stream_llm(self.build_prompt(question, relevant_docs))) as generation:
+            for part in generation:
+                parts.append(part)
+                yield part
+        self._cache_answer(key, "".join(parts))
+
+def create_app(rag: LocalRAGSystem):
+    """
+    HTTP API over a RAG system: GET /ask returns the whole answer, GET /ask/stream
+    sends it as Server-Sent Events, one 'data' event per generated piece and a
+    final 'done' event.
+    """
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import StreamingResponse
+    from starlette.concurrency import iterate_in_threadpool
+    
+    app = FastAPI(title="Local RAG System")
+    
+    @app.get("/ask")
+    def ask(question: str):
+        try:
+            return {"status": "success", "answer": rag.answer_question(question)}
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    
+    @app.get("/ask/stream")
+    async def ask_stream(question: str):
+        async def event_stream():
+            answer = rag.stream_answer(question)
+            try:
+                # The generator blocks on the LLM, so it is driven from the thread pool.
+                async for part in iterate_in_threadpool(answer):
+                    yield f"data: {json.dumps({'token': part})}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+                return
+            finally:
+                # When the client disconnects mid-answer, stop the generation here
+                # rather than whenever the generator is garbage collected: closing
+                # it closes the Ollama response and frees its generation slot.
+                answer.close()
+            yield "event: done\ndata: {}\n\n"
+        
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+    
+    return app
 
 def main():
     # Initialize the RAG system
@@ -101,8 +250,15 @@ def main():
         "Vector databases are specialized databases designed to store and search vector embeddings efficiently."
     ]
     
-    # Add documents to the system
-    rag.add_documents(sample_documents)
+    # Add documents to the system, unless the store was already filled (e.g. by app/chroma_sync.py)
+    if rag.collection.count() == 0:
+        rag.add_documents(sample_documents)
+    
+    # Serve the HTTP/SSE API instead of the prompt: python rag_system.py --serve
+    if "--serve" in sys.argv:
+        import uvicorn
+        uvicorn.run(create_app(rag), host="127.0.0.1", port=int(os.getenv("RAG_PORT", "8001")))
+        return
     
     # Interactive question answering
     print("Welcome to the Local RAG System!")
@@ -114,8 +270,10 @@ def main():
             break
             
         try:
-            answer = rag.answer_question(question)
-            print("\nAnswer:", answer)
+            print("\nAnswer: ", end="", flush=True)
+            for part in rag.stream_answer(question):
+                print(part, end="", flush=True)
+            print()
         except Exception as e:
             print(f"Error: {str(e)}")
 